@@ -0,0 +1,164 @@
+"""
+Compares the ast2dict export (nested dictionaries) with the compact array
+backed one (ast2compact) in build time and memory: the peak allocated while
+building and the size retained by the result (the latter only under Python 3).
+The build time of the previous recursive ast2dict visitor is also shown (as
+"recursive", failing on the trees deeper than the recursion limit) and the
+JSON export with ast2json_stream is compared with json.dumps(ast2dict()).
+
+Usage: python benchmarks/bench_ast2dict.py [-n REPEAT] [file ...]
+
+Without files a wide synthetic module compatible with both Python versions and
+two deep ones (a long elif chain and a long expression) are used.
+"""
+
+from __future__ import print_function
+
+import argparse
+import ast
+import gc
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from six import string_types  # noqa: E402
+from pydetector.ast2dict import ast2dict, ast2compact, ast2json_stream  # noqa: E402
+from bench_wire import synthetic_module, timed  # noqa: E402
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    from collections.abc import Sequence
+except ImportError:  # Python 2
+    from collections import Sequence
+
+DEEP_DEPTH = 800
+
+
+def deep_modules(depth=DEEP_DEPTH):
+    yield '<deep elif>', 'if a == 0:\n    pass\n' + ''.join(
+        'elif a == %d:\n    b = [a, %d]\n' % (i, i) for i in range(1, depth))
+    yield '<deep expression>', 'x = ' + ' + '.join('f(%d)' % i for i in range(depth)) + '\n'
+
+
+class RecursiveExportVisitor(object):
+    """ The previous ast2dict visitor, recursing once per nesting level """
+
+    def __init__(self, codestr):
+        self.codestr = codestr
+
+    def _nodedict(self, node, newdict, ast_type=None):
+        if ast_type is None:
+            ast_type = node.__class__.__name__
+
+        newdict["ast_type"] = ast_type
+        if hasattr(node, "lineno"):
+            newdict["lineno"] = node.lineno
+
+        if hasattr(node, "col_offset"):
+            newdict["col_offset"] = node.col_offset
+
+        newdict["_fields"] = getattr(node, "_fields", [])
+        newdict["_attributes"] = getattr(node, "_attributes", [])
+        return newdict
+
+    def parse(self):
+        return self.visit(ast.parse(self.codestr, mode='exec'))
+
+    def visit(self, node):
+        if isinstance(node, string_types) or \
+                (not isinstance(node, Sequence) and
+                 not isinstance(node, ast.AST)):
+            return node
+
+        nodedict = self._nodedict(node, {}, ast_type=node.__class__.__name__)
+
+        for field in nodedict["_fields"]:
+            nodedict[field] = self.visit_field(getattr(node, field))
+
+        return nodedict
+
+    def visit_field(self, node):
+        if isinstance(node, ast.AST):
+            return self.visit(node)
+        elif isinstance(node, list) or isinstance(node, tuple):
+            return [self.visit(x) for x in node]
+        else:
+            return node
+
+
+def recursive_ast2dict(codestr):
+    return RecursiveExportVisitor(codestr).parse()
+
+
+class NullWriter(object):
+    def write(self, text):
+        pass
+
+
+def memory(func):
+    """ Returns the (peak, retained) MB allocated by func """
+    if tracemalloc is None:
+        return float('nan'), float('nan')
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func()  # noqa: F841 (kept alive to measure it)
+        retained, peak = tracemalloc.get_traced_memory()
+        return peak / 1e6, retained / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def bench_code(name, code, repeat):
+    print('%s: %d bytes of source' % (name, len(code)))
+    try:
+        elapsed = timed(lambda: recursive_ast2dict(code), repeat)
+        print('  %-12s build %8.4f s' % ('recursive', elapsed))
+    except RuntimeError as exc:  # RecursionError under Python 3
+        print('  %-12s failed: %s' % ('recursive', exc.__class__.__name__))
+
+    for label, func in (('ast2dict', ast2dict), ('ast2compact', ast2compact)):
+        elapsed = timed(lambda: func(code), repeat)
+        peak, retained = memory(lambda: func(code))
+        print('  %-12s build %8.4f s  peak %8.2f MB  retained %8.2f MB' % (
+            label, elapsed, peak, retained))
+
+    compact = ast2compact(code)
+    print('  to_dict() of the compact tree: %.4f s' % timed(compact.to_dict, repeat))
+
+    for label, func in (('json.dumps', lambda: NullWriter().write(
+                            json.dumps(ast2dict(code), default=repr))),
+                        ('json stream', lambda: ast2json_stream(code, NullWriter()))):
+        try:
+            elapsed = timed(func, repeat)
+            peak = memory(func)[0]
+            print('  %-12s write %8.4f s  peak %8.2f MB' % (label, elapsed, peak))
+        except RuntimeError as exc:
+            print('  %-12s failed: %s' % (label, exc.__class__.__name__))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--repeat', type=int, default=3)
+    parser.add_argument('files', nargs='*')
+    args = parser.parse_args()
+
+    if not args.files:
+        bench_code('<synthetic>', synthetic_module(), args.repeat)
+        for name, code in deep_modules():
+            bench_code(name, code, args.repeat)
+
+    for filename in args.files:
+        with io.open(filename, encoding='utf-8', errors='replace') as infile:
+            bench_code(filename, infile.read(), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
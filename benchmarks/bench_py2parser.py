@@ -0,0 +1,74 @@
+"""
+Compares the builtin Python 2 parser (pydetector.py2parser) with a Python 2
+interpreter checking if the code parses: a warm one from the pool (parse only
+mode) and a new one per file, as done with ast_workers=0. The time to generate
+the grammar tables, paid once per process, is shown too.
+
+Usage: python3 benchmarks/bench_py2parser.py [-n REPEAT] [file ...]
+
+Without files a synthetic module compatible with both Python versions is used.
+"""
+
+from __future__ import print_function
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from pydetector import py2parser  # noqa: E402
+from pydetector.ast_checks import other_python_pool, _check_other_process, \
+        PY2_EXEC  # noqa: E402
+from pydetector.py2parser.parser import Parser  # noqa: E402
+from bench_wire import synthetic_module, timed  # noqa: E402
+
+
+def bench_code(name, code, repeat, pool):
+    print('%s: %d bytes of source' % (name, len(code)))
+    print('  builtin parse       %8.4f s' % timed(lambda: py2parser.parse_error(code), repeat))
+    print('  builtin tree2dict   %8.4f s' % timed(
+        lambda: py2parser.tree2dict(py2parser.parse(code)), repeat))
+    if pool is not None:
+        print('  python2 pool        %8.4f s' % timed(
+            lambda: pool.request(code, build_ast=False), repeat))
+        print('  python2 process     %8.4f s' % timed(
+            lambda: _check_other_process(code, PY2_EXEC, build_ast=False), repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--repeat', type=int, default=3)
+    parser.add_argument('files', nargs='*')
+    args = parser.parse_args()
+
+    start = time.time()
+    Parser()
+    print('grammar tables: %.4f s' % (time.time() - start))
+
+    pool = None
+    if sys.version_info[0] == 3:
+        try:
+            pool = other_python_pool()
+            # warm up (and fail early if Python 2 is not available)
+            pool.request('pass', build_ast=False)
+        except Exception as exc:
+            print('python2: skipped (%s)' % str(exc).splitlines()[0])
+            pool = None
+
+    try:
+        if not args.files:
+            bench_code('<synthetic>', synthetic_module(), args.repeat, pool)
+
+        for filename in args.files:
+            with io.open(filename, encoding='utf-8', errors='replace') as infile:
+                bench_code(filename, infile.read(), args.repeat, pool)
+    finally:
+        if pool is not None:
+            pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""
+Times every stage of the detection separately over the synthetic corpus of
+benchmarks/corpus.py (or the given files): the decoding of the bytes, the
+string and comment stripper, the three regex checks (and the modules one only
+looking at the import header), the AST checks of the running interpreter, of
+the builtin Python 2 parser and of a warm interpreter of the other version,
+the ast2dict export and the whole detect() of a file.
+
+Every stage gets the input of the previous ones already computed, so only its
+own work is timed. The throughput is reported in files/s and MB/s of source
+and the peak memory allocated by the stage with the biggest file of every
+category (only under Python 3, the memory of the other interpreter is not
+included). The results can be saved as a JSON baseline and compared with a
+previous one, as the ratio of the throughputs:
+
+    python benchmarks/bench_stages.py --save before.json
+    (change the code)
+    python benchmarks/bench_stages.py --compare before.json
+
+Usage: python benchmarks/bench_stages.py [-n REPEAT] [--scale SCALE]
+    [--stages STAGE,...] [--categories CATEGORY,...] [--no-other]
+    [--save FILE] [--compare FILE] [file ...]
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from pydetector import ast_checks, py2parser  # noqa: E402
+from pydetector.ast2dict import ast2dict  # noqa: E402
+from pydetector.ast_pool import parse_error  # noqa: E402
+from pydetector.detector import remove_str_comments, _detect_code  # noqa: E402
+from pydetector.encoding import decode_source  # noqa: E402
+from pydetector.regexp_checks import check_syntax_regex, check_modules_regex, \
+        check_modulesymbols_regex  # noqa: E402
+from pydetector.version import __version__  # noqa: E402
+import corpus  # noqa: E402
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+BASELINE_FORMAT = 1
+
+
+class Sample(object):
+    """ A file of the corpus with the input of every stage precomputed """
+
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+        self.code = decode_source(data)[0]
+        self.cleaned = remove_str_comments(self.code)
+        self.parses = parse_error(self.code) is None
+
+
+def stages(pool):
+    """ Returns a list of (stage name, function of a Sample) """
+    result = [
+        ('decode', lambda sample: decode_source(sample.data)),
+        ('remove_str_comments', lambda sample: remove_str_comments(sample.code)),
+        ('check_syntax_regex', lambda sample: check_syntax_regex(sample.cleaned, [])),
+        ('check_modules_regex', lambda sample: check_modules_regex(sample.cleaned, [])),
+        ('check_modules_header',
+         lambda sample: check_modules_regex(sample.cleaned, [], scan='header')),
+        ('check_modulesymbols_regex',
+         lambda sample: check_modulesymbols_regex(sample.cleaned, [])),
+        ('ast_current', lambda sample: parse_error(sample.code)),
+    ]
+    if sys.version_info[0] == 3:
+        result.append(('ast_py2parser', lambda sample: py2parser.parse_error(sample.code)))
+    if pool is not None:
+        result.append(('ast_other', lambda sample: ast_checks._check_other_pool(
+            sample.code, pool, build_ast=False)))
+    # only the files that parse can be exported
+    result.append(('ast2dict', lambda sample: ast2dict(sample.code) if sample.parses else None))
+    result.append(('detect', lambda sample: _detect_code(
+        sample.name, sample.code, pool, stop_on_ok_ast=False, build_ast=False)))
+    return result
+
+
+def timed(func, samples, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.time()
+        for sample in samples:
+            func(sample)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def peak_memory(func, samples):
+    """ Returns the peak MB allocated checking the biggest sample """
+    if tracemalloc is None or not samples:
+        return None
+    sample = max(samples, key=lambda sample: len(sample.data))
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(sample)
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def run(categories, stage_names, repeat, pool):
+    """ Returns {stage: {category: measures}} """
+    results = {}
+    for stage, func in stages(pool):
+        if stage_names and stage not in stage_names:
+            continue
+        results[stage] = {}
+        for category, samples in categories:
+            size = sum(len(sample.data) for sample in samples)
+            elapsed = max(timed(func, samples, repeat), 1e-9)
+            results[stage][category] = {
+                'files': len(samples),
+                'bytes': size,
+                'seconds': elapsed,
+                'files_per_s': len(samples) / elapsed,
+                'mb_per_s': size / elapsed / 1e6,
+                'peak_mb': peak_memory(func, samples),
+            }
+            report(stage, category, results[stage][category])
+    return results
+
+
+def report(stage, category, measures, previous=None):
+    peak = measures['peak_mb']
+    line = '%-26s %-12s %10.1f files/s %9.2f MB/s  peak %s' % (
+        stage, category, measures['files_per_s'], measures['mb_per_s'],
+        '%8.2f MB' % peak if peak is not None else '     n/a')
+    if previous is not None:
+        line += '  %5.2fx' % (measures['mb_per_s'] / previous['mb_per_s'])
+    print(line)
+
+
+def compare(results, baseline):
+    """ Prints the speedup of every stage and category over the baseline """
+    print('\nCompared with %s (%s, Python %s), >1 is faster:' % (
+        baseline['meta'].get('revision'), baseline['meta'].get('version'),
+        baseline['meta'].get('python')))
+    for stage in results:
+        for category, measures in sorted(results[stage].items()):
+            previous = baseline['results'].get(stage, {}).get(category)
+            if previous is not None:
+                report(stage, category, measures, previous)
+
+
+def revision():
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(
+                ['git', 'rev-parse', '--short', 'HEAD'], stderr=devnull,
+                cwd=os.path.dirname(os.path.abspath(__file__))).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--repeat', type=int, default=3)
+    parser.add_argument('--scale', type=int, default=1,
+                        help='size multiplier of the synthetic corpus')
+    parser.add_argument('--stages', default='',
+                        help='comma separated names of the stages to time (default=all)')
+    parser.add_argument('--categories', default=','.join(corpus.CATEGORIES),
+                        help='comma separated categories of the corpus')
+    parser.add_argument('--no-other', dest='other', action='store_false',
+                        help="don't time the interpreter of the other Python version")
+    parser.add_argument('--save', metavar='FILE', help='write the results as JSON')
+    parser.add_argument('--compare', metavar='FILE', help='baseline JSON to compare with')
+    parser.add_argument('files', nargs='*')
+    args = parser.parse_args()
+
+    if args.files:
+        samples = []
+        for filename in args.files:
+            with open(filename, 'rb') as infile:
+                samples.append(Sample(filename, infile.read()))
+        categories = [('files', samples)]
+    else:
+        categories = [(category, [Sample(name, data) for name, data in files])
+                      for category, files in corpus.generate(
+                          args.categories.split(','), args.scale)]
+
+    pool = None
+    if args.other:
+        try:
+            pool = ast_checks.other_python_pool()
+            # warm up (and fail early if the other version is not available)
+            pool.request('pass', build_ast=False)
+        except Exception as exc:
+            print('ast_other: skipped (%s)' % str(exc).splitlines()[0])
+            pool = None
+
+    try:
+        stage_names = [name for name in args.stages.split(',') if name]
+        results = run(categories, stage_names, args.repeat, pool)
+    finally:
+        if pool is not None:
+            pool.close()
+
+    if args.compare:
+        with open(args.compare) as infile:
+            compare(results, json.load(infile))
+
+    if args.save:
+        baseline = {
+            'format': BASELINE_FORMAT,
+            'meta': {
+                'version': __version__,
+                'revision': revision(),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'repeat': args.repeat,
+                'scale': args.scale,
+            },
+            'results': results,
+        }
+        with open(args.save, 'w') as outfile:
+            json.dump(baseline, outfile, indent=2, sort_keys=True)
+        print('\nbaseline saved to %s' % args.save)
+
+
+if __name__ == '__main__':
+    main()
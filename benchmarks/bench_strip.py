@@ -0,0 +1,97 @@
+"""
+Compares the linear string and comment stripper (remove_str_comments) with the
+previous implementation based on three regex substitutions, in speed and peak
+memory allocated (the latter only under Python 3).
+
+Usage: python benchmarks/bench_strip.py [-n REPEAT] [file ...]
+
+Without files a corpus of synthetic large modules is used, including one with
+long lines full of strings. The old greedy regexes are fast there only because
+they wrongly replace everything from the first to the last quote of every line
+with a single empty string.
+"""
+
+from __future__ import print_function
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from pydetector import detector  # noqa: E402
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+SYNTHETIC_FUNC = '''
+def func_%d(arg1, arg2=None, *args, **kwargs):
+    """ Docstring of the function number %d
+
+    with "quotes" and a # that is not a comment
+    """
+    result = {"key": [arg1, arg2, 'it\\'s', r"\\d+"], "other": (args, kwargs)}  # comment
+    for idx, value in enumerate(sorted(result)):
+        if idx %% 2 and value not in ("a", "b"):
+            result[value] = [x * 2 for x in range(idx) if x > 1]
+    return result
+'''
+
+
+def synthetic_corpus():
+    module = ''.join(SYNTHETIC_FUNC % (i, i) for i in range(3000))
+    long_lines = ('x = ' + ' + '.join('"%d" + \'s\'' % i for i in range(300)) + '\n') * 100
+    return [('<synthetic module>', module), ('<long lines>', long_lines)]
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def peak_memory(func):
+    if tracemalloc is None:
+        return float('nan')
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def bench_code(name, code, repeat):
+    print('%s: %d chars' % (name, len(code)))
+    for label, func in (('regex substitutions', detector._remove_str_comments_regex),
+                        ('linear stripper', detector.remove_str_comments)):
+        elapsed = timed(lambda: func(code), repeat)
+        print('  %-20s %8.4f s  %8.2f MB/s  peak %7.2f MB' % (
+            label, elapsed, len(code) / elapsed / 1e6, peak_memory(lambda: func(code))))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--repeat', type=int, default=3)
+    parser.add_argument('files', nargs='*')
+    args = parser.parse_args()
+
+    corpus = [] if args.files else synthetic_corpus()
+    for filename in args.files:
+        with io.open(filename, encoding='utf-8', errors='replace') as infile:
+            corpus.append((filename, infile.read()))
+
+    for name, code in corpus:
+        bench_code(name, code, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Compares the fused syntax scanner of check_syntax_regex with the previous
+implementation (one findall over the whole source per syntax rule).
+
+Usage: python benchmarks/bench_syntax.py [-n REPEAT] [file ...]
+
+Without files a synthetic module with some Python 2 constructs is used.
+"""
+
+from __future__ import print_function
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from pydetector import regexp_checks  # noqa: E402
+
+SYNTHETIC_FUNC = '''
+def func_%d(arg1, arg2=None, *args, **kwargs):
+    """ Docstring of the function number %d """
+    result = {"key": [arg1, arg2, 3.5, 1 << 40], "other": (args, kwargs)}
+    for idx, value in enumerate(sorted(result)):
+        if idx %% 2 and value not in ("a", "b"):
+            result[value] = [x * 2 for x in range(idx) if x > 1]
+    if not result.has_key("key"):
+        raise ValueError, "no key"
+    print "done", len(result)
+    return result
+'''
+
+
+def synthetic_module(functions=2000):
+    return ''.join(SYNTHETIC_FUNC % (i, i) for i in range(functions))
+
+
+def findall_syntax_regex(code, matches):
+    py2_score = py3_score = 0
+    for regex, score in regexp_checks.PY3OTHER_REGEXP:
+        m = regex.findall(code)
+        if m:
+            py3_score += score * len(m)
+            matches.append(("PY3SYNTAX_" + regex.pattern, m))
+
+    for regex, score in regexp_checks.PY2OTHER_REGEXP:
+        m = regex.findall(code)
+        if m:
+            py2_score += score * len(m)
+            matches.append(("PY2SYNTAX_" + regex.pattern, m))
+    return py2_score, py3_score
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_code(name, code, repeat):
+    old_matches, new_matches = [], []
+    same = (findall_syntax_regex(code, old_matches) ==
+            regexp_checks.check_syntax_regex(code, new_matches) and
+            old_matches == new_matches)
+
+    old = timed(lambda: findall_syntax_regex(code, []), repeat)
+    new = timed(lambda: regexp_checks.check_syntax_regex(code, []), repeat)
+    print('%s: %d chars, same results: %s' % (name, len(code), same))
+    print('  findall per rule (s): %8.4f  %8.2f MB/s' % (old, len(code) / old / 1e6))
+    print('  fused scanner (s):    %8.4f  %8.2f MB/s' % (new, len(code) / new / 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--repeat', type=int, default=5)
+    parser.add_argument('files', nargs='*')
+    args = parser.parse_args()
+
+    if not args.files:
+        bench_code('<synthetic>', synthetic_module(), args.repeat)
+
+    for filename in args.files:
+        with io.open(filename, encoding='utf-8', errors='replace') as infile:
+            bench_code(filename, infile.read(), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
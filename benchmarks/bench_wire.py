@@ -0,0 +1,95 @@
+"""
+Compares the binary wire format (pydetector.wire) with the legacy
+repr()/ast.literal_eval path used to send the ASTs from the other interpreter.
+
+Usage: python benchmarks/bench_wire.py [-n REPEAT] [file ...]
+
+Without files a synthetic module compatible with both Python versions is used.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from pydetector import wire  # noqa: E402
+from pydetector.ast2dict import ast2dict  # noqa: E402
+from pydetector.ast_checks import other_python_pool  # noqa: E402
+from pydetector.ast_pool import decode_repr  # noqa: E402
+
+SYNTHETIC_FUNC = '''
+def func_%d(arg1, arg2=None, *args, **kwargs):
+    """ Docstring of the function number %d """
+    result = {"key": [arg1, arg2, 3.5, 1 << 40], "other": (args, kwargs)}
+    for idx, value in enumerate(sorted(result)):
+        if idx %% 2 and value not in ("a", "b"):
+            result[value] = [x * 2 for x in range(idx) if x > 1]
+    return result
+'''
+
+
+def synthetic_module(functions=2000):
+    return ''.join(SYNTHETIC_FUNC % (i, i) for i in range(functions))
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_code(name, code, repeat):
+    tree = ast2dict(code)
+    repr_data = repr(tree).encode('utf-8')
+    wire_data = wire.dumps(tree)
+
+    print('%s: %d bytes of source' % (name, len(code)))
+    print('  payload size        repr: %10d   binary: %10d' % (len(repr_data), len(wire_data)))
+    print('  encode (s)          repr: %10.4f   binary: %10.4f' % (
+        timed(lambda: repr(tree).encode('utf-8'), repeat),
+        timed(lambda: wire.dumps(tree), repeat)))
+    print('  decode (s)          repr: %10.4f   binary: %10.4f' % (
+        timed(lambda: decode_repr(repr_data), repeat),
+        timed(lambda: wire.loads(wire_data), repeat)))
+
+    pools = {}
+    try:
+        for wire_format in ('repr', 'binary'):
+            pools[wire_format] = other_python_pool(wire_format=wire_format)
+            # warm up (and fail early if the other Python is not available)
+            pools[wire_format].request('pass')
+
+        print('  other python (s)    repr: %10.4f   binary: %10.4f' % (
+            timed(lambda: pools['repr'].request(code), repeat),
+            timed(lambda: pools['binary'].request(code), repeat)))
+    except Exception as exc:
+        print('  other python: skipped (%s)' % str(exc).splitlines()[0])
+    finally:
+        for pool in pools.values():
+            pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--repeat', type=int, default=3)
+    parser.add_argument('files', nargs='*')
+    args = parser.parse_args()
+
+    if not args.files:
+        bench_code('<synthetic>', synthetic_module(), args.repeat)
+
+    for filename in args.files:
+        with open(filename) as infile:
+            bench_code(filename, infile.read(), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
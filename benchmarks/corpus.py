@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic corpus for the benchmarks: every category is a list of (name, data)
+with the bytes of the files, generated deterministically so the results of
+two revisions can be compared.
+
+    small       many short modules of Python 2, 3 and compatible code
+    huge        a few modules with thousands of functions
+    deep        deeply nested blocks, elif chains and expressions
+    long_lines  lines of thousands of characters full of strings
+    non_utf8    Latin-1, cp1252 and Shift JIS files, with and without cookie
+
+Usage: python benchmarks/corpus.py [--scale SCALE] DIRECTORY
+
+writes the corpus to DIRECTORY/<category>/ to use it with other tools.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+
+CATEGORIES = ('small', 'huge', 'deep', 'long_lines', 'non_utf8')
+
+SMALL_SOURCES = (
+    # Python 2
+    u'''import urllib2
+from StringIO import StringIO
+
+def fetch_%(idx)d(url):
+    """ Fetch %(idx)d """
+    try:
+        data = urllib2.urlopen(url).read()
+    except urllib2.URLError, exc:
+        print >>sys.stderr, "error", exc
+        return None
+    print "fetched %%d bytes" %% len(data)
+    return StringIO(data)
+''',
+    # Python 3
+    u'''import asyncio
+from urllib.request import urlopen
+
+async def fetch_%(idx)d(url: str) -> bytes:
+    """ Fetch %(idx)d """
+    loop = asyncio.get_event_loop()
+    data = await loop.run_in_executor(None, lambda: urlopen(url).read())
+    print(f"fetched {len(data)} bytes", end="")
+    *rest, last = data.split(b"\\n")
+    return last
+''',
+    # both
+    u'''from __future__ import print_function
+import os
+import sys
+
+def walk_%(idx)d(top):
+    """ Walk %(idx)d """
+    result = {}
+    for root, dirs, files in os.walk(top):
+        result[root] = sorted(name for name in files if name.endswith(".py"))
+    print("walked", len(result), file=sys.stderr)
+    return result
+''',
+)
+
+HUGE_FUNC = u'''
+def func_%(idx)d(arg1, arg2=None, *args, **kwargs):
+    """ Docstring of the function number %(idx)d
+
+    with "quotes" and a # that is not a comment
+    """
+    result = {"key": [arg1, arg2, 'it\\'s', r"\\d+"], "other": (args, kwargs)}  # comment
+    for idx, value in enumerate(sorted(result)):
+        if idx %% 2 and value not in ("a", "b"):
+            result[value] = [x * 2 for x in range(idx) if x > 1]
+    return os.path.join(str(result), "%(idx)d")
+'''
+
+NON_UTF8_SOURCE = u'''%(cookie)s
+# Módulo de ejemplo con caracteres «no ASCII»: año, niño, café, 5 £
+import os
+
+MENSAJES = {
+    "error": u"Ocurrió un error en la operación número %(idx)d",
+    "aviso": u"Atención: señal débil",
+}
+
+def traducir_%(idx)d(clave):
+    return MENSAJES.get(clave, u"¿desconocido?")
+'''
+
+NON_UTF8_JAPANESE = u'''# -*- coding: shift_jis -*-
+# 日本語のコメント %(idx)d
+MESSAGE_%(idx)d = u"こんにちは、世界"
+
+def greet_%(idx)d(name):
+    return MESSAGE_%(idx)d + name
+'''
+
+
+def small(scale=1):
+    return [('small_%04d.py' % idx,
+             (SMALL_SOURCES[idx % len(SMALL_SOURCES)] % {'idx': idx}).encode('utf-8'))
+            for idx in range(300 * scale)]
+
+
+def huge(scale=1):
+    return [('huge_%d.py' % idx,
+             (u'import os\n' + u''.join(HUGE_FUNC % {'idx': func}
+                                        for func in range(1500 * scale))).encode('utf-8'))
+            for idx in range(2)]
+
+
+def deep(scale=1):
+    # The Python parsers limit the nesting of blocks (100) and brackets, but
+    # not the length of the elif chains or the binary operations
+    blocks = u''.join(u'%sif x > %d:\n' % (u'    ' * level, level) for level in range(90))
+    blocks += u'    ' * 90 + u'x = 0\n'
+    elifs = u'if a == 0:\n    pass\n' + u''.join(
+        u'elif a == %d:\n    b = [a, %d]\n' % (idx, idx) for idx in range(1, 800 * scale))
+    expression = u'x = ' + u' + '.join(u'f(%d)' % idx for idx in range(800 * scale)) + u'\n'
+    brackets = u'x = ' + u'[' * 50 + u'1' + u']' * 50 + u'\n'
+    return [('deep_blocks.py', (blocks * scale).encode('utf-8')),
+            ('deep_elif.py', elifs.encode('utf-8')),
+            ('deep_expression.py', expression.encode('utf-8')),
+            ('deep_brackets.py', (brackets * 100 * scale).encode('utf-8'))]
+
+
+def long_lines(scale=1):
+    strings = u'x = ' + u' + '.join(u'"%d" + \'s\'' % idx for idx in range(300)) + u'\n'
+    calls = u'y = [' + u', '.join(u'func(%d, key="v%d")' % (idx, idx)
+                                  for idx in range(1000)) + u']\n'
+    return [('long_strings.py', (strings * 100 * scale).encode('utf-8')),
+            ('long_calls.py', (calls * 20 * scale).encode('utf-8')),
+            ('long_comment.py', ((u'# ' + u'comment "with quotes" ' * 500 + u'\nz = 1\n')
+                                 * 50 * scale).encode('utf-8'))]
+
+
+def non_utf8(scale=1):
+    files = []
+    for idx in range(30 * scale):
+        kind = idx % 4
+        if kind == 0:
+            code = NON_UTF8_SOURCE % {'cookie': u'# -*- coding: latin-1 -*-', 'idx': idx}
+            files.append(('latin1_%03d.py' % idx, code.encode('latin-1')))
+        elif kind == 1:
+            code = NON_UTF8_SOURCE % {'cookie': u'# coding: cp1252', 'idx': idx}
+            files.append(('cp1252_%03d.py' % idx, code.encode('cp1252')))
+        elif kind == 2:
+            # no cookie, found by trying the fallback encodings
+            code = NON_UTF8_SOURCE % {'cookie': u'', 'idx': idx}
+            files.append(('nocookie_%03d.py' % idx, code.encode('iso8859_15')))
+        else:
+            code = NON_UTF8_JAPANESE % {'idx': idx}
+            files.append(('sjis_%03d.py' % idx, code.encode('shift_jis')))
+    return files
+
+
+GENERATORS = {
+    'small': small,
+    'huge': huge,
+    'deep': deep,
+    'long_lines': long_lines,
+    'non_utf8': non_utf8,
+}
+
+
+def generate(categories=CATEGORIES, scale=1):
+    """ Returns a list of (category, [(name, data), ...]) """
+    return [(category, GENERATORS[category](scale)) for category in categories]
+
+
+def write(directory, categories=CATEGORIES, scale=1):
+    for category, files in generate(categories, scale):
+        path = os.path.join(directory, category)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for name, data in files:
+            with open(os.path.join(path, name), 'wb') as outfile:
+                outfile.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('directory')
+    args = parser.parse_args()
+    write(args.directory, scale=args.scale)
+    print('corpus written to %s' % args.directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,11 +6,30 @@ as a Python Dictionary or JSON object
 from __future__ import print_function
 
 import ast
+import json
 import sys
-from collections import Sequence
+from array import array
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:  # Python 2
+    from collections import Mapping, Sequence
 from six import string_types
 
-__all__ = ["ast2dict"]
+__all__ = ["ast2dict", "ast2json_stream", "ast2compact", "CompactAST", "NodeView"]
+
+
+# Kinds of the exported values (also stored in CompactAST.kinds)
+VALUE_SCALAR = 0
+VALUE_NODE = 1
+VALUE_LIST = 2
+# Sequence inside a list, exported by ast2dict as a dictionary without fields
+VALUE_SEQUENCE = 3
+
+# Position of the nodes without lineno or col_offset and of the ones not
+# having an int there (stored in CompactAST.odd_positions)
+NO_POSITION = -1
+ODD_POSITION = -2
+_MISSING = object()
 
 
 def ast2dict(codestr):
@@ -20,6 +39,11 @@ def ast2dict(codestr):
 
 
 class DictExportVisitor(object):
+    """
+    Exports an AST as nested dictionaries. The tree is walked with an explicit
+    stack instead of recursion so deeply nested code (long elif chains, big
+    expressions) doesn't hit the recursion limit.
+    """
 
     def __init__(self, codestr, ast_parser=ast.parse):
         self.codestr = codestr
@@ -27,18 +51,19 @@ class DictExportVisitor(object):
     def _nodedict(self, node, newdict, ast_type=None):
         # Adds ast_type (if not specified), lineno and col_offset to the
         # node-derived dictionary
-        if ast_type is None:
-            ast_type = node.__class__.__name__
+        name, fields, attributes = _node_schema(node.__class__)
 
-        newdict["ast_type"] = ast_type
-        if hasattr(node, "lineno"):
-            newdict["lineno"] = node.lineno
+        newdict["ast_type"] = name if ast_type is None else ast_type
+        lineno = getattr(node, "lineno", _MISSING)
+        if lineno is not _MISSING:
+            newdict["lineno"] = lineno
 
-        if hasattr(node, "col_offset"):
-            newdict["col_offset"] = node.col_offset
+        col_offset = getattr(node, "col_offset", _MISSING)
+        if col_offset is not _MISSING:
+            newdict["col_offset"] = col_offset
 
-        newdict["_fields"] = getattr(node, "_fields", [])
-        newdict["_attributes"] = getattr(node, "_attributes", [])
+        newdict["_fields"] = [] if fields is None else fields
+        newdict["_attributes"] = [] if attributes is None else attributes
         return newdict
 
     def parse(self):
@@ -47,27 +72,431 @@ class DictExportVisitor(object):
         return res
 
     def visit(self, node, root=False):
-        if isinstance(node, string_types) or \
-                (not isinstance(node, Sequence) and
-                 not isinstance(node, ast.AST)):
+        if _value_kinds(node.__class__)[1] == VALUE_SCALAR:
             return node
 
-        nodedict = self._nodedict(node, {}, ast_type=node.__class__.__name__)
+        result = {}
+        # (node, dictionary to fill)
+        stack = [(node, result)]
+        pop = stack.pop
+        push = stack.append
+        kinds_of = _KINDS.get
+        schema_of = _SCHEMAS.get
+        while stack:
+            node, nodedict = pop()
+            # same as self._nodedict(node, nodedict) but faster
+            schema = schema_of(node.__class__) or _node_schema(node.__class__)
+            nodedict["ast_type"] = schema[0]
+            lineno = getattr(node, "lineno", _MISSING)
+            if lineno is not _MISSING:
+                nodedict["lineno"] = lineno
+            col_offset = getattr(node, "col_offset", _MISSING)
+            if col_offset is not _MISSING:
+                nodedict["col_offset"] = col_offset
+            fields = nodedict["_fields"] = [] if schema[1] is None else schema[1]
+            nodedict["_attributes"] = [] if schema[2] is None else schema[2]
 
-        for field in nodedict["_fields"]:
-            nodedict[field] = self.visit_field(getattr(node, field))
+            for field in fields:
+                value = getattr(node, field)
+                kinds = kinds_of(value.__class__) or _value_kinds(value.__class__)
+                if kinds[0] == VALUE_NODE:
+                    child = nodedict[field] = {}
+                    push((value, child))
+                elif kinds[0] == VALUE_LIST:
+                    items = nodedict[field] = []
+                    for item in value:
+                        kinds = kinds_of(item.__class__) or _value_kinds(item.__class__)
+                        if kinds[1] == VALUE_SCALAR:
+                            items.append(item)
+                        else:
+                            # nodes and sequences (exported as fieldless nodes)
+                            child = {}
+                            push((item, child))
+                            items.append(child)
+                else:
+                    nodedict[field] = value
 
-        return nodedict
+        return result
 
     def visit_field(self, node):
-        if isinstance(node, ast.AST):
+        kind = _value_kinds(node.__class__)[0]
+        if kind == VALUE_NODE:
             return self.visit(node)
-        elif isinstance(node, list) or isinstance(node, tuple):
+        elif kind == VALUE_LIST:
             return [self.visit(x) for x in node]
         else:
             return node
 
 
+# (ast_type, _fields, _attributes) of every node class, None if missing
+_SCHEMAS = {}
+
+
+def _node_schema(cls):
+    schema = _SCHEMAS.get(cls)
+    if schema is None:
+        schema = _SCHEMAS[cls] = (cls.__name__, getattr(cls, "_fields", None),
+                                  getattr(cls, "_attributes", None))
+    return schema
+
+
+# class -> (kind as a field value, kind as a list item)
+_KINDS = {}
+
+
+def _value_kinds(cls):
+    kinds = _KINDS.get(cls)
+    if kinds is None:
+        if issubclass(cls, ast.AST):
+            kinds = (VALUE_NODE, VALUE_NODE)
+        elif issubclass(cls, (list, tuple)):
+            kinds = (VALUE_LIST, VALUE_SEQUENCE)
+        elif not issubclass(cls, string_types) and issubclass(cls, Sequence):
+            kinds = (VALUE_SCALAR, VALUE_SEQUENCE)
+        else:
+            kinds = (VALUE_SCALAR, VALUE_SCALAR)
+        _KINDS[cls] = kinds
+    return kinds
+
+
+def ast2json_stream(codestr, fp, buffer_size=65536):
+    """
+    Writes the AST as JSON, with the same format than ast2dict, to the file-like
+    object fp (opened in text mode). The JSON is written while walking the tree
+    so, besides the AST itself, the memory used is bounded by its depth instead
+    of its size. Values that JSON can't represent (bytes, complex numbers,
+    Ellipsis) are written as their repr().
+
+    Args:
+        codestr (str): the source code to export.
+
+        fp (file-like): object with a write() method receiving the JSON text.
+
+        buffer_size (int): number of characters to buffer between writes.
+    """
+    tree = ast.parse(codestr, mode='exec')
+    parts = []
+    size = 0
+    for part in _json_parts(tree):
+        parts.append(part)
+        size += len(part)
+        if size >= buffer_size:
+            fp.write(''.join(parts))
+            del parts[:]
+            size = 0
+    fp.write(''.join(parts))
+
+
+def _json_parts(tree):
+    # Yields the JSON text of the tree, using a stack of generators (one per
+    # open node) instead of recursion
+    stack = [_json_node(tree)]
+    push = stack.append
+    while stack:
+        for part in stack[-1]:
+            if type(part) is str:
+                yield part
+            else:
+                push(_json_node(part))
+                break
+        else:
+            stack.pop()
+
+
+# JSON of the "_fields" and "_attributes" of every node class
+_JSON_SCHEMAS = {}
+
+
+def _json_node(node):
+    # Yields the JSON text of a node and, in its place, the child nodes (and
+    # sequences inside lists) to be written by _json_parts
+    nodecls = node.__class__
+    ast_type, fields, attributes = _node_schema(nodecls)
+    schema_json = _JSON_SCHEMAS.get(nodecls)
+    if schema_json is None:
+        schema_json = _JSON_SCHEMAS[nodecls] = '"_fields": %s, "_attributes": %s' % (
+            _json_scalar(list(fields or [])), _json_scalar(list(attributes or [])))
+
+    header = ['{"ast_type": ', _json_scalar(ast_type), ', ']
+    for name in ("lineno", "col_offset"):
+        value = getattr(node, name, _MISSING)
+        if value is not _MISSING:
+            header.append('"%s": %s, ' % (name, _json_scalar(value)))
+    header.append(schema_json)
+    yield ''.join(header)
+
+    for field in fields or []:
+        yield ', %s: ' % _json_scalar(field)
+        value = getattr(node, field)
+        kind = _value_kinds(value.__class__)[0]
+        if kind == VALUE_NODE:
+            yield value
+        elif kind == VALUE_LIST:
+            yield '['
+            for idx, item in enumerate(value):
+                if idx:
+                    yield ', '
+                if _value_kinds(item.__class__)[1] == VALUE_SCALAR:
+                    yield _json_scalar(item)
+                else:
+                    yield item
+            yield ']'
+        else:
+            yield _json_scalar(value)
+    yield '}'
+
+
+def _json_scalar(value):
+    try:
+        return json.dumps(value)
+    except (TypeError, ValueError):
+        return json.dumps(repr(value))
+
+
+def ast2compact(codestr):
+    """ Returns the AST as a CompactAST """
+    return CompactAST.from_ast(ast.parse(codestr, mode='exec'))
+
+
+class CompactAST(object):
+    """
+    Array backed export of an AST, holding the same information than the
+    ast2dict output in a fraction of its memory. The nodes are numbered (the
+    root is 0) and stored as parallel arrays of type ids, positions and the
+    offset of their fields in a flat list of values. The node types (with
+    their _fields and _attributes) are stored only once in the schemas.
+
+    Use the root property (a NodeView) to read it with the ast2dict shape or
+    to_dict() to convert it.
+    """
+
+    def __init__(self):
+        # (ast_type, _fields, _attributes) by type id
+        self.schemas = []
+        self.node_types = array('i')
+        self.linenos = array('i')
+        self.col_offsets = array('i')
+        # index in values of the first field of every node
+        self.field_starts = array('i')
+        self.kinds = array('b')
+        # scalars, node indexes, list indexes or sequence type names (see kinds)
+        self.values = []
+        self.list_starts = array('i')
+        self.list_lengths = array('i')
+        # (node index, attribute name) -> position not stored in the arrays
+        self.odd_positions = {}
+
+    def __len__(self):
+        return len(self.node_types)
+
+    @property
+    def root(self):
+        return NodeView(self, 0)
+
+    @classmethod
+    def from_ast(cls, tree):
+        """ Builds the compact export of an ast.AST """
+        self = cls()
+        schema_ids = {}
+        values = self.values
+        kinds = self.kinds
+        node_types = self.node_types
+        linenos = self.linenos
+        col_offsets = self.col_offsets
+        field_starts = self.field_starts
+        value_kinds = _value_kinds
+
+        # (node, slot in values holding its index or -1 for the root)
+        stack = [(tree, -1)]
+        pop = stack.pop
+        while stack:
+            node, slot = pop()
+            idx = len(node_types)
+            if slot >= 0:
+                values[slot] = idx
+
+            nodecls = node.__class__
+            type_id = schema_ids.get(nodecls)
+            if type_id is None:
+                type_id = schema_ids[nodecls] = len(self.schemas)
+                self.schemas.append((nodecls.__name__, getattr(node, "_fields", []),
+                                     getattr(node, "_attributes", [])))
+            fields = self.schemas[type_id][1]
+
+            node_types.append(type_id)
+            linenos.append(self._position(idx, node, "lineno"))
+            col_offsets.append(self._position(idx, node, "col_offset"))
+
+            start = len(values)
+            field_starts.append(start)
+            children = []
+            lists = []
+            for field in fields:
+                item = getattr(node, field)
+                kind = value_kinds(item.__class__)[0]
+                if kind == VALUE_NODE:
+                    children.append((item, len(values)))
+                    values.append(None)
+                    kinds.append(VALUE_NODE)
+                elif kind == VALUE_LIST:
+                    lists.append((len(values), item))
+                    values.append(None)
+                    kinds.append(VALUE_LIST)
+                else:
+                    values.append(item)
+                    kinds.append(VALUE_SCALAR)
+
+            # The items of the lists are stored after the fields
+            for pos, items in lists:
+                values[pos] = len(self.list_starts)
+                self.list_starts.append(len(values))
+                self.list_lengths.append(len(items))
+                for item in items:
+                    kind = value_kinds(item.__class__)[1]
+                    if kind == VALUE_NODE:
+                        children.append((item, len(values)))
+                        values.append(None)
+                        kinds.append(VALUE_NODE)
+                    elif kind == VALUE_SEQUENCE:
+                        values.append(item.__class__.__name__)
+                        kinds.append(VALUE_SEQUENCE)
+                    else:
+                        values.append(item)
+                        kinds.append(VALUE_SCALAR)
+
+            # visit the children in order
+            children.reverse()
+            stack.extend(children)
+
+        return self
+
+    def _position(self, idx, node, name):
+        value = getattr(node, name, _MISSING)
+        if type(value) is int and value >= 0:
+            return value
+        if value is _MISSING:
+            return NO_POSITION
+        self.odd_positions[(idx, name)] = value
+        return ODD_POSITION
+
+    def position(self, idx, name):
+        """ Returns the lineno or col_offset of a node, raising KeyError if missing """
+        value = (self.linenos if name == "lineno" else self.col_offsets)[idx]
+        if value == NO_POSITION:
+            raise KeyError(name)
+        if value == ODD_POSITION:
+            return self.odd_positions[(idx, name)]
+        return value
+
+    def has_position(self, idx, name):
+        return (self.linenos if name == "lineno" else self.col_offsets)[idx] != NO_POSITION
+
+    def value(self, pos, convert_node=None):
+        """
+        Returns the value stored at pos. The nodes are returned as NodeViews or
+        as convert_node(index) if given.
+        """
+        kind = self.kinds[pos]
+        value = self.values[pos]
+        if kind == VALUE_SCALAR:
+            return value
+        if kind == VALUE_NODE:
+            return NodeView(self, value) if convert_node is None else convert_node(value)
+        if kind == VALUE_SEQUENCE:
+            return {"ast_type": value, "_fields": [], "_attributes": []}
+
+        start = self.list_starts[value]
+        return [self.value(item_pos, convert_node)
+                for item_pos in range(start, start + self.list_lengths[value])]
+
+    def to_dict(self, idx=0):
+        """ Returns the node (the root by default) with the ast2dict format """
+        result = {}
+        # (node index, dictionary to fill)
+        stack = [(idx, result)]
+
+        def convert_node(child_idx):
+            child = {}
+            stack.append((child_idx, child))
+            return child
+
+        while stack:
+            idx, nodedict = stack.pop()
+            ast_type, fields, attributes = self.schemas[self.node_types[idx]]
+            nodedict["ast_type"] = ast_type
+            for name in ("lineno", "col_offset"):
+                if self.has_position(idx, name):
+                    nodedict[name] = self.position(idx, name)
+            nodedict["_fields"] = fields
+            nodedict["_attributes"] = attributes
+
+            start = self.field_starts[idx]
+            for pos, field in enumerate(fields, start):
+                nodedict[field] = self.value(pos, convert_node)
+
+        return result
+
+
+class NodeView(Mapping):
+    """
+    Read-only view of a CompactAST node with the same keys and values than
+    the dictionaries exported by ast2dict (children are NodeViews too).
+    """
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    def _schema(self):
+        return self.tree.schemas[self.tree.node_types[self.index]]
+
+    def __getitem__(self, key):
+        ast_type, fields, attributes = self._schema()
+        if key == "ast_type":
+            return ast_type
+        if key in ("lineno", "col_offset"):
+            return self.tree.position(self.index, key)
+        if key == "_fields":
+            return fields
+        if key == "_attributes":
+            return attributes
+        try:
+            pos = list(fields).index(key)
+        except ValueError:
+            raise KeyError(key)
+        return self.tree.value(self.tree.field_starts[self.index] + pos)
+
+    def __iter__(self):
+        yield "ast_type"
+        for name in ("lineno", "col_offset"):
+            if self.tree.has_position(self.index, name):
+                yield name
+        yield "_fields"
+        yield "_attributes"
+        for field in self._schema()[1]:
+            yield field
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __eq__(self, other):
+        if isinstance(other, NodeView):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "NodeView(%s, %d)" % (self._schema()[0], self.index)
+
+    def to_dict(self):
+        return self.tree.to_dict(self.index)
+
+
 if __name__ == '__main__':
     # for manual tests
 
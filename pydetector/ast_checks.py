@@ -1,13 +1,15 @@
-import ast
 import os
-import re
 import sys
 import subprocess
 from traceback import format_exc
 sys.path.insert(0, os.path.abspath(os.pardir))
 from pydetector.ast2dict import ast2dict  # noqa: E402
+from pydetector.ast_pool import OtherPythonPool, STATUS_OK, decode_repr, \
+        parse_error  # noqa: E402
+from pydetector import py2parser  # noqa: E402
+from pydetector.instrument import timed  # noqa: E402
 
-__all__ = ['check_ast']
+__all__ = ['check_ast', 'other_python_pool', 'use_py2parser', 'PY2_PARSERS']
 
 # This will store the AST to use for the "other" Python. It will be
 # loaded the first time its tested by getOtherPythonAstEngine
@@ -18,9 +20,166 @@ if sys.version_info[0] not in (2, 3):
 PYMAJOR_CURRENT = sys.version_info[0]
 PYMAJOR_OTHER = 2 if PYMAJOR_CURRENT == 3 else 3
 
+PY2_EXEC = '/usr/bin/python2'
+PY3_EXEC = '/usr/bin/python3'
+
+# How the Python 2 code is parsed when running under Python 3
+PY2_PARSERS = ('auto', 'builtin', 'interpreter')
+
+# executable -> bool, filled by _executable_exists
+_EXECUTABLES = {}
+
+
+def _executable_exists(name):
+    if name not in _EXECUTABLES:
+        if os.path.dirname(name):
+            paths = [name]
+        else:
+            paths = [os.path.join(path, name)
+                     for path in os.environ.get('PATH', os.defpath).split(os.pathsep)]
+        _EXECUTABLES[name] = any(os.path.isfile(path) and os.access(path, os.X_OK)
+                                 for path in paths)
+    return _EXECUTABLES[name]
+
+
+def use_py2parser(py2_parser='auto', build_ast=True, py2_exec=PY2_EXEC):
+    """
+    Returns True if check_ast, with these arguments, will parse the Python 2
+    code with the builtin parser (pydetector.py2parser) instead of a Python 2
+    interpreter. That's never the case running under Python 2.
+
+    Args:
+        py2_parser (str): "builtin", "interpreter" or "auto", which uses the
+            builtin parser only when the Python 2 interpreter is not installed.
+            A warm interpreter of the pool parses about twice as fast, even
+            when the ASTs are not built.
+
+        build_ast (bool): the build_ast argument of check_ast. It doesn't
+            change the choice.
+
+        py2_exec (str): path or name of the Python 2 interpreter.
+    """
+    if py2_parser not in PY2_PARSERS:
+        raise ValueError('Unknown py2_parser: %r' % (py2_parser,))
+
+    if PYMAJOR_OTHER != 2 or py2_parser == 'interpreter':
+        return False
+    if py2_parser == 'builtin':
+        return True
+    return not _executable_exists(py2_exec)
+
+
+def other_python_pool(size=1, timeout=None, verbosity=0, wire_format='binary',
+                      py2_exec=PY2_EXEC, py3_exec=PY3_EXEC):
+    """
+    Returns a pool of warm interpreters of the other Python version that can
+    be passed to check_ast. Please remember to close it when done.
+    """
+    pyexec_other = py2_exec if PYMAJOR_OTHER == 2 else py3_exec
+    return OtherPythonPool(pyexec_other, size=size, timeout=timeout, verbosity=verbosity,
+                           wire_format=wire_format)
+
+
+def _check_other_process(code, pyexec_other, verbosity=0, build_ast=True):
+    """
+    Start a new interpreter of the other Python version and try to export its AST
+    (or only parse the code if build_ast is False). Returns a tuple (ok, ast, error).
+    """
+    other_ok = False
+    other_ast = None
+    other_error = ""
+
+    # Open an external interpreter and try to export its AST
+    if build_ast:
+        cmd = [pyexec_other, "-c",
+               "import ast,pydetector.ast2dict,sys;"
+               "r=sys.stdin.read();"
+               "print(pydetector.ast2dict.ast2dict(r))"]
+    else:
+        cmd = [pyexec_other, "-c",
+               "import sys;from pydetector.ast_pool import parse_error;"
+               "e=parse_error(sys.stdin.read());"
+               "e and sys.stderr.write(e);"
+               "sys.exit(1 if e else 0)"]
+
+    if verbosity > 1:
+        print('Running in other Python:\n%s' % ' '.join(cmd))
+
+    try:
+        p = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = p.communicate(code.encode('utf-8'))
+        if p.returncode == 0:
+            other_ast = decode_repr(out) if build_ast else None
+            other_ok = True
+        else:
+            # text like the errors of the pool and the builtin parser
+            other_error = err.decode('utf-8', 'replace').strip()
+            if verbosity > 1:
+                print('>>>> ASTCHECK: error while parsing AST with Python%d:\n%s\n<<<< error output end'
+                      % (PYMAJOR_OTHER, other_error))
+    except:
+        other_ok = False
+        other_error = format_exc()
+        if verbosity > 1:
+            print('>>>> ASTCHECK: exception while parsing AST with Python%d:\n%s\n<<<< exception output end'
+                  % (PYMAJOR_OTHER, other_error))
+
+    return other_ok, other_ast, other_error
+
+
+def _check_other_pool(code, pool, verbosity=0, build_ast=True):
+    """
+    Export the AST (or only parse the code if build_ast is False) using a warm
+    interpreter from the pool. Returns a tuple (ok, ast, error). The failures
+    of the pool (a worker that crashed, hung or broke the protocol) are not
+    syntax errors of the code, so the WorkerError is raised instead.
+    """
+    other_ok = False
+    other_ast = None
+    other_error = ""
+
+    status, value = pool.request(code, build_ast=build_ast)
+    if status == STATUS_OK:
+        other_ast = value
+        other_ok = True
+    else:
+        other_error = value
+        if verbosity > 1:
+            print('>>>> ASTCHECK: error while parsing AST with Python%d:\n%s\n<<<< error output end'
+                  % (PYMAJOR_OTHER, other_error))
+
+    return other_ok, other_ast, other_error
+
+
+def _check_py2parser(code, verbosity=0, build_ast=True):
+    """
+    Parse the code with the builtin Python 2 parser. The "AST" is its concrete
+    syntax tree, exported with py2parser.tree2dict. Returns a tuple (ok, ast, error).
+    """
+    other_ok = False
+    other_ast = None
+
+    if build_ast:
+        try:
+            other_ast = py2parser.tree2dict(py2parser.parse(code))
+            other_ok = True
+            other_error = ""
+        except:
+            other_error = format_exc()
+    else:
+        other_error = py2parser.parse_error(code) or ""
+        other_ok = not other_error
+
+    if other_error and verbosity > 1:
+        print('>>>> ASTCHECK: error while parsing with the builtin Python 2 parser:\n%s\n'
+              '<<<< error output end' % other_error)
+
+    return other_ok, other_ast, other_error
+
 
 def check_ast(code, try_other_on_sucess=False, verbosity=0,
-              py2_exec='/usr/bin/python2', py3_exec='/usr/bin/python3'):
+              py2_exec=PY2_EXEC, py3_exec=PY3_EXEC, pool=None, build_ast=True,
+              py2_parser='auto', timings=None):
     """
     Try with the ast.parse of both Python 2 and 3 and then
     iterate over the retrieved AST to find specific syntax elements.
@@ -41,6 +200,29 @@ def check_ast(code, try_other_on_sucess=False, verbosity=0,
 
         py3_exec (str): path or name (if in PATH) of the Python 3 interpreter to use when
             running this under Python 2.
+
+        pool (OtherPythonPool, optional): pool of warm interpreters of the other
+            version. If given, it will be used instead of starting a new
+            interpreter process for this check and the py2_exec/py3_exec
+            arguments will be ignored. If the pool fails (a worker crashes,
+            hangs or breaks the protocol) WorkerError is raised instead of
+            taking it as a syntax error, so it can't decide the version.
+
+        build_ast (bool): if False, both interpreters will only check that the
+            code parses and the returned ASTs will be None. This is much faster
+            since the ASTs are not exported to dictionaries nor sent between the
+            processes. The errors will be the message and location of the
+            syntax error instead of a traceback.
+
+        py2_parser (str): running under Python 3, how to parse the code as
+            Python 2: with an interpreter ("interpreter"), with the builtin
+            parser ("builtin", the tree returned as py2_ast is a concrete
+            syntax tree instead of the Python 2 AST) or "auto", see
+            use_py2parser. The pool is not used with the builtin parser.
+
+        timings (dict, optional): if given, the seconds spent parsing with the
+            current and the other version are added to its "ast_current" and
+            "ast_other" keys.
     """
 
     current_ok = other_ok = False
@@ -49,50 +231,35 @@ def check_ast(code, try_other_on_sucess=False, verbosity=0,
 
     pyexec_other = py2_exec if PYMAJOR_OTHER == 2 else py3_exec
 
-    try:
-        current_ast = ast2dict(code)
-        current_ok = True
-    except:
-        # current_ok remains false
-        current_error = format_exc()
-        if verbosity > 1:
-            print('>>>> ASTCHECK: exception while parsing AST with Python%d:\n%s\n<<<< exception output end'
-                  % (PYMAJOR_CURRENT, current_error))
+    with timed(timings, 'ast_current'):
+        if build_ast:
+            try:
+                current_ast = ast2dict(code)
+                current_ok = True
+            except:
+                # current_ok remains false
+                current_error = format_exc()
+        else:
+            current_error = parse_error(code) or ""
+            current_ok = not current_error
+
+    if current_error and verbosity > 1:
+        print('>>>> ASTCHECK: exception while parsing AST with Python%d:\n%s\n<<<< exception output end'
+              % (PYMAJOR_CURRENT, current_error))
 
     if verbosity:
         print('AST extractable with version %d?: %s' % (PYMAJOR_CURRENT, str(current_ok)))
 
     if not current_ok or try_other_on_sucess:
-        # Open an external interpreter and try to export its AST
-        cmd = [pyexec_other, "-c",
-               "import ast,pydetector.ast2dict,sys;"
-               "r=sys.stdin.read();"
-               "print(pydetector.ast2dict.ast2dict(r))"]
-
-        if verbosity > 1:
-            print('Running in other Python:\n%s' % ' '.join(cmd))
-
-        try:
-            p = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            out, err = p.communicate(code.encode('utf-8'))
-            if p.returncode == 0:
-                if PYMAJOR_CURRENT == 3:
-                    # decode to (unicode) str and remove the "l or L" from long literals
-                    out = re.sub(r"('n': [0-9]+)[lL],", "\\1,", out.decode('utf-8'))
-
-                other_ast = ast.literal_eval(out)
-                other_ok = True
+        with timed(timings, 'ast_other'):
+            if use_py2parser(py2_parser, build_ast, py2_exec):
+                other_ok, other_ast, other_error = _check_py2parser(code, verbosity, build_ast)
+            elif pool is not None:
+                other_ok, other_ast, other_error = _check_other_pool(code, pool, verbosity,
+                                                                     build_ast)
             else:
-                other_error = err
-                if verbosity > 1:
-                    print('>>>> ASTCHECK: error while parsing AST with Python%d:\n%s\n<<<< error output end'
-                          % (PYMAJOR_OTHER, err))
-        except:
-            other_ok = False
-            other_error = format_exc()
-            if verbosity > 1:
-                print('>>>> ASTCHECK: exception while parsing AST with Python%d:\n%s\n<<<< exception output end'
-                      % (PYMAJOR_OTHER, other_error))
+                other_ok, other_ast, other_error = _check_other_process(code, pyexec_other,
+                                                                        verbosity, build_ast)
 
     if verbosity:
         print('AST extractable with version %d?: %s' % (PYMAJOR_OTHER, str(other_ok)))
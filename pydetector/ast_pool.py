@@ -0,0 +1,330 @@
+"""
+Pool of long-lived "other" Python interpreters used by the AST checks.
+
+Instead of starting a new python2/python3 process for every checked source,
+the pool keeps a number of warm interpreters (with pydetector.ast2dict already
+imported) that receive many sources over their stdin and send back the result
+over their stdout. Every message uses a simple frame: a 4 bytes big-endian
+length followed by the payload.
+
+Requests are a mode byte (b"A" to get the AST, b"P" to only check that the
+source parses) followed by the UTF-8 encoded source code. Responses start with
+a single status byte (b"0" for success, b"1" for error) followed by the AST
+dictionary (empty in parse only mode) or the error message. The AST is encoded
+with the binary format implemented in pydetector.wire (the default) or as its
+repr() (the "repr" wire format, slower but handy for debugging).
+
+This module must remain compatible with both Python 2 and 3 since the worker
+side runs under the other interpreter.
+"""
+
+from __future__ import print_function
+
+import ast
+import os
+import re
+import select
+import struct
+import subprocess
+import sys
+import threading
+import time
+from traceback import format_exc
+
+from six.moves import queue
+
+from pydetector import wire
+
+__all__ = ['OtherPythonPool', 'WorkerError', 'WIRE_FORMATS']
+
+_HEADER = struct.Struct('>I')
+STATUS_OK = b'0'
+STATUS_ERROR = b'1'
+MODE_AST = b'A'
+MODE_PARSE = b'P'
+
+WIRE_FORMATS = ('binary', 'repr')
+WORKER_CMD = "from pydetector.ast_pool import worker_main; worker_main(%r)"
+
+_CHUNK_SIZE = 1 << 16
+
+
+class WorkerError(Exception):
+    """ Raised when a worker crashes, hangs or breaks the protocol """
+    pass
+
+
+# Worker (child) side
+
+def _read_exact_stream(stream, size):
+    chunks = []
+    while size:
+        chunk = stream.read(size)
+        if not chunk:
+            raise EOFError()
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _write_frame(stream, payload):
+    stream.write(_HEADER.pack(len(payload)))
+    stream.write(payload)
+    stream.flush()
+
+
+def parse_error(code):
+    """
+    Parses the code without building anything else. Returns None if it's
+    correct or a message with the error and its location.
+    """
+    try:
+        ast.parse(code, mode='exec')
+    except Exception as exc:
+        return format_error(exc)
+    return None
+
+
+def format_error(exc):
+    """ Returns the message of the exception with its location if it's a SyntaxError """
+    if isinstance(exc, SyntaxError):
+        return '%s: %s (line %s, column %s)' % (type(exc).__name__, exc.msg,
+                                                exc.lineno, exc.offset)
+    return '%s: %s' % (type(exc).__name__, exc)
+
+
+def decode_repr(out):
+    """ Returns the AST dictionary from its repr() produced by the other Python """
+    if sys.version_info[0] == 3:
+        # decode to (unicode) str and remove the "l or L" from long literals
+        out = re.sub(r"('n': [0-9]+)[lL],", "\\1,", out.decode('utf-8'))
+
+    return ast.literal_eval(out)
+
+
+def worker_main(wire_format='binary'):
+    """
+    Main loop of the worker processes: reads framed sources from stdin and
+    writes framed responses to stdout until stdin is closed.
+    """
+    from pydetector.ast2dict import ast2dict
+
+    if wire_format == 'binary':
+        encode = wire.dumps
+    else:
+        def encode(tree):
+            return repr(tree).encode('utf-8')
+
+    instream = getattr(sys.stdin, 'buffer', sys.stdin)
+    outstream = getattr(sys.stdout, 'buffer', sys.stdout)
+    # Nothing else must write into the protocol channel
+    sys.stdout = sys.stderr
+
+    while True:
+        try:
+            header = _read_exact_stream(instream, _HEADER.size)
+        except EOFError:
+            break
+
+        payload = _read_exact_stream(instream, _HEADER.unpack(header)[0])
+        mode, payload = payload[:1], payload[1:]
+        if sys.version_info[0] == 3:
+            payload = payload.decode('utf-8')
+
+        if mode == MODE_PARSE:
+            error = parse_error(payload)
+            if error is None:
+                response = STATUS_OK
+            else:
+                if not isinstance(error, bytes):
+                    error = error.encode('utf-8')
+                response = STATUS_ERROR + error
+        else:
+            try:
+                response = STATUS_OK + encode(ast2dict(payload))
+            except:
+                response = STATUS_ERROR + format_exc().encode('utf-8')
+
+        _write_frame(outstream, response)
+
+
+# Parent side
+
+class _Worker(object):
+    """ A single warm interpreter and its end of the framed protocol """
+
+    def __init__(self, pyexec, wire_format):
+        self.wire_format = wire_format
+        self._devnull = open(os.devnull, 'wb')
+        self.proc = subprocess.Popen([pyexec, '-c', WORKER_CMD % wire_format],
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     stderr=self._devnull)
+        self._outfd = self.proc.stdout.fileno()
+
+    def _recv(self, size, deadline):
+        chunks = []
+        while size:
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0 or not select.select([self._outfd], [], [], remaining)[0]:
+                    raise WorkerError('timeout waiting for the worker response')
+
+            chunk = os.read(self._outfd, min(size, 1 << 20))
+            if not chunk:
+                raise WorkerError('worker exited with code %s' % self.proc.poll())
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def request(self, code, timeout=None, build_ast=True):
+        """
+        Sends the code to the worker and returns a tuple (status, value) where
+        value is the decoded AST dictionary (None if build_ast is False) or the
+        error message.
+        """
+        deadline = time.time() + timeout if timeout else None
+        mode = MODE_AST if build_ast else MODE_PARSE
+        _write_frame(self.proc.stdin, mode + code.encode('utf-8'))
+        size = _HEADER.unpack(self._recv(_HEADER.size, deadline))[0]
+        status = self._recv(1, deadline)
+        size -= 1
+
+        if status != STATUS_OK:
+            return status, self._recv(size, deadline).decode('utf-8')
+
+        if not build_ast:
+            if size:
+                raise WorkerError('unexpected data in the worker response')
+            return status, None
+
+        if self.wire_format == 'repr':
+            return status, decode_repr(self._recv(size, deadline))
+
+        # Decode while the rest of the response is still arriving
+        remaining = [size]
+
+        def read_chunk():
+            chunk_size = min(remaining[0], _CHUNK_SIZE)
+            remaining[0] -= chunk_size
+            return self._recv(chunk_size, deadline) if chunk_size else b''
+
+        value = wire.load(read_chunk)
+        if remaining[0]:
+            raise WorkerError('unexpected data after the AST in the worker response')
+        return status, value
+
+    def close(self, kill=False):
+        for action in (self.proc.kill if kill else None, self.proc.stdin.close,
+                       self.proc.wait, self.proc.stdout.close, self._devnull.close):
+            if action is None:
+                continue
+            try:
+                action()
+            except (OSError, IOError):
+                pass
+
+
+class OtherPythonPool(object):
+    """
+    Pool of warm interpreters of the other Python version. It can be safely
+    shared between threads; every thread will use a different worker.
+
+    Args:
+        pyexec (str): path or name (if in PATH) of the other Python interpreter.
+
+        size (int): maximum number of worker processes.
+
+        timeout (float, optional): seconds to wait for a worker response. Workers
+            that don't answer in time are considered hung and will be killed
+            and restarted.
+
+        verbosity (int): level from 0 to 2.
+
+        wire_format (str): encoding used to send back the AST, one of WIRE_FORMATS.
+    """
+
+    def __init__(self, pyexec, size=1, timeout=None, verbosity=0, wire_format='binary'):
+        if size < 1:
+            raise ValueError('the pool size must be at least 1')
+        if wire_format not in WIRE_FORMATS:
+            raise ValueError('unknown wire format: %s' % wire_format)
+
+        self.pyexec = pyexec
+        self.size = size
+        self.timeout = timeout
+        self.verbosity = verbosity
+        self.wire_format = wire_format
+        self.spawned = 0
+        self.restarts = 0
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._workers = set()
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _spawn(self):
+        worker = _Worker(self.pyexec, self.wire_format)
+        with self._lock:
+            self._workers.add(worker)
+            self.spawned += 1
+        if self.verbosity > 1:
+            print('Started %s AST worker (pid %d)' % (self.pyexec, worker.proc.pid))
+        return worker
+
+    def _discard(self, worker, kill=True):
+        with self._lock:
+            self._workers.discard(worker)
+        worker.close(kill=kill)
+
+    def request(self, code, build_ast=True):
+        """
+        Sends the code to a worker and returns the tuple (status, value) with
+        the AST dictionary or the error message. If build_ast is False the
+        worker only checks that the code parses and the value of a success is
+        None. Crashed or hung workers are replaced and WorkerError is raised.
+        """
+        if self._closed:
+            raise WorkerError('the pool is closed')
+
+        with self._slots:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                worker = self._spawn()
+
+            try:
+                try:
+                    result = worker.request(code, self.timeout, build_ast)
+                except (OSError, IOError):
+                    # The worker died while idle; retry once with a fresh one
+                    self._discard(worker)
+                    with self._lock:
+                        self.restarts += 1
+                    worker = self._spawn()
+                    result = worker.request(code, self.timeout, build_ast)
+            except (WorkerError, wire.WireError, OSError, IOError):
+                self._discard(worker)
+                with self._lock:
+                    self.restarts += 1
+                raise WorkerError('AST worker failed: %s' % format_exc())
+
+            self._idle.put(worker)
+            return result
+
+    def close(self):
+        """ Stops all the workers """
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+
+        for worker in workers:
+            worker.close()
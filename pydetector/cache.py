@@ -0,0 +1,146 @@
+"""
+Persistent, content-addressed cache of detection results.
+
+Results are stored in a SQLite database under the cache directory, keyed by the
+hash of the source bytes, the detection options and the rules version, so any
+change in the file contents, the options or the rules will produce a miss. The
+database size is bounded: when it grows over the limit the least recently used
+results are evicted.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+
+from six.moves import cPickle as pickle
+
+from pydetector.regexp_checks import RULES_VERSION
+from pydetector.version import __version__
+
+__all__ = ['ResultCache', 'DEFAULT_CACHE_SIZE']
+
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024
+DB_NAME = 'results.sqlite'
+
+# Check the size of the database every this number of insertions
+_EVICT_CHECK_INTERVAL = 64
+# When evicting, leave the database at this fraction of the limit
+_EVICT_TARGET = 0.9
+
+
+class ResultCache(object):
+    """
+    Args:
+        directory (str): directory where the database will be stored. It will be
+            created if it doesn't exist.
+
+        max_size (int): approximate maximum size in bytes of the stored results.
+
+    The instances can be passed to other processes (only the arguments are
+    pickled); every process opens its own connection to the database.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._pid = None
+        self._puts = 0
+
+    def __getstate__(self):
+        return {'directory': self.directory, 'max_size': self.max_size}
+
+    def __setstate__(self, state):
+        self.__init__(state['directory'], state['max_size'])
+
+    @property
+    def conn(self):
+        if self._conn is None or self._pid != os.getpid():
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                # already created, maybe by another process
+                if not os.path.isdir(self.directory):
+                    raise
+
+            conn = sqlite3.connect(os.path.join(self.directory, DB_NAME), timeout=60)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS results ('
+                         'key TEXT PRIMARY KEY, value BLOB, size INTEGER, '
+                         'last_access REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS results_last_access '
+                         'ON results (last_access)')
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def key(data, options):
+        """
+        Returns the cache key for the source bytes and the dictionary with
+        the detection options.
+        """
+        digest = hashlib.sha256()
+        digest.update(('%s:%s:' % (__version__, RULES_VERSION)).encode('utf-8'))
+        digest.update(repr(sorted(options.items())).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """ Returns the stored result for the key or None """
+        row = self.conn.execute('SELECT value FROM results WHERE key = ?',
+                                (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        with self.conn:
+            self.conn.execute('UPDATE results SET last_access = ? WHERE key = ?',
+                              (time.time(), key))
+        return pickle.loads(bytes(row[0]))
+
+    def put(self, key, result):
+        """ Stores the result, evicting the oldest ones if needed """
+        value = pickle.dumps(result, 2)
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                              (key, sqlite3.Binary(value), len(value), time.time()))
+
+        self._puts += 1
+        if self._puts % _EVICT_CHECK_INTERVAL == 1:
+            self.evict()
+
+    def size(self):
+        """ Returns the total size of the stored results """
+        return self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def evict(self):
+        """ Removes the least recently used results while over the size limit """
+        excess = self.size() - self.max_size
+        if excess <= 0:
+            return
+
+        excess += int(self.max_size * (1 - _EVICT_TARGET))
+        keys = []
+        cursor = self.conn.execute('SELECT key, size FROM results ORDER BY last_access')
+        for key, size in cursor:
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        cursor.close()
+
+        with self.conn:
+            self.conn.executemany('DELETE FROM results WHERE key = ?', keys)
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
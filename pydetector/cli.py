@@ -1,12 +1,26 @@
+from __future__ import print_function
+
 import sys
+import json
 import argparse
+import collections
 import subprocess
 from pprint import pprint
-from pydetector.detector import detect
+from pydetector.detector import detect, detect_iter
+from pydetector.ast2dict import ast2json_stream
+from pydetector.ast_pool import format_error
+from pydetector.encoding import read_source
+from pydetector.instrument import Instrumentation, STAGES
+from pydetector.profiler import profile_rules, SORT_KEYS
+from pydetector.project import detect_project
+from pydetector.regexp_checks import MODULES_SCANS
+from pydetector.scanner import scan
+from pydetector import server
 
 def parse_args():
     # TODO: add arguments for python executables
-    parser = argparse.ArgumentParser()
+    parser = argparse.ArgumentParser(
+            epilog="Use \"pydetector serve --help\" for the options of the detection server")
     parser.add_argument("-v", "--verbosity", type=int, default=0,
             help="increase output verbosity (0 to 2)")
 
@@ -24,16 +38,99 @@ def parse_args():
             help="Do the AST test with the other version even if the first one works"
                  "(default=enabled)")
 
+    parser.add_argument("-w", "--astworkers", type=int, default=1,
+            help="Number of warm interpreters of the other Python version used for "
+                 "the AST tests. 0 starts a new one for every file (default=1)")
+
+    parser.add_argument("-t", "--asttimeout", type=float, default=60,
+            help="Seconds to wait for the other Python version to parse a file "
+                 "before restarting it (default=60)")
+
+    parser.add_argument("--astwire", choices=("binary", "repr"), default="binary",
+            help="Encoding used by the other Python version to send back its AST "
+                 "(default=binary)")
+
+    parser.add_argument("--py2parser", choices=("auto", "builtin", "interpreter"),
+            default="auto",
+            help="Under Python 3, parse the Python 2 code with the builtin parser or "
+                 "a Python 2 interpreter. auto uses the builtin one only when Python 2 "
+                 "is not installed (default=auto)")
+
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+            help="Number of processes used to check the files in parallel, 0 to "
+                 "use one per CPU (default=1)")
+
+    parser.add_argument("-c", "--cachedir", default=None,
+            help="Directory of the persistent results cache (default=no cache)")
+
+    parser.add_argument("--cachesize", type=int, default=512,
+            help="Maximum size in MB of the results cache (default=512)")
+
+    parser.add_argument("--manifest", metavar="FILE", default=None,
+            help="Manifest of the previous run: only the new or changed files are "
+                 "checked again and it's updated at the end (default=check all)")
+
     parser.add_argument("-m", "--testmodules", action="store_true", default=True,
             help="Test for version-specific modules (default=enabled)")
 
+    parser.add_argument("--modulesscan", choices=MODULES_SCANS, default="full",
+            help="Look for the version-specific modules in all the code or only in "
+                 "the imports at the start of the files, much faster with long files "
+                 "but missing the imports done later (default=full)")
+
     parser.add_argument("-s", "--testmodulesyms", action="store_true", default=False,
-            help="Test for version-specific module symbols (WARNING: SLOW!) (default=disabled)")
+            help="Test for version-specific module symbols (default=disabled)")
+
+    parser.add_argument("-e", "--earlyexit", type=int, default=None, metavar="MARGIN",
+            help="Stop checking a file once the difference between the Python 2 and 3 "
+                 "scores exceeds MARGIN, running the cheapest checks first "
+                 "(default=run all the checks)")
+
+    parser.add_argument("--regextimeout", type=float, default=None, metavar="SECONDS",
+            help="Time budget of the regex checks of every file. The files exceeding it "
+                 "are reported as timed out with the checks finished until then "
+                 "(default=no limit)")
+
+    parser.add_argument("-p", "--project", action="store_true", default=False,
+            help="Show a single verdict for all the files, checking a random sample "
+                 "of them until it's reached with the --confidence level")
+
+    parser.add_argument("--confidence", type=float, default=0.95,
+            help="Confidence level of the --project verdict (default=0.95)")
+
+    parser.add_argument("--timings", action="store_true", default=False,
+            help="Add the seconds spent in every stage to the results and show the "
+                 "totals and counters of the run")
+
+    parser.add_argument("--profilerules", choices=SORT_KEYS, default=None, metavar="SORT",
+            help="Instead of detecting the versions, show the cost and hits of every "
+                 "regex rule over the files, sorted by one of: %s" % ", ".join(SORT_KEYS))
+
+    parser.add_argument("-f", "--format", choices=("pprint", "jsonl", "json"), default="pprint",
+            help="Output format: the Python representation of all the results (pprint), "
+                 "a JSON object per line and file written as soon as it's checked "
+                 "(jsonl) or a single JSON object with the files as keys, streamed "
+                 "the same way (json). The messages of --verbosity and --timings go to "
+                 "the standard error with the JSON formats (default=pprint)")
 
     parser.add_argument("-A", "--showast", action="store_true", default=False,
             help="Include the parsed AST")
 
-    parser.add_argument("files", nargs=argparse.REMAINDER, help="Files to parse")
+    parser.add_argument("--astjson", metavar="FILE", default=None,
+            help="Write the AST of every file parsed by the running Python version "
+                 "to FILE as JSON Lines, streamed without building it in memory")
+
+    parser.add_argument("-x", "--exclude", action="append", default=[], metavar="PATTERN",
+            help="Skip the paths matching this .gitignore style pattern when walking "
+                 "the directories. Can be used more than once")
+
+    parser.add_argument("--no-gitignore", dest="gitignore", action="store_false",
+            help="Don't skip the paths ignored by the .gitignore files of the "
+                 "directories (default=skip them)")
+
+    parser.add_argument("files", nargs=argparse.REMAINDER,
+            help="Files to parse. The directories are walked recursively looking for "
+                 "Python files (by extension or shebang)")
 
     args = parser.parse_args()
 
@@ -45,9 +142,12 @@ def parse_args():
     if args.testast and args.verbosity > 0:
         PYMAJOR_CURRENT = sys.version_info[0]
         PYMAJOR_OTHER = 2 if PYMAJOR_CURRENT == 3 else 3
+        # with the JSON formats the standard output only has the results
+        info = sys.stdout if args.format == 'pprint' else sys.stderr
         if args.verbosity:
             print('Running under Python%d, Python%d will be used for the '
-                   % (PYMAJOR_CURRENT, PYMAJOR_OTHER) + 'alternative AST tests.')
+                   % (PYMAJOR_CURRENT, PYMAJOR_OTHER) + 'alternative AST tests.',
+                  file=info)
 
         # Test that the other Python version have pydetect installed
         try:
@@ -58,43 +158,169 @@ def parse_args():
         except subprocess.CalledProcess:
             print('Error: AST checks enabled but pydetector is not installed for ' +
                     'Python%d.\nPlease install it and try again or disable AST checks'
-                    % PYMAJOR_OTHER)
+                    % PYMAJOR_OTHER, file=info)
 
     return args
 
-def main():
-    args = parse_args()
+def write_astjson(files, path):
+    """
+    Writes a JSON object per line to path with the keys "filename", "ast" (null
+    if it could not be parsed) and "error" (null if it could).
+    """
+    with open(path, 'w') as outfile:
+        for filename in files:
+            outfile.write('{"filename": %s, "ast": ' % json.dumps(filename))
+            error = None
+            try:
+                code = read_source(filename)[0]
+                # nothing is written if the code can't be parsed
+                ast2json_stream(code, outfile)
+            except Exception as exc:
+                error = format_error(exc)
+                outfile.write('null')
+            outfile.write(', "error": %s}\n' % json.dumps(error))
 
-    returndict = detect(
-            args.files,
+
+def input_files(args):
+    """
+    Returns a generator of the files to check, walking the directories given
+    (lazily, so the detection starts with the first file found).
+    """
+    return scan(args.files, excludes=args.exclude, gitignore=args.gitignore)
+
+
+def detect_options(args):
+    """ Returns the arguments of detect() given in the command line """
+    return dict(
             ast_checks=args.testast,
             modules_checks=args.testmodules,
             modsyms_checks=args.testmodulesyms,
             stop_on_ok_ast=not args.asttestboth,
-            verbosity=args.verbosity
+            verbosity=args.verbosity,
+            ast_workers=args.astworkers,
+            ast_timeout=args.asttimeout,
+            ast_wire_format=args.astwire,
+            jobs=args.jobs,
+            cache_dir=args.cachedir,
+            cache_size=args.cachesize * 1024 * 1024,
+            # the ASTs are only exported if they will be shown
+            build_ast=args.showast,
+            py2_parser=args.py2parser,
+            early_exit_margin=args.earlyexit,
+            regex_timeout=args.regextimeout,
+            modules_scan=args.modulesscan,
             )
 
-    if not args.showast:
-        for fdata in returndict:
-            del returndict[fdata]['py2ast'] # not json serializable in the current form
-            del returndict[fdata]['py3ast'] # not json serializable in the current form
 
-    pprint(returndict)
+def write_json(results, output_format, showast, outfile):
+    """
+    Writes the (filename, result) tuples of detect_iter() as they come, flushing
+    after every file: a JSON object per line with the "filename" and the keys
+    of the result ("jsonl") or a single JSON object with the filenames as keys
+    ("json"). The values JSON can't represent (like the bytes of the ASTs) are
+    written as their repr(). Returns a Counter of the versions found.
+    """
+    versions = collections.Counter()
+    if output_format == 'json':
+        outfile.write('{')
+    for idx, (filename, result) in enumerate(results):
+        versions[result['version']] += 1
+        if not showast:
+            del result['py2ast']
+            del result['py3ast']
+
+        if output_format == 'jsonl':
+            record = {'filename': filename}
+            record.update(result)
+            outfile.write(json.dumps(record, default=repr) + '\n')
+        else:
+            outfile.write('%s\n%s: %s' % (',' if idx else '', json.dumps(filename),
+                                          json.dumps(result, default=repr)))
+        outfile.flush()
+    if output_format == 'json':
+        outfile.write('\n}\n')
+    return versions
+
+
+def print_instrumentation(instrumentation, outfile=None):
+    outfile = outfile or sys.stdout
+    print('Seconds per stage:', file=outfile)
+    for stage in STAGES + ('total',):
+        print('  %-12s %10.4f' % (stage, instrumentation.timings[stage]), file=outfile)
+    print('Counters:', file=outfile)
+    for name, value in sorted(instrumentation.counters.items()):
+        print('  %-16s %d' % (name, value), file=outfile)
+
+
+def print_summary(versions, defaultversion, outfile=None):
+    """ Prints the number of files of every version, given as a Counter """
+    py2_count = versions[2] + (versions[6] if defaultversion == 2 else 0)
+    py3_count = versions[3] + (versions[6] if defaultversion == 3 else 0)
+    total = sum(versions.values())
+    print('%d files parsed, py2: %d, py3: %d any: %d' %
+            (total, py2_count, py3_count, total - py2_count - py3_count),
+          file=outfile or sys.stdout)
+
+
+def main():
+    if sys.argv[1:2] == ['serve']:
+        server.main(sys.argv[2:])
+        return
+
+    args = parse_args()
+
+    if args.astjson:
+        write_astjson(input_files(args), args.astjson)
+
+    if args.profilerules:
+        profiler = profile_rules(input_files(args), ast_checks=args.testast,
+                                 py2_parser=args.py2parser)
+        print(profiler.report(sort=args.profilerules))
+        return
+
+    instrumentation = Instrumentation() if args.timings else None
+    # with the JSON formats the standard output only has the results
+    info = sys.stdout if args.format == 'pprint' else sys.stderr
+    if args.project:
+        verdict = detect_project(args.files, confidence=args.confidence,
+                                 excludes=args.exclude, gitignore=args.gitignore,
+                                 instrumentation=instrumentation, **detect_options(args))
+        if args.format == 'pprint':
+            pprint(verdict)
+        else:
+            print(json.dumps(verdict, default=repr))
+        if instrumentation is not None:
+            print_instrumentation(instrumentation, info)
+        return
+
+    if args.format == 'pprint':
+        returndict = detect(input_files(args), manifest=args.manifest,
+                            instrumentation=instrumentation, **detect_options(args))
+
+        if not args.showast:
+            for fdata in returndict:
+                del returndict[fdata]['py2ast'] # not json serializable in the current form
+                del returndict[fdata]['py3ast'] # not json serializable in the current form
+
+        pprint(returndict)
+        versions = collections.Counter(result['version'] for result in returndict.values())
+    else:
+        # the results are written and forgotten as they come, the messages
+        # printed while checking go to the standard error
+        outfile, sys.stdout = sys.stdout, sys.stderr
+        results = detect_iter(input_files(args), manifest=args.manifest,
+                              instrumentation=instrumentation, **detect_options(args))
+        try:
+            versions = write_json(results, args.format, args.showast, outfile)
+        finally:
+            results.close()
+            sys.stdout = outfile
+
+    if instrumentation is not None:
+        print_instrumentation(instrumentation, info)
 
     if args.verbosity:
-        py2_count = py3_count = pyany_count = 0
-        for key in returndict:
-            version = returndict[key]['version']
-
-            if version == 2 or (version == 6 and args.defaultversion == 2):
-                py2_count += 1
-            elif version == 3 or (version == 6 and args.defaultversion == 3):
-                py3_count += 1
-            else:
-                pyany_count += 1
-
-        print('%d files parsed, py2: %d, py3: %d any: %d' %
-                (len(returndict), py2_count, py3_count, pyany_count))
+        print_summary(versions, args.defaultversion, info)
 
 
 if __name__ == "__main__":
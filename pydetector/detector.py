@@ -1,12 +1,23 @@
+import collections
+import multiprocessing
 import re
+from multiprocessing.util import Finalize
+from traceback import format_exc
 
 from io import open
-from pydetector.ast_checks import check_ast
+from pydetector.ast_checks import check_ast, other_python_pool, use_py2parser
+from pydetector.cache import ResultCache, DEFAULT_CACHE_SIZE
+from pydetector.encoding import decode_source
+from pydetector.instrument import timed
+from pydetector.manifest import Manifest
 from pydetector.regexp_checks import check_syntax_regex, check_modules_regex,\
         check_modulesymbols_regex
+from pydetector.watchdog import RegexTimeout, deadline
 
-__all__ = ['detect']
+__all__ = ['detect', 'detect_iter', 'detect_file', 'check_options']
 
+# Legacy regex based stripper, only used for sources with unterminated
+# triple quoted strings
 QUOTE_TRIPLE_SUBREGEX = re.compile(r'''\"{3}(.*?)\"{3}|'{3}(.*?)'{3}''', re.DOTALL)
 QUOTE_SUBREGEX = re.compile(
     r'''(?<!(\\|'))\".*(?<!\\)\"''' +
@@ -15,13 +26,28 @@ QUOTE_SUBREGEX = re.compile(
 )
 COMMENT_SUBREGEX = re.compile(r"#.*$", re.MULTILINE)
 
+# Tokens removed or replaced by remove_str_comments, scanned left to right in a
+# single pass. Every alternative is linear: the string bodies are written as
+# "unrolled loops" that can't backtrack. Single quoted strings without closing
+# quote end with the line; bare triple quotes are unterminated strings. The
+# backslashes outside strings escape the next character (line continuations).
+STRIP_REGEX = re.compile(
+    r'#[^\n]*'
+    r'|"""[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*"""'
+    r"|'''[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*'''"
+    r'|"""|' r"'''"
+    r'|"[^"\\\n]*(?:\\.[^"\\\n]*)*(?:"|(?=\n)|\\?\Z)'
+    r"|'[^'\\\n]*(?:\\.[^'\\\n]*)*(?:'|(?=\n)|\\?\Z)"
+    r'|\\.',
+    re.DOTALL
+)
 
-def remove_str_comments(code):
-    """
-    Remove all the comments in the code (from the # to EOL). Returns
-    a new string with the comments removed. This improves the detection
-    rates a lot removing most of the false positives.
-    """
+
+class _UnterminatedString(Exception):
+    pass
+
+
+def _remove_str_comments_regex(code):
     # Empty strings
     newcode = QUOTE_TRIPLE_SUBREGEX.sub("''", code)
     newcode = QUOTE_SUBREGEX.sub("''", newcode)
@@ -29,9 +55,50 @@ def remove_str_comments(code):
     return COMMENT_SUBREGEX.sub("", newcode)
 
 
+def remove_str_comments(code, keep_lines=False):
+    """
+    Remove all the comments in the code (from the # to EOL) and replace the
+    strings (with any prefix, triple quoted or not) with empty ones. Returns a
+    new string. This improves the detection rates a lot removing most of the
+    false positives.
+
+    The code is scanned once, in linear time. Sources with unterminated triple
+    quoted strings (which are not valid Python) are handled by the previous
+    regex based implementation.
+
+    Args:
+        code (str): The code
+        keep_lines (bool): add the newlines of the removed multiline strings
+            after their replacement, so the line numbers don't change. The
+            regex checks need them collapsed: their rules match within a line,
+            like a call with a multiline string argument.
+    """
+    def replace(match):
+        token = match.group()
+        char = token[0]
+        if char == '#':
+            return ''
+        if char == '\\':
+            return token
+        if len(token) == 3 and token == char * 3:
+            raise _UnterminatedString()
+
+        newlines = token.count('\n') if keep_lines else 0
+        return "''" + '\n' * newlines if newlines else "''"
+
+    try:
+        return STRIP_REGEX.sub(replace, code)
+    except _UnterminatedString:
+        return _remove_str_comments_regex(code)
+
+
 def detect(files=None, codestr=None, ast_checks=True, modules_checks=True,
         modsyms_checks=False, stop_on_ok_ast=False, modules_score=150,
-        symbols_score=100, verbosity=0):
+        symbols_score=100, verbosity=0, ast_workers=1, ast_timeout=60,
+        ast_wire_format='binary', jobs=1, chunksize=None, cache_dir=None,
+        cache_size=DEFAULT_CACHE_SIZE, build_ast=True, py2_parser='auto',
+        early_exit_margin=None, manifest=None, instrumentation=None,
+        regex_timeout=None, modules_scan='full'):
     """
         Try to detect if a source file is Python 2 or 3. It uses a combination of
     tests based on AST extraction and regular expressions.
@@ -48,7 +115,6 @@ def detect(files=None, codestr=None, ast_checks=True, modules_checks=True,
         modules_checks (bool): enable checking version-specific module imports
 
         modsyms_checks (bool): enable checking version-specific module symbols.
-        Please note that this test can be much slower than the others.
 
         stop_on_ok_ast (bool): if the first AST tested works, don't even try with
         the other version
@@ -59,113 +125,556 @@ def detect(files=None, codestr=None, ast_checks=True, modules_checks=True,
 
         verbosity (int): verbosity level from 0 (quiet) to 2
 
+        ast_workers (int): number of warm interpreters of the other Python version
+        kept alive during the detection for the AST checks. With 0 a new interpreter
+        will be started for every file.
+
+        ast_timeout (float): seconds to wait for the other interpreter to parse a
+        file before considering it hung and restarting it.
+
+        ast_wire_format (str): encoding used by the other interpreter to send back
+        its AST: "binary" (compact and fast) or "repr" (the legacy representation).
+
+        jobs (int): number of processes used to check the files in parallel. With 0
+        the number of CPUs will be used.
+
+        chunksize (int, optional): number of files sent at once to every process
+        when jobs is not 1. By default it's calculated from the number of files.
+
+        cache_dir (str, optional): directory of the persistent results cache. If
+        given, the results will be stored there keyed by the contents of the file,
+        the options and the rules version, and reused in the next runs.
+
+        cache_size (int): maximum size in bytes of the results cache. The least
+        recently used results will be removed when it's exceeded.
+
+        build_ast (bool): export the ASTs into the "py2ast" and "py3ast" keys of
+        the results. If False the AST checks only test if the code parses with
+        every version, which is much faster.
+
+        py2_parser (str): running under Python 3, parse the Python 2 code with a
+        Python 2 interpreter ("interpreter"), with the builtin parser of
+        pydetector.py2parser ("builtin", its "py2ast" is a concrete syntax tree)
+        or "auto": the builtin parser only if there is no Python 2 interpreter.
+        No interpreters are started for the builtin parser.
+
+        early_exit_margin (int, optional): stop checking a file as soon as the
+        difference between the Python 2 and 3 scores exceeds it. The checks run
+        cheapest first: the syntax, modules and module symbols regexes (about
+        0.06, 0.11 and 0.23 s for 200 stdlib files) and then, only if the
+        margin wasn't exceeded, the AST checks (about 1.1 s). The results will
+        only have the matches found until then. By default all the checks are
+        done, starting with the AST ones.
+
+        manifest (str, optional): file of the manifest for incremental runs. The
+        files with the same modification time and size (or contents) as in the
+        previous run with the same options reuse its results without being read;
+        the others are checked. The manifest is updated at the end of the run,
+        removing the files not seen. Ignored with codestr.
+
+        instrumentation (Instrumentation, optional): collect the timings and
+        counters of the run and call its hooks after every file, see
+        pydetector.instrument. The results will have a "timings" key with the
+        seconds spent in every stage.
+
+        regex_timeout (float, optional): time budget in seconds of the regex
+        checks of every file. A file exceeding it gets the scores of the regex
+        checks finished until then and "timed_out" True, instead of stalling
+        the detection. Its result is not cached. A single long match is only
+        interrupted (with SIGALRM) when the checks run in the main thread of
+        a Unix process; otherwise, like in the threads of a server, the budget
+        is only checked between the matches. By default the checks have no
+        limit.
+
+        modules_scan (str): where the modules checks look for the imports: in
+        all the code ("full") or only in the header of the module ("header"),
+        from the start until the first statement that is not an import, its
+        docstring, a "__dunder__" assignment or a try or if block. The header
+        is much faster with long modules but misses the imports done later,
+        like inside the functions.
+
     Return:
         Dictionary where each key is the filename and the value another dictionary
         with the keys "py2ast" and "py3ast" that will hold the AST if sucessfully
         parser for that version or "None", "version" with the version number (2 or
         3) or 6 is the module seems to be compatible with both versions, "matches"
         that will hold a list of the matched rules and scores and
-        "py2_score/py3_score" with the specific score.
+        "py2_score/py3_score" with the specific score, "encoding" with the encoding
+        used to decode the file, "early_exit" with True if the checks were
+        stopped by early_exit_margin, "timed_out" with True if the regex checks
+        exceeded regex_timeout. If a file couldn't be
+        checked its dictionary will have an "error" key with the traceback.
     """
 
     returndict = {}
+    for filename, result in detect_iter(
+            files=files, codestr=codestr, ast_checks=ast_checks,
+            modules_checks=modules_checks, modsyms_checks=modsyms_checks,
+            stop_on_ok_ast=stop_on_ok_ast, modules_score=modules_score,
+            symbols_score=symbols_score, verbosity=verbosity, ast_workers=ast_workers,
+            ast_timeout=ast_timeout, ast_wire_format=ast_wire_format, jobs=jobs,
+            chunksize=chunksize, cache_dir=cache_dir, cache_size=cache_size,
+            build_ast=build_ast, py2_parser=py2_parser,
+            early_exit_margin=early_exit_margin, manifest=manifest,
+            instrumentation=instrumentation, regex_timeout=regex_timeout,
+            modules_scan=modules_scan):
+        returndict[filename] = result
+
+    return returndict
+
 
+def detect_iter(files=None, codestr=None, ast_checks=True, modules_checks=True,
+        modsyms_checks=False, stop_on_ok_ast=False, modules_score=150,
+        symbols_score=100, verbosity=0, ast_workers=1, ast_timeout=60,
+        ast_wire_format='binary', jobs=1, chunksize=None, cache_dir=None,
+        cache_size=DEFAULT_CACHE_SIZE, build_ast=True, py2_parser='auto',
+        early_exit_margin=None, manifest=None, instrumentation=None,
+        regex_timeout=None, modules_scan='full'):
+    """
+    Generator version of detect(), with the same arguments. The files can be
+    any iterable of paths (even a lazy one, like the lines read from stdin) and
+    the tuples (filename, result) are yielded as soon as every file is checked,
+    in the same order, without keeping the results.
+
+    If the generator is not exhausted, closing it (or deleting it) will stop
+    the worker processes.
+    """
     if not files:
         if not codestr:
             raise Exception('files or codestr parameters are required')
         files = ['<code_string>']
 
-    for filename in files:
-        returndict[filename] = {
-            'py2ast': None,
-            'py3ast': None,
-            'version': 0,
-            'matches': [],
-            'py2_score': 0,
-            'py3_score': 0,
-            'py2_ast_errors': [],
-            'py3_ast_errors': [],
+    options = check_options(
+        ast_checks=ast_checks, modules_checks=modules_checks,
+        modsyms_checks=modsyms_checks, stop_on_ok_ast=stop_on_ok_ast,
+        modules_score=modules_score, symbols_score=symbols_score, verbosity=verbosity,
+        build_ast=build_ast, py2_parser=py2_parser, early_exit_margin=early_exit_margin,
+        regex_timeout=regex_timeout, modules_scan=modules_scan)
+    pool_options = None
+    if ast_checks and ast_workers > 0 and not use_py2parser(py2_parser, build_ast):
+        pool_options = {
+            'size': ast_workers,
+            'timeout': ast_timeout,
+            'verbosity': verbosity,
+            'wire_format': ast_wire_format,
         }
-        retdict = returndict[filename]  # alias
 
-        # helper for lazy bastards
-        def apply_score(py2_score, py3_score):
-            retdict['py2_score'] += py2_score
-            retdict['py3_score'] += py3_score
+    cache = None
+    if cache_dir is not None:
+        cache = ResultCache(cache_dir, max_size=cache_size)
+
+    if jobs == 0:
+        jobs = multiprocessing.cpu_count()
+
+    if manifest is not None and codestr is None:
+        manifest = Manifest(manifest, _cache_options(options))
+    else:
+        manifest = None
+
+    instrument = instrumentation is not None
+    if jobs > 1 and codestr is None:
+        results = _iter_parallel(files, jobs, chunksize, options, pool_options, cache,
+                                 manifest, instrument)
+    else:
+        results = _iter_serial(files, codestr, options, pool_options, cache, manifest,
+                               instrument)
+
+    finished = False
+    try:
+        for filename, result, metrics in results:
+            if instrument:
+                result['timings'] = metrics['timings']
+                instrumentation.record(filename, metrics['timings'], metrics['counters'])
+            yield filename, result
+        finished = True
+    finally:
+        # stop the processes before closing the cache
+        results.close()
+        if manifest is not None:
+            manifest.save(complete=finished)
+            if verbosity:
+                print('Manifest: %d results reused, %d files checked'
+                      % (manifest.reused, manifest.checked))
+        if cache is not None:
+            cache.close()
+            if verbosity:
+                print('Result cache: %d hits, %d misses' % (cache.hits, cache.misses))
+
+
+def check_options(ast_checks=True, modules_checks=True, modsyms_checks=False,
+        stop_on_ok_ast=False, modules_score=150, symbols_score=100, verbosity=0,
+        build_ast=True, py2_parser='auto', early_exit_margin=None, regex_timeout=None,
+        modules_scan='full'):
+    """
+    Returns the dictionary of options of the checks of a file for detect_file(),
+    with the arguments and defaults of detect(). Unknown options raise TypeError.
+    """
+    return {
+        'ast_checks': ast_checks,
+        'modules_checks': modules_checks,
+        'modsyms_checks': modsyms_checks,
+        'stop_on_ok_ast': stop_on_ok_ast,
+        'modules_score': modules_score,
+        'symbols_score': symbols_score,
+        'verbosity': verbosity,
+        'build_ast': build_ast,
+        'py2_parser': py2_parser,
+        'early_exit_margin': early_exit_margin,
+        'regex_timeout': regex_timeout,
+        'modules_scan': modules_scan,
+    }
+
+
+def detect_file(filename, codestr=None, options=None, pool=None, cache=None):
+    """
+    Checks a single file, or the code of codestr if filename is "<code_string>",
+    and returns its result as detect() does.
+
+    Args:
+        options (dict, optional): the options returned by check_options()
+        (its defaults if not given).
 
-        if verbosity:
-            print('Checking file %s: ' % filename)
+        pool (OtherPythonPool, optional): the interpreters of the other Python
+        version used by the AST checks, from ast_checks.other_python_pool(). A
+        new one is started for every file if not given.
 
-        input_code = None
+        cache (ResultCache, optional): cache of the results. It can't be
+        shared between threads.
 
-        if filename == '<code_string>':
-            input_code = codestr
+    Long running processes can keep the pool and the cache between the
+    calls so the files don't pay for starting them.
+    """
+    if options is None:
+        options = check_options()
+    return _detect_file_safe(filename, codestr, pool, cache, options)[0]
+
+
+def _iter_parallel(files, jobs, chunksize, options, pool_options, cache, manifest,
+                   instrument):
+    if chunksize is None:
+        # Small enough chunks to balance the load between the processes
+        numfiles = len(files) if hasattr(files, '__len__') else 1024
+        chunksize = max(1, min(64, numfiles // (jobs * 8)))
+
+    # With a manifest only the changed files are sent to the processes, the
+    # results reused are queued (in order) with the ones being checked
+    if manifest is not None:
+        queued = collections.deque()
+        files = _changed_files(files, manifest, queued, instrument)
+
+    procpool = multiprocessing.Pool(jobs, initializer=_init_job_process,
+                                    initargs=(options, pool_options, cache, instrument))
+    finished = False
+    try:
+        for filename, result, cache_hit, metrics in procpool.imap(_detect_job, files,
+                                                                  chunksize):
+            _count_cache_hit(cache, cache_hit)
+            if manifest is not None:
+                manifest.update(filename, result)
+                for queued_result in _pop_reused(queued):
+                    yield queued_result
+                # this file is the next one in the queue
+                queued.popleft()
+            yield filename, result, metrics
+
+        if manifest is not None:
+            for queued_result in _pop_reused(queued):
+                yield queued_result
+        finished = True
+    finally:
+        if finished:
+            procpool.close()
         else:
-            # this have problems if the file is not encoding in utf8 input_code = sys.stdin.read()
-            # From most to  less common, this should cover 99.9% of the encodings used
-            for encoding in ('utf_8', 'iso8859_15', 'iso8859_1', 'gb2313',
-                    'cp1251', 'cp1252', 'cp1250', 'shift-jis', 'gbk', 'cp1256',
-                    'iso8859-2', 'euc_jp', 'big5', 'cp874', 'euc_kr', 'iso8859_7'
-                    'cp1255'):
-                with open(filename, encoding=encoding) as infile:
-                    try:
-                        input_code = infile.read()
-                        break
-                    except UnicodeDecodeError:
-                        continue
-            else:
-                raise Exception('Could not determine file encoding')
-
-        if ast_checks:
-            # Test the AST. This doesnt give points: either both pass, both fails
-            # or one is correct and the other dont in which case we shortcircuit the return
-            astversion, py2astroot, py3astroot, py2_err, py3_err = check_ast(
-                        input_code, try_other_on_sucess=not stop_on_ok_ast,
-                        verbosity=verbosity
-            )
-            retdict.update({
-                'py2ast': {'PY2AST': py2astroot} if py2astroot else None,
-                'py3ast': {'PY3AST': py3astroot} if py3astroot else None,
-                'matches': [('PY%dASTOK' % astversion, ())]
-            })
-            if py2_err:
-                retdict['py2_ast_errors'].append(py2_err)
-            if py3_err:
-                retdict['py3_ast_errors'].append(py3_err)
-
-            # One parsed and the other didnt, no need to continue checking
-            if astversion in (2, 3):
-                retdict['version'] = astversion
+            procpool.terminate()
+        procpool.join()
+
+
+def _iter_serial(files, codestr, options, pool_options, cache, manifest, instrument):
+    pool = None
+    if pool_options is not None:
+        pool = other_python_pool(**pool_options)
+
+    try:
+        for filename in files:
+            result = manifest.lookup(filename) if manifest is not None else None
+            if result is not None:
+                yield filename, result, _reused_metrics(instrument)
                 continue
 
-        # Remove comments and emptyfy strings before doing the regex tests,
-        # this will remove most fase positives
-        cleaned_code = remove_str_comments(input_code)
+            result, _, metrics = _detect_file_safe(filename, codestr, pool, cache, options,
+                                                   instrument)
+            if manifest is not None:
+                manifest.update(filename, result)
+            yield filename, result, metrics
+    finally:
+        if pool is not None:
+            pool.close()
+
+
+def _changed_files(files, manifest, queued, instrument):
+    # Generator of the files that must be checked. Every file is appended to
+    # queued with its reused result (or None) and metrics before the next
+    # changed file is yielded. It's consumed by the thread of the pool that
+    # sends the tasks.
+    for filename in files:
+        result = manifest.lookup(filename)
+        queued.append((filename, result, _reused_metrics(instrument)))
+        if result is None:
+            yield filename
 
-        if modules_checks:
-            apply_score(*check_syntax_regex(cleaned_code, retdict['matches']))
-            apply_score(*check_modules_regex(cleaned_code, retdict['matches'],
-                match_score = modules_score))
-
-        # This one is SLOOOOOW
-        if modsyms_checks:
-            apply_score(
-                *check_modulesymbols_regex(cleaned_code, retdict['matches'], symbols_score)
-            )
-
-        if retdict['py2_score'] > retdict['py3_score']:
-            retdict['version'] = 2
-        elif retdict['py3_score'] > retdict['py2_score']:
-            retdict['version'] = 3
-        else:
-            retdict['version'] = 6
 
-        if verbosity:
-            print('Python 2 score: %d' % retdict['py2_score'])
-            print('Python 3 score: %d' % retdict['py3_score'])
-            print('\n')
+def _pop_reused(queued):
+    while queued and queued[0][1] is not None:
+        yield queued.popleft()
 
-    return returndict
+
+def _count_cache_hit(cache, cache_hit):
+    # Add the hits and misses of the parallel processes to the parent cache counters
+    if cache_hit is True:
+        cache.hits += 1
+    elif cache_hit is False:
+        cache.misses += 1
+
+
+# Per process state of the parallel jobs, set by _init_job_process
+_job_state = {}
+
+
+def _init_job_process(options, pool_options, cache, instrument):
+    _job_state['options'] = options
+    _job_state['pool'] = None
+    _job_state['cache'] = cache
+    _job_state['instrument'] = instrument
+
+    if pool_options is not None:
+        pool = other_python_pool(**pool_options)
+        _job_state['pool'] = pool
+        # Stop the workers of the other Python when the process ends
+        Finalize(pool, pool.close, exitpriority=10)
+
+
+def _detect_job(filename):
+    result, cache_hit, metrics = _detect_file_safe(
+        filename, None, _job_state['pool'], _job_state['cache'], _job_state['options'],
+        _job_state['instrument'])
+    return filename, result, cache_hit, metrics
+
+
+def _reused_metrics(instrument):
+    # The metrics of a result reused from the manifest
+    if not instrument:
+        return None
+    return {'timings': {}, 'counters': {'files': 1, 'manifest_reused': 1}}
+
+
+def _new_result():
+    return {
+        'py2ast': None,
+        'py3ast': None,
+        'version': 0,
+        'matches': [],
+        'py2_score': 0,
+        'py3_score': 0,
+        'py2_ast_errors': [],
+        'py3_ast_errors': [],
+        'encoding': None,
+        'early_exit': False,
+        'timed_out': False,
+    }
+
+
+def _detect_file_safe(filename, codestr, pool, cache, options, instrument=False):
+    """
+    Reads and checks a file (or codestr), using the cache if enabled. Returns
+    a tuple with the result, if it was found in the cache (None if there is
+    no cache) and, if instrument is True, a dictionary with the "timings" and
+    "counters" of the file (None otherwise). A failure is returned as the
+    "error" key of the result instead of stopping the detection of the other
+    files.
+    """
+    timings = {} if instrument else None
+    spawned = pool.spawned if pool is not None else 0
+    with timed(timings, 'total'):
+        result, cache_hit, size = _detect_file(filename, codestr, pool, cache, options,
+                                               timings)
+    if not instrument:
+        return result, cache_hit, None
+
+    if pool is not None:
+        spawns = pool.spawned - spawned
+    else:
+        # a new interpreter for the other version, unless the builtin parser is used
+        spawns = int('ast_other' in timings and
+                     not use_py2parser(options['py2_parser'], options['build_ast']))
+    counters = {
+        'files': 1,
+        'bytes': size,
+        'errors': int('error' in result),
+        'timeouts': int(result.get('timed_out', False)),
+        'cache_hits': int(cache_hit is True),
+        'cache_misses': int(cache_hit is False),
+        'manifest_reused': 0,
+        'spawns': spawns,
+    }
+    return result, cache_hit, {'timings': timings, 'counters': counters}
+
+
+def _detect_file(filename, codestr, pool, cache, options, timings):
+    # Returns the result, the cache hit and the number of bytes read
+    size = 0
+    try:
+        with timed(timings, 'read'):
+            if filename == '<code_string>':
+                need_data = cache is not None or timings is not None
+                data = codestr.encode('utf-8') if need_data else None
+            else:
+                with open(filename, 'rb') as infile:
+                    data = infile.read()
+        if data is not None:
+            size = len(data)
+
+        if cache is not None:
+            key = cache.key(data, _cache_options(options))
+            result = cache.get(key)
+            if result is not None:
+                if options['verbosity']:
+                    print('Cached result for file %s' % filename)
+                return result, True, size
+
+        with timed(timings, 'decode'):
+            if filename == '<code_string>':
+                input_code, encoding = codestr, None
+            else:
+                input_code, encoding = decode_source(data)
+        result = _detect_code(filename, input_code, pool, timings=timings, **options)
+        result['encoding'] = encoding
+
+        if cache is not None:
+            # a timeout depends on the load of the machine
+            if not result['timed_out']:
+                cache.put(key, result)
+            return result, False, size
+        return result, None, size
+    except Exception:
+        retdict = _new_result()
+        retdict['error'] = format_exc()
+        if options['verbosity']:
+            print('Error checking file %s:\n%s' % (filename, retdict['error']))
+        return retdict, None, size
+
+
+def _cache_options(options):
+    # The options that can change the result. The results of the files that
+    # don't exceed regex_timeout are the same with any timeout, and the others
+    # are not stored
+    return dict((key, value) for key, value in options.items()
+                if key not in ('verbosity', 'regex_timeout'))
+
+
+def _detect_code(filename, input_code, pool, ast_checks=True, modules_checks=True,
+                 modsyms_checks=False, stop_on_ok_ast=False, modules_score=150,
+                 symbols_score=100, verbosity=0, build_ast=True, py2_parser='auto',
+                 early_exit_margin=None, regex_timeout=None, modules_scan='full',
+                 timings=None):
+    retdict = _new_result()
+
+    if verbosity:
+        print('Checking file %s: ' % filename)
+
+    # Without margin the AST checks go first since they decide the version
+    # when only one of them parses. With it, they are the most expensive stage
+    # so they go after the regex checks and only if those didn't decide it
+    if ast_checks and early_exit_margin is None:
+        if _ast_stage(retdict, input_code, pool, stop_on_ok_ast, verbosity, build_ast,
+                      py2_parser, timings):
+            return retdict
+
+    # Remove comments and emptyfy strings before doing the regex tests,
+    # this will remove most fase positives
+    with timed(timings, 'strip'):
+        cleaned_code = remove_str_comments(input_code)
+
+    # The regex checks, cheapest first
+    stages = []
+    if modules_checks:
+        stages.append(('syntax', check_syntax_regex, {}))
+        stages.append(('modules', check_modules_regex,
+                       {'match_score': modules_score, 'scan': modules_scan}))
+    if modsyms_checks:
+        stages.append(('symbols', check_modulesymbols_regex, {'symbols_score': symbols_score}))
+
+    # The matches of a stage are only added if it finishes before the timeout
+    try:
+        with deadline(regex_timeout) as limit:
+            for stage, check, kwargs in stages:
+                stage_matches = []
+                with timed(timings, stage):
+                    py2_score, py3_score = check(
+                        cleaned_code, stage_matches, margin=early_exit_margin,
+                        score_diff=retdict['py2_score'] - retdict['py3_score'],
+                        deadline=limit, **kwargs)
+                retdict['matches'].extend(stage_matches)
+                retdict['py2_score'] += py2_score
+                retdict['py3_score'] += py3_score
+                if early_exit_margin is not None and \
+                        abs(retdict['py2_score'] - retdict['py3_score']) > early_exit_margin:
+                    retdict['early_exit'] = True
+                    break
+    except RegexTimeout:
+        retdict['timed_out'] = True
+
+    if ast_checks and early_exit_margin is not None and not retdict['early_exit']:
+        if _ast_stage(retdict, input_code, pool, stop_on_ok_ast, verbosity, build_ast,
+                      py2_parser, timings):
+            return retdict
+
+    if retdict['py2_score'] > retdict['py3_score']:
+        retdict['version'] = 2
+    elif retdict['py3_score'] > retdict['py2_score']:
+        retdict['version'] = 3
+    else:
+        retdict['version'] = 6
+
+    if verbosity:
+        if retdict['early_exit']:
+            print('Early exit, the score margin was exceeded')
+        if retdict['timed_out']:
+            print('Timed out, the regex checks exceeded %g seconds' % regex_timeout)
+        print('Python 2 score: %d' % retdict['py2_score'])
+        print('Python 3 score: %d' % retdict['py3_score'])
+        print('\n')
+
+    return retdict
+
+
+def _ast_stage(retdict, input_code, pool, stop_on_ok_ast, verbosity, build_ast, py2_parser,
+               timings):
+    """
+    Runs the AST checks, updating retdict. Returns True if they decided the
+    version (only one of them parses), so no more checks are needed.
+    """
+    # Test the AST. This doesnt give points: either both pass, both fails
+    # or one is correct and the other dont in which case we shortcircuit the return
+    astversion, py2astroot, py3astroot, py2_err, py3_err = check_ast(
+                input_code, try_other_on_sucess=not stop_on_ok_ast,
+                verbosity=verbosity, pool=pool, build_ast=build_ast,
+                py2_parser=py2_parser, timings=timings
+    )
+    retdict.update({
+        'py2ast': {'PY2AST': py2astroot} if py2astroot else None,
+        'py3ast': {'PY3AST': py3astroot} if py3astroot else None,
+    })
+    retdict['matches'].append(('PY%dASTOK' % astversion, ()))
+    if py2_err:
+        retdict['py2_ast_errors'].append(py2_err)
+    if py3_err:
+        retdict['py3_ast_errors'].append(py3_err)
+
+    # One parsed and the other didnt, no need to continue checking
+    if astversion in (2, 3):
+        retdict['version'] = astversion
+        return True
+    return False
 
 
 if __name__ == '__main__':
@@ -0,0 +1,112 @@
+"""
+Read Python source files of unknown encoding.
+
+The file is read only once. The encoding is decided looking first at the
+prefix of the file, for a byte order mark or a PEP 263 coding cookie in the
+first two lines, and then by trying a list of common encodings on the
+in-memory buffer.
+"""
+
+import codecs
+import re
+
+__all__ = ['read_source', 'decode_source', 'FALLBACK_ENCODINGS']
+
+# From most to less common, this should cover 99.9% of the encodings used.
+# Please note that iso8859_15 can decode any input, so it's usually the
+# last one really tried.
+FALLBACK_ENCODINGS = (
+    'utf_8', 'iso8859_15', 'iso8859_1', 'gb2312', 'cp1251', 'cp1252', 'cp1250',
+    'shift-jis', 'gbk', 'cp1256', 'iso8859-2', 'euc_jp', 'big5', 'cp874', 'euc_kr',
+    'iso8859_7', 'cp1255'
+)
+
+# The codecs remove the BOM when decoding. Longer BOMs first since the
+# UTF-32 LE one starts with the UTF-16 LE one.
+BOMS = (
+    (codecs.BOM_UTF8, 'utf_8_sig'),
+    (codecs.BOM_UTF32_LE, 'utf_32'),
+    (codecs.BOM_UTF32_BE, 'utf_32'),
+    (codecs.BOM_UTF16_LE, 'utf_16'),
+    (codecs.BOM_UTF16_BE, 'utf_16'),
+)
+
+COOKIE_REGEX = re.compile(br'^[ \t\f]*#.*?coding[:=][ \t]*([-\w.]+)')
+BLANK_OR_COMMENT_REGEX = re.compile(br'^[ \t\f]*(?:[#\r\n]|$)')
+
+
+def _normalize_newlines(code):
+    # Universal newlines, like reading the file in text mode
+    return code.replace(u'\r\n', u'\n').replace(u'\r', u'\n')
+
+
+def _coding_cookie(data):
+    """
+    Returns the encoding declared in the first two lines (PEP 263) or None
+    if there is no declaration or the encoding is unknown.
+    """
+    lines = data[:1024].splitlines()[:2]
+    for idx, line in enumerate(lines):
+        match = COOKIE_REGEX.match(line)
+        if match:
+            try:
+                encoding = match.group(1).decode('ascii')
+                codecs.lookup(encoding)
+                return encoding
+            except (LookupError, UnicodeDecodeError):
+                return None
+
+        # The cookie can only be in the second line if the first is empty or a comment
+        if idx == 0 and not BLANK_OR_COMMENT_REGEX.match(line):
+            break
+
+    return None
+
+
+def decode_source(data):
+    """
+    Decodes the bytes of a source file.
+
+    Args:
+        data (bytes): contents of the file.
+
+    Returns:
+        A tuple with the decoded code (without BOM and with the newlines
+        normalized to "\\n") and the normalized name of the encoding used
+        (e.g. "utf-8", "utf-8-sig" or "iso8859-15").
+
+    Raises:
+        UnicodeDecodeError if no encoding could decode the data.
+    """
+    candidates = FALLBACK_ENCODINGS
+
+    for bom, encoding in BOMS:
+        if data.startswith(bom):
+            candidates = (encoding,) + candidates
+            break
+    else:
+        cookie = _coding_cookie(data)
+        if cookie is not None:
+            candidates = (cookie,) + candidates
+
+    error = None
+    for encoding in candidates:
+        try:
+            code = data.decode(encoding)
+        except UnicodeDecodeError as exc:
+            error = error or exc
+            continue
+        return _normalize_newlines(code), codecs.lookup(encoding).name
+
+    raise error
+
+
+def read_source(filename):
+    """
+    Reads and decodes a source file. See decode_source.
+
+    Returns:
+        A tuple with the decoded code and the name of the encoding used.
+    """
+    with open(filename, 'rb') as infile:
+        return decode_source(infile.read())
@@ -0,0 +1,70 @@
+"""
+Opt-in instrumentation of the detection. Passing an Instrumentation to
+detect() or detect_iter() adds to every result a "timings" dictionary with the
+seconds spent in every stage and keeps the counters of the whole run. The
+hooks registered are called after every file, to forward them to a metrics
+system.
+"""
+
+import time
+from contextlib import contextmanager
+
+__all__ = ['Instrumentation', 'STAGES', 'COUNTERS']
+
+# The stages timed, only the ones run are in the timings of a file. "total" is
+# the whole time of the file, including the cache lookups.
+STAGES = ('read', 'decode', 'ast_current', 'ast_other', 'strip', 'syntax', 'modules',
+          'symbols')
+
+COUNTERS = ('files', 'bytes', 'errors', 'timeouts', 'cache_hits', 'cache_misses',
+            'manifest_reused', 'spawns')
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class Instrumentation(object):
+    """
+    Timings and counters of a detection run.
+
+    Args:
+        hooks (Iterable[callable]): functions called after every file with its
+            name, its timings and its counters (the increments of every counter
+            because of it) as dictionaries.
+
+    The totals of the run are in the "timings" (seconds of every stage) and
+    "counters" attributes: the files checked, the bytes read, the errors, the
+    files exceeding the regex_timeout, the cache hits and misses, the results reused from the manifest and the
+    interpreters of the other Python version started.
+    """
+
+    def __init__(self, hooks=()):
+        self.hooks = list(hooks)
+        self.timings = dict.fromkeys(STAGES + ('total',), 0.0)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def record(self, filename, timings, counters):
+        """ Adds the timings and counters of a file and calls the hooks """
+        for stage, seconds in timings.items():
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+        for name, value in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+        for hook in self.hooks:
+            hook(filename, timings, counters)
+
+
+@contextmanager
+def timed(timings, stage):
+    """ Adds the time spent in the block to timings[stage], if timings is not None """
+    if timings is None:
+        yield
+        return
+
+    start = _clock()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + _clock() - start
@@ -0,0 +1,144 @@
+"""
+Manifest of the files checked in the previous run, for incremental detection.
+
+For every file it stores the modification time, size and content hash seen
+when it was checked and its result. In the next run the files with the same
+modification time and size are only stat'ed, never read, and reuse their
+results; the others are hashed and only checked again if their contents
+changed. The manifest is rewritten atomically at the end of the run without
+the files not seen (deleted), so it always describes a complete run.
+
+A change in the detection options, the rules version or the pydetector version
+discards the whole manifest.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from six.moves import cPickle as pickle
+
+from pydetector.regexp_checks import RULES_VERSION
+from pydetector.version import __version__
+
+__all__ = ['Manifest']
+
+FORMAT_VERSION = 1
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# os.rename is atomic but can't overwrite files on Windows under Python 2
+_replace = getattr(os, 'replace', os.rename)
+
+
+class Manifest(object):
+    """
+    Args:
+        path (str): file of the manifest. It's loaded if it exists and was
+            written with the same options.
+
+        options (dict): the detection options that can change the results.
+    """
+
+    def __init__(self, path, options):
+        self.path = path
+        self.header = {
+            'format': FORMAT_VERSION,
+            'version': __version__,
+            'rules': RULES_VERSION,
+            'options': sorted(options.items()),
+        }
+        self.reused = 0
+        self.checked = 0
+        # filename: (mtime, size, digest, pickled result)
+        self._previous = {}
+        self._current = {}
+        # filename: (mtime, size, digest) of the files waiting for their results
+        self._pending = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as infile:
+                header = pickle.load(infile)
+                if header == self.header:
+                    self._previous = pickle.load(infile)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            # missing or not complete, every file will be checked
+            pass
+
+    def lookup(self, filename):
+        """
+        Returns the stored result of the file if it didn't change since the
+        previous run, None if it must be checked (and its result given to
+        update()).
+        """
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            # the detection will report the error
+            return None
+
+        mtime = getattr(stat, 'st_mtime_ns', stat.st_mtime)
+        entry = self._previous.get(filename)
+        if entry is not None and entry[:2] == (mtime, stat.st_size):
+            return self._reuse(filename, entry)
+
+        try:
+            digest = _file_digest(filename)
+        except (IOError, OSError):
+            return None
+
+        if entry is not None and entry[2] == digest:
+            # touched but not modified
+            return self._reuse(filename, (mtime, stat.st_size, digest, entry[3]))
+
+        self._pending[filename] = (mtime, stat.st_size, digest)
+        return None
+
+    def _reuse(self, filename, entry):
+        self._current[filename] = entry
+        self.reused += 1
+        return pickle.loads(entry[3])
+
+    def update(self, filename, result):
+        """ Stores the result of a file not found by lookup() """
+        state = self._pending.pop(filename, None)
+        if state is None:
+            # couldn't be read when looked up
+            return
+        self.checked += 1
+        if 'error' not in result and not result.get('timed_out'):
+            self._current[filename] = state + (pickle.dumps(result, 2),)
+
+    def save(self, complete=True):
+        """
+        Writes the manifest atomically. If the run was not complete the files
+        not seen keep their previous entries instead of being removed.
+        """
+        entries = self._current
+        if not complete:
+            entries = dict(self._previous)
+            entries.update(self._current)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmppath = tempfile.mkstemp(dir=directory,
+                                       prefix='.%s.' % os.path.basename(self.path))
+        try:
+            with os.fdopen(fd, 'wb') as outfile:
+                pickle.dump(self.header, outfile, 2)
+                pickle.dump(entries, outfile, 2)
+            _replace(tmppath, self.path)
+        except BaseException:
+            os.remove(tmppath)
+            raise
+
+
+def _file_digest(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as infile:
+        chunk = infile.read(_HASH_CHUNK_SIZE)
+        while chunk:
+            digest.update(chunk)
+            chunk = infile.read(_HASH_CHUNK_SIZE)
+    return digest.hexdigest()
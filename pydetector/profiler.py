@@ -0,0 +1,258 @@
+"""
+Profiler of the regex rules: for every rule of the syntax tables
+(PY3OTHER_REGEXP and PY2OTHER_REGEXP), every module of the modules regexes and
+every module of the symbols regexes it records across a corpus:
+
+    - the time spent matching it and the bytes it scanned, running the rule
+      alone with finditer over the code without strings and comments. The
+      checks fuse and prefilter the rules, so this is the cost of the rule
+      on its own: what would be saved removing it or made faster tuning it.
+    - the number of hits and of files with hits, as found by the checks.
+    - the score it added and the number of files whose verdict it changed:
+      the ones where the AST checks didn't decide the version and the scores
+      without its hits give another one.
+
+The time spent by the checks themselves is also kept, per stage, to compare.
+The Python 2 module symbols are not profiled since they are not checked.
+"""
+
+import re
+import time
+
+from pydetector import regexp_checks
+from pydetector.ast_checks import check_ast, other_python_pool, use_py2parser
+from pydetector.ast_pool import WorkerError
+from pydetector.detector import remove_str_comments
+from pydetector.encoding import read_source
+
+__all__ = ['RuleProfiler', 'profile_rules', 'SORT_KEYS']
+
+SORT_KEYS = ('time', 'bytes', 'hits', 'files', 'score', 'flips')
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class RuleStats(object):
+    """ Measures of a rule """
+
+    def __init__(self, table, name, regex, score, py3):
+        self.table = table
+        self.name = name
+        self.regex = regex
+        self.score = score
+        self.py3 = py3
+        self.time = 0.0
+        self.bytes = 0
+        self.hits = 0
+        self.files = 0
+        self.score_total = 0
+        self.flips = 0
+
+    def as_dict(self):
+        return {
+            'table': self.table,
+            'rule': self.name,
+            'version': 3 if self.py3 else 2,
+            'time': self.time,
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'files': self.files,
+            'score': self.score_total,
+            'flips': self.flips,
+        }
+
+
+class RuleProfiler(object):
+    """
+    Args:
+        ast_checks (bool): run the AST checks, to know which files the rules
+            can't change since only one version parses them.
+
+        modules_score (int), symbols_score (int): the scores of detect().
+
+        py2_parser (str): see detect().
+
+        pool (OtherPythonPool, optional): the interpreters of the other Python
+            version used by the AST checks, from
+            ast_checks.other_python_pool(). A new one is started for every
+            file if not given.
+    """
+
+    def __init__(self, ast_checks=True, modules_score=150, symbols_score=100,
+                 py2_parser='auto', pool=None):
+        self.ast_checks = ast_checks
+        self.modules_score = modules_score
+        self.symbols_score = symbols_score
+        self.py2_parser = py2_parser
+        self.pool = pool
+        self.files = 0
+        self.bytes = 0
+        self.ast_decided = 0
+        self.stage_time = {'syntax': 0.0, 'modules': 0.0, 'symbols': 0.0}
+
+        self.rules = []
+        # match label -> rule of the syntax and symbols checks
+        self._labels = {}
+        for label, table, py3 in (('PY3SYNTAX_', 'PY3OTHER_REGEXP', True),
+                                  ('PY2SYNTAX_', 'PY2OTHER_REGEXP', False)):
+            for regex, score in getattr(regexp_checks, table):
+                pattern = regexp_checks.rule_pattern(regex)
+                self._add_rule(label + pattern, table, pattern, regex, score, py3)
+
+        # module rules, with the regex matching the module name found
+        self._modules = {'PY3MODS': [], 'PY2MODS': []}
+        for label, table, py3 in (('PY3MODS', 'PY3ONLY_MODULES', True),
+                                  ('PY2MODS', 'PY2ONLY_MODULES', False)):
+            for module in getattr(regexp_checks, table):
+                rule = self._add_rule(None, table, module,
+                                      regexp_checks.import_regex_gen([module]),
+                                      modules_score, py3)
+                self._modules[label].append((re.compile('(?:%s)\\Z' % module), rule))
+
+        for regex in regexp_checks.PY3MODULESYMBOLS_REGEXPS:
+            self._add_rule('PY3SYMS:' + regex.pattern, 'PY3MODULESYMBOLS_REGEXPS',
+                           regex.pattern, regex, symbols_score, True)
+
+    def _add_rule(self, label, table, name, regex, score, py3):
+        rule = RuleStats(table, name, regex, score, py3)
+        self.rules.append(rule)
+        if label is not None:
+            self._labels[label] = rule
+        return rule
+
+    def add_file(self, filename):
+        self.add_code(read_source(filename)[0])
+
+    def add_code(self, code):
+        """
+        Profiles the rules with the code of a module. A failure of the pool
+        raises WorkerError before anything is recorded.
+        """
+        decided = False
+        if self.ast_checks:
+            version = check_ast(code, try_other_on_sucess=True, build_ast=False,
+                                py2_parser=self.py2_parser, pool=self.pool)[0]
+            decided = version in (2, 3)
+            self.ast_decided += decided
+        self.files += 1
+
+        cleaned = remove_str_comments(code)
+        self.bytes += len(cleaned)
+        for rule in self.rules:
+            start = _clock()
+            for _ in rule.regex.finditer(cleaned):
+                pass
+            rule.time += _clock() - start
+            rule.bytes += len(cleaned)
+
+        # the hits found by the checks: rule -> number of hits
+        hits = {}
+        matches = []
+        py2_score = py3_score = 0
+        for stage, check, kwargs in (
+                ('syntax', regexp_checks.check_syntax_regex, {}),
+                ('modules', regexp_checks.check_modules_regex,
+                 {'match_score': self.modules_score}),
+                ('symbols', regexp_checks.check_modulesymbols_regex,
+                 {'symbols_score': self.symbols_score})):
+            del matches[:]
+            start = _clock()
+            scores = check(cleaned, matches, **kwargs)
+            self.stage_time[stage] += _clock() - start
+            py2_score += scores[0]
+            py3_score += scores[1]
+            for label, found in matches:
+                if stage == 'modules':
+                    rule = self._module_rule(label, found)
+                    hits[rule] = hits.get(rule, 0) + 1
+                else:
+                    rule = self._labels[label]
+                    hits[rule] = hits.get(rule, 0) + len(found)
+
+        version = _score_version(py2_score, py3_score)
+        for rule, count in hits.items():
+            score = rule.score * count
+            rule.hits += count
+            rule.files += 1
+            rule.score_total += score
+            if decided:
+                continue
+            if rule.py3:
+                other = _score_version(py2_score, py3_score - score)
+            else:
+                other = _score_version(py2_score - score, py3_score)
+            rule.flips += other != version
+
+    def _module_rule(self, label, found):
+        regex = regexp_checks.PY3ONLY_MODULES_REGEXP if label == 'PY3MODS' \
+            else regexp_checks.PY2ONLY_MODULES_REGEXP
+        # found is the tuple of groups, like findall
+        for group in ('imported', 'from'):
+            name = found[regex.groupindex[group] - 1]
+            if name:
+                break
+        for module_regex, rule in self._modules[label]:
+            if module_regex.match(name):
+                return rule
+        raise ValueError('no module rule for %r' % (name,))
+
+    def rows(self, sort='time'):
+        """ Returns the measures of the rules as dictionaries, sorted descending """
+        if sort not in SORT_KEYS:
+            raise ValueError('unknown sort key: %s' % sort)
+        return sorted((rule.as_dict() for rule in self.rules),
+                      key=lambda row: (-row[sort], row['table'], row['rule']))
+
+    def report(self, sort='time', limit=None):
+        """ Returns the text of a report with the rules sorted by the key """
+        total = sum(rule.time for rule in self.rules) or 1.0
+        lines = [
+            '%d files, %.2f MB without strings and comments, %d decided by the AST checks'
+            % (self.files, self.bytes / 1e6, self.ast_decided),
+            'Checks: syntax %.4f s, modules %.4f s, symbols %.4f s' % (
+                self.stage_time['syntax'], self.stage_time['modules'],
+                self.stage_time['symbols']),
+            '',
+            '%9s %6s %8s %7s %6s %8s %6s  %-24s %s' % (
+                'time (s)', '%', 'MB/s', 'hits', 'files', 'score', 'flips', 'table', 'rule'),
+        ]
+        for row in self.rows(sort)[:limit]:
+            lines.append('%9.4f %6.2f %8.1f %7d %6d %8d %6d  %-24s %s' % (
+                row['time'], 100.0 * row['time'] / total,
+                row['bytes'] / row['time'] / 1e6 if row['time'] else 0.0,
+                row['hits'], row['files'], row['score'], row['flips'], row['table'],
+                row['rule']))
+        return '\n'.join(lines)
+
+
+def profile_rules(files, **kwargs):
+    """
+    Returns a RuleProfiler with the rules profiled over the files, with the
+    arguments of RuleProfiler. Unless a pool is given, the AST checks use a
+    pool of warm interpreters of the other Python version during the run. The
+    files that can't be read or that the pool fails to parse are skipped.
+    """
+    pool = None
+    if kwargs.get('ast_checks', True) and kwargs.get('pool') is None and \
+            not use_py2parser(kwargs.get('py2_parser', 'auto'), build_ast=False):
+        pool = kwargs['pool'] = other_python_pool()
+
+    profiler = RuleProfiler(**kwargs)
+    try:
+        for filename in files:
+            try:
+                profiler.add_file(filename)
+            except (IOError, OSError, WorkerError):
+                continue
+    finally:
+        if pool is not None:
+            pool.close()
+    return profiler
+
+
+def _score_version(py2_score, py3_score):
+    if py2_score > py3_score:
+        return 2
+    if py3_score > py2_score:
+        return 3
+    return 6
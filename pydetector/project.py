@@ -0,0 +1,226 @@
+"""
+Verdict for a whole project (Python 2, 3 or compatible with both) checking a
+sample of its files instead of all of them.
+
+The files are checked in random order, stratified by size so the sample has
+small and big files from the beginning, keeping the counts of the files of
+every version. The checks stop as soon as the verdict is supported by the
+Wilson score bounds of those proportions at the requested confidence:
+
+    - compatible with both (6) when the upper bound of the fraction of version
+      specific files is under the tolerance.
+    - Python 2 or 3 when the fraction of version specific files is over the
+      tolerance and the lower bound of the share of one version among them is
+      over the half.
+    - mixed (MIXED) when neither version has that majority but the lower
+      bounds of the fractions of the files of both versions are over the
+      tolerance: the project has Python 2 only and Python 3 only files.
+      It's also the verdict when none of the rules holds.
+
+The bounds use the finite population correction, so they are exact once every
+file is checked.
+"""
+
+import math
+import os
+import random
+
+from pydetector.detector import detect_iter
+from pydetector.scanner import scan
+
+__all__ = ['detect_project', 'MIXED']
+
+MIXED = 'mixed'
+
+
+def detect_project(paths, confidence=0.95, tolerance=0.05, min_files=10, max_files=None,
+                   strata=4, seed=None, excludes=(), gitignore=True, **detect_options):
+    """
+    Try to detect if a project is Python 2, 3 or compatible with both, checking
+    only the files needed to reach the confidence.
+
+    Args:
+        paths (Iterable[str]): files and directories of the project, walked as
+            pydetector.scanner.scan() does.
+
+        confidence (float): confidence level (one-sided) required to stop.
+
+        tolerance (float): maximum fraction of version specific files of a
+            project compatible with both versions (misdetections, shims).
+
+        min_files (int): minimum number of files checked before stopping.
+
+        max_files (int, optional): maximum number of files checked. The verdict
+            will be the most likely one if the confidence wasn't reached.
+
+        strata (int): number of size ranges (with the same number of files)
+            sampled in turns. With 1 the order is just random.
+
+        seed (optional): seed of the random order, for repeatable results.
+
+        excludes, gitignore: like in pydetector.scanner.scan().
+
+        detect_options: other arguments of detect_iter(). The ASTs are not
+            built unless build_ast=True is given and stop_on_ok_ast is always
+            False, the files compatible with both versions must parse with both.
+
+    Return:
+        Dictionary with the keys "version" (2, 3, 6, MIXED or 0 without
+        files), "confidence" with the confidence of the verdict, "analyzed" and "total" with the number of files checked and
+        found, "counts" with the number of files of every version (2, 3 and 6),
+        "errors" with the number of files that couldn't be checked and
+        "stopped_early" with True if not every file was checked.
+    """
+    files = list(scan(paths, excludes=excludes, gitignore=gitignore))
+    order = _sample_order(files, strata, random.Random(seed))
+    if max_files is not None:
+        order = order[:max_files]
+    detect_options.setdefault('build_ast', False)
+    detect_options['stop_on_ok_ast'] = False
+
+    stats = _ProjectStats(len(files), tolerance)
+    z = _normal_quantile(confidence)
+    if order:
+        results = detect_iter(order, **detect_options)
+        try:
+            for _, result in results:
+                stats.add(result)
+                if stats.checked >= min_files and stats.verdict(z) is not None:
+                    break
+        finally:
+            results.close()
+
+    analyzed = stats.checked + stats.errors
+    version = 0
+    if stats.checked:
+        # the most likely one if the confidence wasn't reached
+        version = stats.verdict(z) or stats.verdict(0.0) or MIXED
+    return {
+        'version': version,
+        'confidence': stats.confidence(version),
+        'analyzed': analyzed,
+        'total': len(files),
+        'counts': dict(stats.counts),
+        'errors': stats.errors,
+        'stopped_early': analyzed < len(files),
+    }
+
+
+def _sample_order(files, strata, rng):
+    """
+    Returns the files in random order, taking them in turns from size ranges
+    with the same number of files.
+    """
+    sized = []
+    for filename in files:
+        try:
+            size = os.path.getsize(filename)
+        except OSError:
+            size = 0
+        sized.append((size, filename))
+    sized.sort()
+
+    strata = max(1, min(strata, len(sized)))
+    groups = []
+    for idx in range(strata):
+        group = [filename for _, filename in
+                 sized[idx * len(sized) // strata:(idx + 1) * len(sized) // strata]]
+        rng.shuffle(group)
+        groups.append(group)
+
+    order = []
+    for idx in range(max(len(group) for group in groups) if groups else 0):
+        order.extend(group[idx] for group in groups if idx < len(group))
+    return order
+
+
+class _ProjectStats(object):
+    """ Counts of the files checked and the verdict they support """
+
+    def __init__(self, total, tolerance):
+        self.total = total
+        self.tolerance = tolerance
+        self.counts = {2: 0, 3: 0, 6: 0}
+        self.errors = 0
+
+    @property
+    def checked(self):
+        return sum(self.counts.values())
+
+    def add(self, result):
+        if 'error' in result or result['version'] not in self.counts:
+            self.errors += 1
+        else:
+            self.counts[result['version']] += 1
+
+    def verdict(self, z):
+        """ Returns the version supported with the z score or None """
+        for version in (6, 2, 3, MIXED):
+            if self.supports(version, z):
+                return version
+        return None
+
+    def supports(self, version, z):
+        """ Returns True if the rule of the version holds with the z score """
+        checked = self.checked
+        specific = self.counts[2] + self.counts[3]
+        if version == 6:
+            return self._bounds(specific, checked, z)[1] < self.tolerance
+        if version == MIXED:
+            return all(self._bounds(self.counts[other], checked, z)[0] > self.tolerance
+                       for other in (2, 3))
+        return self._bounds(specific, checked, z)[0] > self.tolerance and \
+            self._bounds(self.counts[version], specific, z)[0] > 0.5
+
+    def confidence(self, version):
+        """ Returns the highest confidence level supporting the version """
+        if not self.checked:
+            return 0.0
+
+        # the bounds widen as z grows: bisect the largest z keeping the rule
+        low, high = 0.0, 10.0
+        if not self.supports(version, low):
+            return 0.5
+        for _ in range(50):
+            middle = (low + high) / 2
+            if self.supports(version, middle):
+                low = middle
+            else:
+                high = middle
+        return _normal_cdf(low)
+
+    def _bounds(self, successes, trials, z):
+        # Wilson score interval, with the sample size scaled by the finite
+        # population correction (approximated with the number of files for
+        # the share of the version specific ones)
+        if not trials:
+            return 0.0, 1.0
+        population = self.total
+        sampled = self.checked + self.errors
+        if sampled >= population:
+            ratio = float(successes) / trials
+            return ratio, ratio
+        size = trials * float(population - 1) / (population - sampled)
+
+        ratio = float(successes) / trials
+        denominator = 1 + z * z / size
+        center = (ratio + z * z / (2 * size)) / denominator
+        spread = z * math.sqrt(ratio * (1 - ratio) / size + z * z / (4 * size * size)) / denominator
+        return max(0.0, center - spread), min(1.0, center + spread)
+
+
+def _normal_cdf(x):
+    return 0.5 * (1 + math.erf(x / math.sqrt(2)))
+
+
+def _normal_quantile(probability):
+    if not 0.5 <= probability < 1:
+        raise ValueError('the confidence must be in [0.5, 1), not %r' % (probability,))
+    low, high = 0.0, 10.0
+    for _ in range(60):
+        middle = (low + high) / 2
+        if _normal_cdf(middle) < probability:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
@@ -0,0 +1,75 @@
+"""
+In-process parser of the Python 2.7 grammar, used to check if some code is
+valid Python 2 without a Python 2 interpreter. It's made of a tokenizer, an LL(1)
+driver of the tables generated by pgen from the bundled Grammar.txt and the
+checks done by Python 2 when building the AST.
+
+The trees are concrete syntax trees (with the grammar rules as node types)
+instead of the Python 2 AST, so they are only similar to the ast2dict output.
+"""
+
+from pydetector.ast_pool import format_error
+from pydetector.py2parser.checks import check_tree
+from pydetector.py2parser.parser import Parser, Node, Leaf
+
+__all__ = ['parse', 'parse_error', 'tree2dict', 'Node', 'Leaf']
+
+_PARSER = None
+
+
+def _parser():
+    global _PARSER
+    if _PARSER is None:
+        _PARSER = Parser()
+    return _PARSER
+
+
+def parse(code):
+    """
+    Parses the code with the Python 2.7 grammar and returns its tree (a Node).
+    Raises the same exceptions than ast.parse in Python 2 (SyntaxError,
+    IndentationError and, for some string escapes, ValueError).
+    """
+    tree, futures = _parser().parse(code)
+    check_tree(tree, futures, code)
+    return tree
+
+
+def parse_error(code):
+    """
+    Returns None if the code is valid Python 2 or the message of the error with
+    its location, in the format of ast_pool.parse_error.
+    """
+    try:
+        parse(code)
+    except Exception as exc:
+        return format_error(exc)
+    return None
+
+
+def tree2dict(tree):
+    """
+    Returns the tree with the shape of the ast2dict output: every node as a
+    dictionary with its rule (or token type) as ast_type, lineno, col_offset
+    and its children (or, for the tokens, its value).
+    """
+    result = {}
+    stack = [(tree, result)]
+    while stack:
+        node, nodedict = stack.pop()
+        nodedict["ast_type"] = node.type
+        nodedict["lineno"] = node.lineno
+        nodedict["col_offset"] = node.col_offset
+        nodedict["_attributes"] = ["lineno", "col_offset"]
+        if node.__class__ is Leaf:
+            nodedict["_fields"] = ["value"]
+            nodedict["value"] = node.value
+            continue
+
+        nodedict["_fields"] = ["children"]
+        children = nodedict["children"] = []
+        for child in node.children:
+            childdict = {}
+            children.append(childdict)
+            stack.append((child, childdict))
+    return result
@@ -0,0 +1,454 @@
+"""
+Checks done by Python 2.7 when converting the parse tree into the AST (ast.c)
+that reject code accepted by the grammar, like assignments to literals,
+misplaced call arguments or invalid string escapes.
+"""
+
+import re
+import unicodedata
+
+from pydetector.py2parser.parser import Leaf
+
+__all__ = ['check_tree']
+
+AUGASSIGN = frozenset(['+=', '-=', '*=', '/=', '%=', '&=', '|=', '^=', '<<=', '>>=', '**=', '//='])
+
+# Rules whose nodes are always an operation
+OPERATOR_RULES = frozenset(['or_test', 'and_test', 'not_test', 'expr', 'xor_expr', 'and_expr',
+                            'shift_expr', 'arith_expr', 'term'])
+TUPLE_RULES = frozenset(['testlist', 'exprlist', 'testlist_safe', 'testlist1'])
+
+# Names that can't be assigned
+FORBIDDEN_NAMES = frozenset(['None', '__debug__'])
+
+ESCAPE_REGEX = re.compile(r'\\(.)', re.S)
+RAW_UNICODE_ESCAPE_REGEX = re.compile(r'(\\+)([uU])')
+HEX_DIGITS = frozenset('0123456789abcdefABCDEF')
+ESCAPE_SIZES = {'x': 2, 'u': 4, 'U': 8}
+ESCAPE_NAMES = {'x': '\\xXX', 'u': '\\uXXXX', 'U': '\\UXXXXXXXX'}
+
+
+def check_tree(tree, futures, code=None):
+    """
+    Raises SyntaxError (or ValueError, as Python 2 does for some string
+    escapes) if the tree has any of the errors found by Python 2.7 when
+    building the AST.
+
+    Args:
+        tree (Node): tree returned by Parser.parse.
+
+        futures (set): __future__ features returned by Parser.parse.
+
+        code (str, optional): source code, used to add the line to the errors.
+    """
+    checker = _Checker(unicode_literals='unicode_literals' in futures, code=code)
+    stack = [tree]
+    pop = stack.pop
+    push = stack.extend
+    handlers = checker.handlers
+    while stack:
+        node = pop()
+        if node.__class__ is Leaf:
+            if node.type == 'STRING':
+                checker.check_string(node)
+            continue
+        handler = handlers.get(node.type)
+        if handler is not None:
+            handler(node)
+        push(node.children)
+
+
+class _Checker(object):
+    def __init__(self, unicode_literals, code):
+        self.unicode_literals = unicode_literals
+        self.code = code
+        self.handlers = {
+            'expr_stmt': self.check_expr_stmt,
+            'del_stmt': self.check_del,
+            'for_stmt': self.check_for,
+            'list_for': self.check_for,
+            'comp_for': self.check_for,
+            'with_item': self.check_with_item,
+            'except_clause': self.check_except,
+            'funcdef': self.check_def,
+            'classdef': self.check_class,
+            'lambdef': self.check_lambda,
+            'old_lambdef': self.check_lambda,
+            'trailer': self.check_trailer,
+            'decorator': self.check_decorator,
+            'import_name': self.check_import_name,
+            'import_from': self.check_import_from,
+            'import_as_name': self.check_import_as,
+            'dotted_as_name': self.check_import_as,
+        }
+
+    def error(self, msg, node):
+        line = None
+        if self.code is not None:
+            lines = self.code.splitlines()
+            if node.lineno <= len(lines):
+                line = lines[node.lineno - 1] + '\n'
+        # as in Python 2, without offset
+        return SyntaxError(msg, ('<unknown>', node.lineno, None, line))
+
+    # Assignments
+
+    def forbidden(self, leaf):
+        if leaf.value in FORBIDDEN_NAMES:
+            raise self.error('cannot assign to %s' % leaf.value, leaf)
+
+    def set_context(self, target, store=True):
+        stack = [target]
+        while stack:
+            node = stack.pop()
+            kind, value = _expr_kind(node)
+            if kind == 'Name':
+                if store:
+                    self.forbidden(value)
+            elif kind == 'Attribute':
+                if store:
+                    self.forbidden(value)
+            elif kind in ('Tuple', 'List'):
+                if kind == 'Tuple' and not value:
+                    raise self.error("can't assign to ()", node)
+                stack.extend(value)
+            elif kind != 'Subscript':
+                raise self.error("can't %s %s" % ('assign to' if store else 'delete', kind), node)
+
+    def check_expr_stmt(self, node):
+        children = node.children
+        if children[1].type in AUGASSIGN:
+            target = children[0]
+            self.set_context(target)
+            if _expr_kind(target)[0] not in ('Name', 'Attribute', 'Subscript'):
+                raise self.error('illegal expression for augmented assignment', target)
+            return
+
+        for target in children[:-1:2]:
+            if target.type in ('yield_expr', 'yield'):
+                raise self.error('assignment to yield expression not possible', target)
+            self.set_context(target)
+
+    def check_del(self, node):
+        self.set_context(node.children[1], store=False)
+
+    def check_for(self, node):
+        self.set_context(node.children[1])
+
+    def check_with_item(self, node):
+        self.set_context(node.children[2])
+
+    def check_except(self, node):
+        if len(node.children) == 4:
+            self.set_context(node.children[3])
+
+    # Definitions
+
+    def check_def(self, node):
+        self.forbidden(node.children[1])
+        parameters = node.children[2].children
+        if len(parameters) == 3:
+            self.check_arguments(parameters[1])
+
+    def check_class(self, node):
+        self.forbidden(node.children[1])
+
+    def check_lambda(self, node):
+        if len(node.children) == 4:
+            self.check_arguments(node.children[1])
+
+    def check_arguments(self, node):
+        if node.__class__ is Leaf or node.type != 'varargslist':
+            items = [node]
+        else:
+            items = node.children
+
+        found_default = False
+        idx = 0
+        while idx < len(items):
+            item = items[idx]
+            if item.type in ('*', '**'):
+                self.forbidden(items[idx + 1])
+                idx += 3
+                continue
+
+            if idx + 1 < len(items) and items[idx + 1].type == '=':
+                found_default = True
+                idx += 4
+            else:
+                if found_default:
+                    raise self.error('non-default argument follows default argument', item)
+                idx += 2
+
+            # the names of the argument (or of the nested tuple)
+            stack = [item]
+            while stack:
+                each = stack.pop()
+                if each.__class__ is Leaf:
+                    if each.type == 'NAME':
+                        self.forbidden(each)
+                else:
+                    stack.extend(each.children)
+
+    # Calls
+
+    def check_trailer(self, node):
+        children = node.children
+        if children[0].type == '(' and len(children) == 3:
+            self.check_call(children[1])
+
+    def check_decorator(self, node):
+        children = node.children
+        if len(children) == 5:
+            self.check_call(children[3])
+
+    def check_call(self, arglist):
+        if arglist.__class__ is not Leaf and arglist.type == 'arglist':
+            items = arglist.children
+        else:
+            items = [arglist]
+
+        # (kind, node) of every argument without the * and ** ones
+        arguments = []
+        idx = 0
+        while idx < len(items):
+            item = items[idx]
+            if item.type in ('*', '**'):
+                arguments.append((item.type, items[idx + 1]))
+                idx += 3
+                continue
+            if item.__class__ is not Leaf and item.type == 'argument':
+                if item.children[1].type == 'comp_for':
+                    arguments.append(('generator', item))
+                else:
+                    arguments.append(('keyword', item))
+            else:
+                arguments.append(('positional', item))
+            idx += 2
+
+        counts = {'positional': 0, 'keyword': 0, 'generator': 0}
+        for kind, item in arguments:
+            if kind in counts:
+                counts[kind] += 1
+        if counts['generator'] > 1 or \
+                (counts['generator'] and (counts['positional'] or counts['keyword'])):
+            raise self.error('Generator expression must be parenthesized if not sole argument',
+                             arglist)
+        if sum(counts.values()) > 255:
+            raise self.error('more than 255 arguments', arglist)
+
+        keywords = set()
+        vararg = False
+        for kind, item in arguments:
+            if kind == 'positional':
+                if keywords:
+                    raise self.error('non-keyword arg after keyword arg', item)
+                if vararg:
+                    raise self.error('only named arguments may follow *expression', item)
+            elif kind == 'keyword':
+                key = item.children[0]
+                key_kind, name = _expr_kind(key)
+                if key_kind == 'lambda':
+                    raise self.error('lambda cannot contain assignment', key)
+                if key_kind != 'Name':
+                    raise self.error("keyword can't be an expression", key)
+                self.forbidden(name)
+                if name.value in keywords:
+                    raise self.error('keyword argument repeated', key)
+                keywords.add(name.value)
+            elif kind == '*':
+                vararg = True
+
+    # Imports
+
+    def check_import_name(self, node):
+        # the names imported without "as" (the others are checked by check_import_as)
+        names = node.children[1]
+        if names.__class__ is not Leaf and names.type == 'dotted_as_names':
+            names = names.children
+        else:
+            names = [names]
+        for name in names:
+            if name.__class__ is Leaf and name.type == 'NAME':
+                self.forbidden(name)
+
+    def check_import_from(self, node):
+        children = node.children
+        names = children[-1]
+        if names.type == ')':
+            names = children[-2]
+        elif names.__class__ is not Leaf and names.type == 'import_as_names' and \
+                names.children[-1].type == ',':
+            raise self.error('trailing comma not allowed without surrounding parentheses', node)
+        if names.__class__ is Leaf and names.type == 'NAME':
+            self.forbidden(names)
+        elif names.__class__ is not Leaf and names.type == 'import_as_names':
+            for name in names.children:
+                if name.__class__ is Leaf and name.type == 'NAME':
+                    self.forbidden(name)
+
+    def check_import_as(self, node):
+        self.forbidden(node.children[-1])
+
+    # Strings
+
+    def check_string(self, leaf):
+        text = leaf.value
+        quote_pos = 0
+        while text[quote_pos] not in '\'"':
+            quote_pos += 1
+        prefix = text[:quote_pos].lower()
+        quote_size = 3 if text[quote_pos:quote_pos + 3] in ('"""', "'''") else 1
+        body = text[quote_pos + quote_size:-quote_size]
+        if '\\' not in body:
+            return
+
+        is_unicode = 'u' in prefix or (self.unicode_literals and 'b' not in prefix)
+        if 'r' in prefix:
+            if is_unicode:
+                self.check_raw_unicode(leaf, body)
+            return
+
+        for match in ESCAPE_REGEX.finditer(body):
+            char = match.group(1)
+            if char == 'x' or (is_unicode and char in 'uU'):
+                start = match.end()
+                size = _hex_size(body, start, ESCAPE_SIZES[char])
+                if size < ESCAPE_SIZES[char]:
+                    if not is_unicode:
+                        raise ValueError('invalid \\x escape')
+                    raise self.unicode_error(leaf, 'unicodeescape', body, match.start(),
+                                             start + size, 'truncated %s escape' % ESCAPE_NAMES[char])
+                if char == 'U' and int(body[start:start + size], 16) > 0x10ffff:
+                    raise self.unicode_error(leaf, 'unicodeescape', body, match.start(),
+                                             start + size, 'illegal Unicode character')
+            elif is_unicode and char == 'N':
+                start = match.end()
+                end = body.find('}', start)
+                if body[start:start + 1] != '{' or end < 0:
+                    raise self.unicode_error(leaf, 'unicodeescape', body, match.start(),
+                                             start if body[start:start + 1] != '{' else len(body),
+                                             'malformed \\N character escape')
+                try:
+                    unicodedata.lookup(body[start + 1:end])
+                except KeyError:
+                    raise self.unicode_error(leaf, 'unicodeescape', body, match.start(), end + 1,
+                                             'unknown Unicode character name')
+
+    def check_raw_unicode(self, leaf, body):
+        for match in RAW_UNICODE_ESCAPE_REGEX.finditer(body):
+            if len(match.group(1)) % 2 == 0:
+                continue
+            char = match.group(2)
+            start = match.end()
+            size = _hex_size(body, start, ESCAPE_SIZES[char])
+            # the codec names both escapes as \\uXXXX
+            if size < ESCAPE_SIZES[char]:
+                raise self.unicode_error(leaf, 'rawunicodeescape', body, match.start(),
+                                         start + size, 'truncated \\uXXXX')
+            if char == 'U' and int(body[start:start + size], 16) > 0x10ffff:
+                raise self.unicode_error(leaf, 'rawunicodeescape', body, match.start(),
+                                         start + size, '\\Uxxxxxxxx out of range')
+
+    def unicode_error(self, leaf, codec, body, start, end, reason):
+        # the codec positions are the bytes of the (UTF-8) string body
+        start, end = _byte_offset(body, start), _byte_offset(body, end)
+        return self.error("(unicode error) '%s' codec can't decode bytes in position %d-%d: %s"
+                          % (codec, start, end - 1, reason), leaf)
+
+
+def _hex_size(text, start, size):
+    # Returns the number of hexadecimal digits (up to size) found at start
+    count = 0
+    while count < size and text[start + count:start + count + 1] in HEX_DIGITS and \
+            start + count < len(text):
+        count += 1
+    return count
+
+
+def _byte_offset(text, index):
+    if isinstance(text, bytes):
+        return index
+    return len(text[:index].encode('utf-8', 'replace'))
+
+
+def _expr_kind(node):
+    """
+    Returns the kind of expression of a node (as the AST would name it) and
+    the value needed by the checks: the NAME leaf for Name, the attribute NAME
+    leaf for Attribute and the elements for Tuple and List. The kinds that
+    can't be assigned are returned with the name used in the error messages.
+    """
+    if node.__class__ is Leaf:
+        if node.type == 'NAME':
+            return 'Name', node
+        if node.type == 'yield':
+            return 'yield expression', None
+        return 'literal', None
+
+    rule = node.type
+    children = node.children
+    if rule == 'atom':
+        first = children[0].type
+        if first == '(':
+            if len(children) == 2:
+                return 'Tuple', []
+            inner = children[1]
+            if inner.type in ('yield_expr', 'yield'):
+                return 'yield expression', None
+            if inner.type == 'testlist_comp':
+                if inner.children[1].type == 'comp_for':
+                    return 'generator expression', None
+                return 'Tuple', inner.children[::2]
+            return _expr_kind(inner)
+        if first == '[':
+            if len(children) == 2:
+                return 'List', []
+            inner = children[1]
+            if inner.type == 'listmaker':
+                if inner.children[1].type == 'list_for':
+                    return 'list comprehension', None
+                return 'List', inner.children[::2]
+            return 'List', [inner]
+        if first == '{':
+            inner = children[1]
+            if inner.type == 'dictorsetmaker':
+                if inner.children[1].type == ':':
+                    if len(inner.children) > 3 and inner.children[3].type == 'comp_for':
+                        return 'dict comprehension', None
+                elif inner.children[1].type == 'comp_for':
+                    return 'set comprehension', None
+            return 'literal', None
+        if first == '`':
+            return 'repr', None
+        return 'literal', None
+
+    if rule == 'power':
+        if children[-2].type == '**':
+            return 'operator', None
+        trailer = children[-1]
+        first = trailer.children[0].type
+        if first == '(':
+            return 'function call', None
+        if first == '[':
+            return 'Subscript', None
+        return 'Attribute', trailer.children[1]
+
+    if rule == 'factor':
+        if children[0].type == '-' and children[1].__class__ is Leaf and \
+                children[1].type == 'NUMBER':
+            return 'literal', None
+        return 'operator', None
+    if rule in OPERATOR_RULES:
+        return 'operator', None
+    if rule == 'comparison':
+        return 'comparison', None
+    if rule == 'test':
+        return 'conditional expression', None
+    if rule in ('lambdef', 'old_lambdef'):
+        return 'lambda', None
+    if rule in TUPLE_RULES:
+        return 'Tuple', children[::2]
+    if rule == 'yield_expr':
+        return 'yield expression', None
+    return rule, None
@@ -0,0 +1,212 @@
+"""
+LL(1) parser driver for the grammar tables generated by pgen, working like the
+parser of CPython 2.7: a stack with the automaton state of every open rule
+fed with one token at a time.
+
+The concrete syntax tree is built without the NEWLINE, INDENT, DEDENT and
+ENDMARKER tokens and, as lib2to3 does, the nodes with a single child are
+replaced by it.
+"""
+
+from pydetector.py2parser.pgen import generate_grammar
+from pydetector.py2parser.tokenizer import Tokenizer
+
+__all__ = ['Node', 'Leaf', 'Parser', 'MAX_STACK']
+
+# Size of the parser stack in CPython 2.7, deeper code is rejected there
+MAX_STACK = 1500
+
+# Tokens not stored in the tree
+SKIPPED_TOKENS = frozenset(['NEWLINE', 'INDENT', 'DEDENT', 'ENDMARKER'])
+
+
+class Node(object):
+    """ Nonterminal of the tree (a grammar rule) """
+    __slots__ = ('type', 'children', 'lineno', 'col_offset')
+
+    def __init__(self, type, children, lineno, col_offset):
+        self.type = type
+        self.children = children
+        self.lineno = lineno
+        self.col_offset = col_offset
+
+    def __repr__(self):
+        return 'Node(%s, %r)' % (self.type, self.children)
+
+
+class Leaf(object):
+    """
+    Token of the tree. Its type is NAME, NUMBER, STRING or, for the keywords
+    and operators, the value itself.
+    """
+    __slots__ = ('type', 'value', 'lineno', 'col_offset')
+
+    def __init__(self, type, value, lineno, col_offset):
+        self.type = type
+        self.value = value
+        self.lineno = lineno
+        self.col_offset = col_offset
+
+    def __repr__(self):
+        return 'Leaf(%s, %r)' % (self.type, self.value)
+
+
+class Parser(object):
+    """
+    Parser of the Python 2 grammar. The tables are generated once when
+    created, so reuse it.
+    """
+
+    def __init__(self, grammar=None):
+        self.grammar = grammar or generate_grammar()
+        # rule -> list of (actions, final) by state. The actions map every
+        # token label to the next state and the frames to push for it as
+        # (states of the rule, rule, state after the token) tuples, so the
+        # chain of rules started by a token is pushed at once
+        self.tables = dict((name, []) for name in self.grammar.dfas)
+        for name, states in self.grammar.dfas.items():
+            for arcs, final in states:
+                self.tables[name].append((self._actions(name, arcs), final))
+
+    def _actions(self, name, arcs):
+        actions = {}
+        for label, next_state in arcs.items():
+            if self.grammar.is_rule(label):
+                for token_label in self.grammar.first[label]:
+                    if token_label in actions:
+                        raise ValueError('Ambiguous grammar: %s in %s' % (token_label, name))
+                    actions[token_label] = (next_state, self._chain(label, token_label))
+            else:
+                if label in actions:
+                    raise ValueError('Ambiguous grammar: %s in %s' % (label, name))
+                actions[label] = (next_state, ())
+        return actions
+
+    def _chain(self, rule, token_label):
+        chain = []
+        while rule is not None:
+            arcs = self.grammar.dfas[rule][0][0]
+            for label, next_state in arcs.items():
+                if label == token_label or (self.grammar.is_rule(label) and
+                                            token_label in self.grammar.first[label]):
+                    chain.append((self.tables[rule], rule, next_state))
+                    rule = label if self.grammar.is_rule(label) else None
+                    break
+        return tuple(chain)
+
+    def parse(self, code):
+        """
+        Returns the tree (a Node) of the code and the set of __future__
+        features imported that change the parsing (print_function and
+        unicode_literals). Raises SyntaxError (or IndentationError) on errors.
+        """
+        tokenizer = Tokenizer(code)
+        keywords = set(self.grammar.keywords)
+        futures = set()
+        tables = self.tables
+        start = self.grammar.start
+        skipped = SKIPPED_TOKENS
+
+        # [states of the rule, state, rule name, children, lineno, col_offset]
+        root = [tables[start], 0, start, [], 1, 0]
+        stack = [root]
+        push = stack.append
+        pop = stack.pop
+
+        for kind, value, lineno, col in tokenizer:
+            if kind == 'NAME' and value in keywords:
+                kind = value
+
+            frame = stack[-1]
+            while True:
+                actions, final = frame[0][frame[1]]
+                action = actions.get(kind)
+                if action is not None:
+                    break
+                if not final or frame is root:
+                    raise self._syntax_error(tokenizer, frame, kind, value, lineno, col)
+
+                # the rule is complete, add it to its parent
+                pop()
+                children = frame[3]
+                rule = frame[2]
+                parent = stack[-1]
+                if len(children) == 1:
+                    parent[3].append(children[0])
+                elif children:
+                    parent[3].append(Node(rule, children, frame[4], frame[5]))
+                if rule == 'import_from':
+                    self._future_import(children, keywords, futures)
+                frame = parent
+
+            frame[1], chain = action
+            if chain:
+                for states, rule, state in chain:
+                    frame = [states, state, rule, [], lineno, col]
+                    push(frame)
+                if len(stack) > MAX_STACK:
+                    raise tokenizer.error('too many nested parentheses (parser stack overflow)',
+                                          lineno, col + 1)
+            if kind not in skipped:
+                frame[3].append(Leaf(kind, value, lineno, col))
+
+        return Node(start, root[3], 1, 0), futures
+
+    @staticmethod
+    def _future_import(children, keywords, futures):
+        # As the C parser does, the __future__ imports that change the grammar
+        # are applied from this point
+        names = _future_names(children)
+        if 'print_function' in names:
+            keywords.discard('print')
+        futures.update(names)
+
+    def _syntax_error(self, tokenizer, frame, kind, value, lineno, col):
+        # as the C tokenizer, the location is the end of the token (the line
+        # where it ends, the offset from the line where it starts)
+        offset = col + len(value)
+        if kind == 'STRING':
+            lineno += value.count('\n')
+        if tokenizer.done:
+            # as in CPython 2.7, the EOF is only blamed in the first line
+            lineno, offset = tokenizer.end_location()
+            if lineno <= 1:
+                return tokenizer.error('unexpected EOF while parsing', lineno, offset)
+
+        actions = frame[0][frame[1]][0]
+        if 'INDENT' in actions and len(actions) == 1:
+            return tokenizer.error('expected an indented block', lineno, offset, IndentationError)
+        if kind == 'INDENT':
+            return tokenizer.error('unexpected indent', lineno, offset, IndentationError)
+        if kind == 'DEDENT':
+            return tokenizer.error('unexpected unindent', lineno, offset, IndentationError)
+        return tokenizer.error('invalid syntax', lineno, offset)
+
+
+def _future_names(children):
+    # Returns the names imported by a "from __future__ import" (children of import_from)
+    if len(children) < 4 or not isinstance(children[1], Leaf) or \
+            children[1].value != '__future__':
+        return set()
+
+    names = set()
+    for child in children[3:]:
+        if isinstance(child, Leaf):
+            if child.type == 'NAME':
+                names.add(child.value)
+            continue
+        # import_as_names or import_as_name nodes
+        stack = [child]
+        while stack:
+            node = stack.pop()
+            if node.type == 'import_as_name':
+                if isinstance(node.children[0], Leaf):
+                    names.add(node.children[0].value)
+            else:
+                for each in node.children:
+                    if isinstance(each, Leaf):
+                        if each.type == 'NAME':
+                            names.add(each.value)
+                    else:
+                        stack.append(each)
+    return names
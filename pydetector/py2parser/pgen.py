@@ -0,0 +1,300 @@
+"""
+Parser generator in the style of CPython's pgen: reads an EBNF grammar file
+and builds a deterministic automaton (DFA) for every rule plus the sets of
+tokens that can start them, as needed by the LL(1) driver in parser.py.
+"""
+
+import os
+import re
+
+__all__ = ['Grammar', 'generate_grammar', 'GRAMMAR_FILE']
+
+GRAMMAR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Grammar.txt')
+
+# Terminal labels that are token types instead of literal keywords/operators
+TOKEN_LABELS = ('NAME', 'NUMBER', 'STRING', 'NEWLINE', 'INDENT', 'DEDENT', 'ENDMARKER')
+
+_GRAMMAR_TOKEN_REGEX = re.compile(r"""
+    (?P<space>[ \t]+|\#[^\n]*) |
+    (?P<newline>\n) |
+    (?P<name>[A-Za-z_]\w*) |
+    (?P<string>'[^'\n]*') |
+    (?P<op>[:|()\[\]*+])
+""", re.VERBOSE)
+
+
+class Grammar(object):
+    """
+    Tables of a generated grammar.
+
+    Attributes:
+        start (str): name of the start rule.
+
+        dfas (dict): rule name -> list of states. Every state is a tuple
+            (arcs, final) where arcs maps the label of every arc (a rule
+            name or a terminal label) to the index of the next state.
+
+        first (dict): rule name -> set of the terminal labels that can
+            start it.
+
+        keywords (set): the literal labels that are names (like 'if').
+    """
+
+    def __init__(self, start, dfas, first, keywords):
+        self.start = start
+        self.dfas = dfas
+        self.first = first
+        self.keywords = keywords
+
+    def is_rule(self, label):
+        return label in self.dfas
+
+
+def generate_grammar(filename=GRAMMAR_FILE, start='file_input'):
+    """ Reads the grammar file and returns its Grammar """
+    with open(filename) as infile:
+        rules, order = _GrammarReader(infile.read()).parse()
+
+    dfas = {}
+    for name in order:
+        start_state, end_state = rules[name]
+        dfas[name] = _simplify_dfa(_make_dfa(start_state, end_state))
+
+    first = _first_sets(dfas, order)
+    keywords = set()
+    tables = {}
+    for name in order:
+        states = dfas[name]
+        numbered = dict((id(state), idx) for idx, state in enumerate(states))
+        table = []
+        for state in states:
+            arcs = {}
+            for label, target in state.arcs.items():
+                arcs[label] = numbered[id(target)]
+                if label not in dfas and label not in TOKEN_LABELS and label[0].isalpha():
+                    keywords.add(label)
+            table.append((arcs, state.final))
+        tables[name] = table
+
+    return Grammar(start, tables, first, keywords)
+
+
+class _NFAState(object):
+    def __init__(self):
+        # (label or None for the empty arcs, next state)
+        self.arcs = []
+
+    def add_arc(self, target, label=None):
+        self.arcs.append((label, target))
+
+
+class _DFAState(object):
+    def __init__(self, nfa_states, final):
+        self.nfa_states = nfa_states
+        self.final = final
+        # label -> _DFAState
+        self.arcs = {}
+
+    def same_as(self, other):
+        if self.final != other.final or len(self.arcs) != len(other.arcs):
+            return False
+        for label, target in self.arcs.items():
+            if other.arcs.get(label) is not target:
+                return False
+        return True
+
+
+class _GrammarReader(object):
+    """ Recursive descent reader of the grammar file building the NFAs """
+
+    def __init__(self, text):
+        self.tokens = []
+        pos = 0
+        while pos < len(text):
+            match = _GRAMMAR_TOKEN_REGEX.match(text, pos)
+            if match is None:
+                raise ValueError('Invalid grammar at %r' % text[pos:pos + 20])
+            pos = match.end()
+            kind = match.lastgroup
+            if kind == 'space':
+                continue
+            if kind == 'newline':
+                # the rules continue in the lines starting with spaces
+                if pos < len(text) and text[pos] in ' \t\n#':
+                    continue
+            self.tokens.append((kind, match.group()))
+        self.tokens.append(('newline', '\n'))
+        self.tokens.append(('end', ''))
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos]
+
+    def take(self, kind=None, value=None):
+        token = self.tokens[self.pos]
+        if (kind is not None and token[0] != kind) or (value is not None and token[1] != value):
+            raise ValueError('Invalid grammar: expected %s %s, got %r' % (kind, value or '', token))
+        self.pos += 1
+        return token[1]
+
+    def parse(self):
+        rules = {}
+        order = []
+        while self.peek()[0] != 'end':
+            if self.peek()[0] == 'newline':
+                self.take()
+                continue
+            name = self.take('name')
+            self.take('op', ':')
+            rules[name] = self.parse_rhs()
+            self.take('newline')
+            order.append(name)
+        return rules, order
+
+    def parse_rhs(self):
+        start, end = self.parse_alt()
+        if self.peek() != ('op', '|'):
+            return start, end
+        alt_start = _NFAState()
+        alt_end = _NFAState()
+        alt_start.add_arc(start)
+        end.add_arc(alt_end)
+        while self.peek() == ('op', '|'):
+            self.take()
+            start, end = self.parse_alt()
+            alt_start.add_arc(start)
+            end.add_arc(alt_end)
+        return alt_start, alt_end
+
+    def parse_alt(self):
+        start, end = self.parse_item()
+        while self.peek()[0] in ('name', 'string') or self.peek() in (('op', '('), ('op', '[')):
+            next_start, next_end = self.parse_item()
+            end.add_arc(next_start)
+            end = next_end
+        return start, end
+
+    def parse_item(self):
+        if self.peek() == ('op', '['):
+            self.take()
+            start, end = self.parse_rhs()
+            self.take('op', ']')
+            start.add_arc(end)
+            return start, end
+
+        start, end = self.parse_atom()
+        if self.peek() in (('op', '+'), ('op', '*')):
+            repeat = self.take()
+            end.add_arc(start)
+            if repeat == '*':
+                return start, start
+        return start, end
+
+    def parse_atom(self):
+        if self.peek() == ('op', '('):
+            self.take()
+            start, end = self.parse_rhs()
+            self.take('op', ')')
+            return start, end
+
+        kind, value = self.peek()
+        if kind not in ('name', 'string'):
+            raise ValueError('Invalid grammar: unexpected %r' % value)
+        self.take()
+        start = _NFAState()
+        end = _NFAState()
+        start.add_arc(end, value.strip("'") if kind == 'string' else value)
+        return start, end
+
+
+def _closure(state, states):
+    if state in states:
+        return
+    states.add(state)
+    for label, target in state.arcs:
+        if label is None:
+            _closure(target, states)
+
+
+def _make_dfa(start, end):
+    # Subset construction: every DFA state is the set of NFA states reachable
+    # with the same input
+    def closure(state):
+        states = set()
+        _closure(state, states)
+        return frozenset(states)
+
+    first = closure(start)
+    dfa = [_DFAState(first, end in first)]
+    by_set = {first: dfa[0]}
+    idx = 0
+    while idx < len(dfa):
+        state = dfa[idx]
+        idx += 1
+        targets = {}
+        order = []
+        for nfa_state in state.nfa_states:
+            for label, target in nfa_state.arcs:
+                if label is not None:
+                    if label not in targets:
+                        targets[label] = set()
+                        order.append(label)
+                    _closure(target, targets[label])
+        for label in order:
+            nfa_set = frozenset(targets[label])
+            target = by_set.get(nfa_set)
+            if target is None:
+                target = by_set[nfa_set] = _DFAState(nfa_set, end in nfa_set)
+                dfa.append(target)
+            state.arcs[label] = target
+    return dfa
+
+
+def _simplify_dfa(dfa):
+    # Merges the equivalent states until there aren't more
+    changes = True
+    while changes:
+        changes = False
+        for i, state in enumerate(dfa):
+            for j in range(i + 1, len(dfa)):
+                other = dfa[j]
+                if state.same_as(other):
+                    del dfa[j]
+                    for each in dfa:
+                        for label, target in list(each.arcs.items()):
+                            if target is other:
+                                each.arcs[label] = state
+                    changes = True
+                    break
+            if changes:
+                break
+    return dfa
+
+
+def _first_sets(dfas, order):
+    first = {}
+    for name in order:
+        if name not in first:
+            _first_set(name, dfas, first)
+    return first
+
+
+def _first_set(name, dfas, first):
+    first[name] = None  # marks the left recursion
+    result = {}
+    for label in dfas[name][0].arcs:
+        if label in dfas:
+            if label in first:
+                if first[label] is None:
+                    raise ValueError('Left recursion in the rule %s' % name)
+            else:
+                _first_set(label, dfas, first)
+            labels = first[label]
+        else:
+            labels = set([label])
+        for each in labels:
+            if each in result:
+                raise ValueError('Rule %s is ambiguous: %s is in the first sets of %s and %s'
+                                 % (name, each, label, result[each]))
+            result[each] = label
+    first[name] = set(result)
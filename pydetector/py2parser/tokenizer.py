@@ -0,0 +1,282 @@
+"""
+Tokenizer of the Python 2.7 source code, following the rules (and error
+messages) of the C tokenizer of CPython 2.7.
+"""
+
+import re
+
+__all__ = ['Tokenizer', 'MAX_INDENT']
+
+# As the C tokenizer, tabs move to the next multiple of 8 columns
+TAB_SIZE = 8
+MAX_INDENT = 100
+
+# String prefixes allowed by Python 2
+STRING_PREFIXES = frozenset(['u', 'U', 'b', 'B', 'r', 'R', 'ur', 'uR', 'Ur', 'UR',
+                             'br', 'bR', 'Br', 'BR'])
+
+NAME_REGEX = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+NAME_START = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_')
+DIGITS = frozenset('0123456789')
+
+NUMBER_REGEX = re.compile(r"""
+    (?P<float>
+        (?: [0-9]+\.[0-9]* | \.[0-9]+ ) (?:[eE][-+]?[0-9]+)? [jJ]? |
+        [0-9]+ (?: [eE][-+]?[0-9]+ [jJ]? | [jJ] )
+    ) |
+    (?P<prefixed> 0[xX][0-9a-fA-F]+[lL]? | 0[oO][0-7]+[lL]? | 0[bB][01]+[lL]? ) |
+    (?P<int> 0[0-7]*[lL]? | [1-9][0-9]*[lL]? )
+""", re.VERBOSE)
+
+STRING_REGEXES = {
+    "'": re.compile(r"'[^\n'\\]*(?:\\.[^\n'\\]*)*'", re.S),
+    '"': re.compile(r'"[^\n"\\]*(?:\\.[^\n"\\]*)*"', re.S),
+    "'''": re.compile(r"'''[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*'''", re.S),
+    '"""': re.compile(r'"""[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*"""', re.S),
+}
+
+OPERATORS_3 = frozenset(['**=', '//=', '>>=', '<<='])
+OPERATORS_2 = frozenset(['==', '!=', '<>', '<=', '>=', '<<', '>>', '**', '//', '+=', '-=',
+                         '*=', '/=', '%=', '&=', '|=', '^='])
+BRACKETS_OPEN = frozenset('([{')
+BRACKETS_CLOSE = frozenset(')]}')
+
+# Characters skipped between the tokens (and in the indentation)
+SPACES = frozenset(' \t\x0c')
+
+
+class Tokenizer(object):
+    """
+    Iterates the tokens of the code as (label, value, lineno, col_offset)
+    tuples. The label is the token type (NAME, NUMBER, STRING, NEWLINE,
+    INDENT, DEDENT, ENDMARKER) or the operator itself. The errors are raised as
+    SyntaxError (or IndentationError) like Python 2 would.
+
+    Like the C tokenizer, done is set once the end of the code is reached so
+    the parser can report the errors there as "unexpected EOF".
+    """
+
+    def __init__(self, code):
+        if '\0' in code:
+            raise TypeError('compile() expected string without null bytes')
+        self.code = code.replace('\r\n', '\n').replace('\r', '\n')
+        # as compile() does with the exec input
+        if not self.code.endswith('\n'):
+            self.code += '\n'
+        self.lines = None
+        self.done = False
+
+    def line(self, lineno):
+        """ Returns the text of a line (starting at 1) """
+        if self.lines is None:
+            self.lines = self.code.split('\n')
+        if 0 < lineno <= len(self.lines):
+            return self.lines[lineno - 1] + '\n'
+        return ''
+
+    def end_location(self):
+        """
+        Returns the (lineno, offset) of the end of the code where, like in
+        C, the errors found at the end are reported: the last line read
+        (blank or not) and the offset after its newline.
+        """
+        lines = self.code.split('\n')
+        if len(lines) > 1 and not lines[-1]:
+            lines.pop()
+        return len(lines), len(lines[-1]) + 1
+
+    def error(self, msg, lineno, offset, cls=SyntaxError):
+        return cls(msg, ('<unknown>', lineno, offset, self.line(lineno)))
+
+    def __iter__(self):
+        code = self.code
+        size = len(code)
+        pos = 0
+        lineno = 1
+        line_start = 0
+        indents = [0]
+        parens = 0
+        at_bol = True
+        started = False
+
+        while True:
+            if at_bol:
+                # Indentation (the blank and comment lines are ignored)
+                col = 0
+                while pos < size and code[pos] in SPACES:
+                    char = code[pos]
+                    if char == ' ':
+                        col += 1
+                    elif char == '\t':
+                        col = (col // TAB_SIZE + 1) * TAB_SIZE
+                    else:
+                        col = 0
+                    pos += 1
+
+                if pos >= size:
+                    break
+                if code[pos] == '#' or code[pos] == '\n':
+                    newline = code.find('\n', pos)
+                    if newline < 0:
+                        pos = size
+                        break
+                    pos = newline + 1
+                    lineno += 1
+                    line_start = pos
+                    continue
+
+                at_bol = False
+                if parens == 0:
+                    if col > indents[-1]:
+                        if len(indents) >= MAX_INDENT:
+                            raise self.error('too many levels of indentation', lineno,
+                                             pos - line_start, IndentationError)
+                        indents.append(col)
+                        yield 'INDENT', '', lineno, pos - line_start
+                    elif col < indents[-1]:
+                        # as in C, checked before the parser gets the DEDENT tokens
+                        dedents = 0
+                        while col < indents[-1]:
+                            indents.pop()
+                            dedents += 1
+                        if col != indents[-1]:
+                            raise self.error('unindent does not match any outer indentation level',
+                                             lineno, len(self.line(lineno)), IndentationError)
+                        for _ in range(dedents):
+                            yield 'DEDENT', '', lineno, pos - line_start
+
+            while pos < size and code[pos] in SPACES:
+                pos += 1
+            if pos >= size:
+                break
+
+            char = code[pos]
+            col = pos - line_start
+            started = True
+
+            if char == '#':
+                pos = code.find('\n', pos)
+                if pos < 0:
+                    pos = size
+                continue
+
+            if char == '\n':
+                pos += 1
+                if parens == 0:
+                    yield 'NEWLINE', '\n', lineno, col
+                    at_bol = True
+                lineno += 1
+                line_start = pos
+                continue
+
+            if char == '\\':
+                if pos + 1 >= size:
+                    self.done = True
+                    raise self.error('unexpected EOF while parsing', lineno, col + 1)
+                if code[pos + 1] != '\n':
+                    raise self.error('unexpected character after line continuation character',
+                                     lineno, col + 2)
+                pos += 2
+                lineno += 1
+                line_start = pos
+                continue
+
+            if char in NAME_START:
+                match = NAME_REGEX.match(code, pos)
+                end = match.end()
+                if end < size and code[end] in '\'"' and match.group() in STRING_PREFIXES:
+                    pos, lineno, line_start, token = self._string(pos, end, lineno, line_start)
+                    yield token
+                    continue
+                yield 'NAME', match.group(), lineno, col
+                pos = end
+                continue
+
+            if char in '\'"':
+                pos, lineno, line_start, token = self._string(pos, pos, lineno, line_start)
+                yield token
+                continue
+
+            if char in DIGITS or (char == '.' and code[pos + 1:pos + 2] in DIGITS):
+                match = NUMBER_REGEX.match(code, pos)
+                end = match.end()
+                text = match.group()
+                following = code[end:end + 1]
+                # a zero followed by 8 or 9 is a bad octal, other numbers are just
+                # followed by another token. An exponent without digits is only
+                # valid when not signed ("1else")
+                if (following and following in DIGITS and match.lastgroup == 'int' and
+                        text[0] == '0' and text[-1] not in 'lL') or \
+                        (text == '0' and following in ('x', 'X', 'o', 'O', 'b', 'B')):
+                    raise self.error('invalid token', lineno, end + 1 - line_start)
+                if match.lastgroup != 'prefixed' and following in ('e', 'E') and \
+                        text[-1] not in 'lLjJ' and code[end + 1:end + 2] in ('+', '-'):
+                    raise self.error('invalid token', lineno, end + 2 - line_start)
+                yield 'NUMBER', text, lineno, col
+                pos = end
+                continue
+
+            operator = code[pos:pos + 3]
+            if operator not in OPERATORS_3:
+                operator = operator[:2]
+                if operator not in OPERATORS_2:
+                    # any other character goes to the parser as an (unknown) operator
+                    operator = char
+            if operator in BRACKETS_OPEN:
+                parens += 1
+            elif operator in BRACKETS_CLOSE and parens:
+                parens -= 1
+            yield operator, operator, lineno, col
+            pos += len(operator)
+
+        # End of the code: close the last line and the indented blocks
+        self.done = True
+        if not at_bol:
+            yield 'NEWLINE', '', lineno, pos - line_start
+        while len(indents) > 1:
+            indents.pop()
+            yield 'DEDENT', '', lineno, 0
+        if at_bol and started:
+            yield 'NEWLINE', '', lineno, 0
+        yield 'ENDMARKER', '', lineno, 0
+
+    def _string(self, start, quote_pos, lineno, line_start):
+        # Returns the position, lineno and line start after the string and its token
+        code = self.code
+        quote = code[quote_pos]
+        if code[quote_pos:quote_pos + 3] == quote * 3:
+            quote *= 3
+        match = STRING_REGEXES[quote].match(code, quote_pos)
+        if match is None:
+            if len(quote) == 3:
+                self.done = True
+                raise self.error('EOF while scanning triple-quoted string literal',
+                                 lineno, len(code) - line_start)
+            newline = code.find('\n', quote_pos)
+            # skip the escaped newlines
+            while newline > 0 and _escaped(code, newline):
+                lineno += 1
+                line_start = newline + 1
+                newline = code.find('\n', newline + 1)
+            if newline < 0:
+                newline = len(code)
+            raise self.error('EOL while scanning string literal', lineno,
+                             newline - line_start)
+
+        end = match.end()
+        token = ('STRING', code[start:end], lineno, start - line_start)
+        newlines = code.count('\n', start, end)
+        if newlines:
+            lineno += newlines
+            line_start = code.rfind('\n', start, end) + 1
+        return end, lineno, line_start, token
+
+
+def _escaped(code, pos):
+    # True if the character at pos is preceded by an odd number of backslashes
+    count = 0
+    pos -= 1
+    while pos >= 0 and code[pos] == '\\':
+        count += 1
+        pos -= 1
+    return count % 2 == 1
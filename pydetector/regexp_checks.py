@@ -3,6 +3,10 @@ import six
 
 __all__ = ['check_syntax_regex', 'check_modules_regex', 'check_modulesymbols_regex']
 
+# Increase this when the rules, their scores or the values of the results
+# change so the cached results are invalidated
+RULES_VERSION = 3
+
 # Syntactic elements. Second item in the tuple is the score.
 # TODO: test if I can simplify the regexes while passing tests to improve speed
 
@@ -11,8 +15,19 @@ WHITEORSEP         = r"(^|\s|;|:|,|=)+"
 PARENTH_ARGS       = r"\s*\(.*\)"
 WHITEORSEPORPARENS = r"(^|\s|;|:|,|=|%s)+" % PARENTH_ARGS
 
+# Rules rewritten to be linear, with the plain form they are equivalent to.
+# Their match labels and the fused scanner use the plain form.
+# "raise\s+.*\s+from\s+None" tries every split of a whitespace run between
+# its three parts, which is cubic with long runs; the rewritten form can only
+# match a text in one way: the whitespace around a text starting and ending
+# with something else, or just whitespace.
+RAISE_FROM_NONE = WHITEORSEP + r"raise(?:\s+\S(?:.*\S)?\s+|\s\s+)from\s+None"
+PLAIN_RULES = {
+    RAISE_FROM_NONE: WHITEORSEP + r"raise\s+.*\s+from\s+None",
+}
+
 PY3OTHER_REGEXP = [
-    (re.compile(WHITEORSEP + r"raise\s+.*\s+from\s+None", re.MULTILINE), 100),
+    (re.compile(RAISE_FROM_NONE, re.MULTILINE), 100),
     (re.compile(WHITEORSEP + r"nonlocal\s+", re.MULTILINE), 100),
 ]
 
@@ -35,44 +50,78 @@ PY2OTHER_REGEXP = [
 ]
 
 
+PY2ONLY_MODULES = [
+    "cfmfile", r"[^hashlib\.]([^_]md5|[^_]sha)", "mimetools", "MimeWriter", "mimify",
+    "(multi|posix)file", "rfc822", "timing", "audiodev", "stringold", "bsddb185", "Canvas",
+    "commands", "compiler", "dircache", "fpformat", "(html|mh|sgml|cookie|xmlrpc|http)lib",
+    "imageop", "linuxaudiodev", "c?StringIO", "cPickle",
+    "popen2", "sre", "statvfs", r"[^collections\.]User(Dict|String|List)",
+    "(Config|HTML|robot)(P|p)arser", "copy_reg", "Queue", "SockerServer", "sets",
+    "dbhash", "(g|dumb|which|any)dbm", "(Doc|Simple)XMLRPCServer",
+    "Cookie", "(Base|Simple|CGI)HTTPServer", "urlparse"
+
+]
+PY3ONLY_MODULES = [
+    "configparser", "copyreg", "queue", "socketserver", "ipaddress", "lzma",
+    "(context|repr)lib", "six", # six usually mean both compatible, so just mark as 3
+    "dbm\.(bsd|dumb|ndbm|gdbm)", "xmlrpc\.(client|server)", "http\.(client|server)",
+    "urllib\.(parse|robotparser)"
+]
+
+
+def import_regex_gen(modlist):
+    """
+    Returns the regex of the imports of the modules. The module found is the
+    "imported" or the "from" group.
+    """
+    # "import\s+.*(modules)" where the ".*" can't start with the whitespace
+    # of "\s+", so a long whitespace run isn't split in every possible way
+    strregex_import = LINESTART + r"import\s+(?:\S.*)?(?P<imported>%s)(\s*|,|$)" % "|".join(modlist)
+    strregex_from   = LINESTART + r"from\s+(?P<from>%s)\s+import\s+" % "|".join(modlist)
+    return re.compile(strregex_import + "|" + strregex_from, re.MULTILINE)
+
+
+# Start of the statements where the imports regexes can match, scanned first
+# to only try them there, see _iter_import_matches
+IMPORT_STATEMENTS_REGEXP = re.compile(LINESTART + r"(import|from)\s", re.MULTILINE)
+WHITESPACE_REGEXP = re.compile(r"\s*")
+
+# Top level statements of the import header, see import_header: the imports,
+# the blocks around them, the "__dunder__" assignments and the docstring (an
+# empty string without strings)
+HEADER_STATEMENT_REGEXP = re.compile(
+    r"(?:import|from|if|elif|except)\b|(?:try|else|finally)\s*:|__\w+__\s*="
+    r"""|[rRuUbBfF]{0,2}(?:''|"")"""
+)
+MODULES_SCANS = ('full', 'header')
+
 PY2ONLY_MODULES_REGEXP = None
 PY3ONLY_MODULES_REGEXP = None
 def generate_modules_regex():
     global PY2ONLY_MODULES_REGEXP
     global PY3ONLY_MODULES_REGEXP
 
-    py2only_modules = [
-        "cfmfile", r"[^hashlib\.]([^_]md5|[^_]sha)", "mimetools", "MimeWriter", "mimify",
-        "(multi|posix)file", "rfc822", "timing", "audiodev", "stringold", "bsddb185", "Canvas",
-        "commands", "compiler", "dircache", "fpformat", "(html|mh|sgml|cookie|xmlrpc|http)lib",
-        "imageop", "linuxaudiodev", "c?StringIO", "cPickle",
-        "popen2", "sre", "statvfs", r"[^collections\.]User(Dict|String|List)",
-        "(Config|HTML|robot)(P|p)arser", "copy_reg", "Queue", "SockerServer", "sets",
-        "dbhash", "(g|dumb|which|any)dbm", "(Doc|Simple)XMLRPCServer",
-        "Cookie", "(Base|Simple|CGI)HTTPServer", "urlparse"
-
-    ]
-    py3only_modules = [
-        "configparser", "copyreg", "queue", "socketserver", "ipaddress", "lzma",
-        "(context|repr)lib", "six", # six usually mean both compatible, so just mark as 3
-        "dbm\.(bsd|dumb|ndbm|gdbm)", "xmlrpc\.(client|server)", "http\.(client|server)",
-        "urllib\.(parse|robotparser)"
-    ]
-
-    def import_regex_gen(modlist):
-        strregex_import = LINESTART + r"import\s+.*(%s)(\s*|,|$)" % "|".join(modlist)
-        strregex_from   = LINESTART + r"from\s+(%s)\s+import\s+" % "|".join(modlist)
-        return re.compile(strregex_import + "|" + strregex_from, re.MULTILINE)
-
-    PY2ONLY_MODULES_REGEXP = import_regex_gen(py2only_modules)
-    PY3ONLY_MODULES_REGEXP = import_regex_gen(py3only_modules)
+    PY2ONLY_MODULES_REGEXP = import_regex_gen(PY2ONLY_MODULES)
+    PY3ONLY_MODULES_REGEXP = import_regex_gen(PY3ONLY_MODULES)
+
+
+def _regex_literal(pattern):
+    """ Returns the text matched by a regex without special characters or None """
+    literal = pattern.replace(r"\.", ".")
+    if re.search(r"[\\^$*+?{}\[\]|()]", literal):
+        return None
+    return literal
 
 
 PY3MODULESYMBOLS_REGEXPS = []
 PY2MODULESYMBOLS_REGEXPS = []
+# Same rules as PY3MODULESYMBOLS_REGEXPS as (regex, module name, symbols) tuples,
+# the module name is None if it's not a literal
+PY3MODULESYMBOLS_RULES = []
 def generate_modulesymbols_regex():
     global PY3MODULESYMBOLS_REGEXPS
     global PY2MODULESYMBOLS_REGEXPS
+    global PY3MODULESYMBOLS_RULES
 
     py2only_modulesymbols = {
         "os":       ["getcwdu"],
@@ -119,11 +168,13 @@ def generate_modulesymbols_regex():
     strregex_usage  = WHITEORSEP + r"%s\.%s" + WHITEORSEPORPARENS
 
     for modname, symbollist in six.iteritems(py3only_modulesymbols):
-        PY3MODULESYMBOLS_REGEXPS.append(re.compile(
+        regex = re.compile(
             strregex_import % (modname, "|".join(symbollist)) + "|" +
             strregex_usage  % (modname, "|".join(symbollist)),
             re.MULTILINE
-        ))
+        )
+        PY3MODULESYMBOLS_REGEXPS.append(regex)
+        PY3MODULESYMBOLS_RULES.append((regex, _regex_literal(modname), symbollist))
 
     for modname, symbollist in six.iteritems(py2only_modulesymbols):
         PY2MODULESYMBOLS_REGEXPS.append(re.compile(
@@ -133,12 +184,164 @@ def generate_modulesymbols_regex():
         ))
 
 
+# Fused syntax scanner. Every syntax rule starts with a literal keyword just
+# after a separator (WHITEORSEP) or after "\w\.", so instead of calling findall
+# once per rule a single regex finds the keywords and only the rules of each
+# found keyword are matched, starting at the keyword position. This gives the
+# same matches than findall: the keywords are made of word characters and the
+# rules need a separator or a dot just before them, so a keyword occurrence
+# inside another one (skipped by the scanner) can never start a match. Rules
+# not following this shape are run with findall.
+#
+# The rules like "raise\s+.*\s+from\s+None" or the ones ending in PARENTH_ARGS
+# scan the rest of the line every time they are tried, which is quadratic with
+# many keywords in a long line (minified or generated code). For these rules
+# the part before the ".*" (the head) is matched first: if the rule failed
+# before with the head ending in the same line and before the keyword, its
+# ".*" already tried all the positions the new one could try, so it can't
+# match either.
+SYNTAX_RULES = []
+SYNTAX_RULE_HEADS = []
+SYNTAX_KEYWORDS_REGEXP = None
+SYNTAX_KEYWORD_RULES = {}
+SYNTAX_FINDALL_RULES = []
+
+_SEP_RULE = 1
+_ATTR_RULE = 2
+
+
+def rule_pattern(regex):
+    """ Returns the pattern of a rule, the plain one for the rewritten rules """
+    return PLAIN_RULES.get(regex.pattern, regex.pattern)
+
+
+def _rule_keyword(pattern):
+    """
+    Returns the tuple (keyword, kind) for a syntax rule pattern or
+    (None, None) if it can't be handled by the fused scanner.
+    """
+    for prefix, kind in ((WHITEORSEP, _SEP_RULE), (r"\w\.", _ATTR_RULE)):
+        if not pattern.startswith(prefix):
+            continue
+
+        rest = pattern[len(prefix):]
+        match = re.match(r"\w+", rest)
+        # the keyword must not be followed by a quantifier
+        if match and rest[match.end():match.end() + 1] not in ("?", "*", "+", "{"):
+            return match.group(), kind
+
+    return None, None
+
+
+def _rule_head(regex, keyword):
+    """
+    Returns the compiled head of a rule "prefix keyword middle.*tail" or None
+    if the rule doesn't have this shape. The middle must be some whitespace or
+    an opening parenthesis after optional whitespace, so all the ends of the
+    head are in the line of the longest one.
+    """
+    head, sep, tail = rule_pattern(regex).partition(".*")
+    if keyword is None or not sep or ".*" in tail:
+        return None
+    for prefix in (WHITEORSEP, r"\w\."):
+        if head in (prefix + keyword + r"\s+", prefix + keyword + r"\s*\("):
+            return re.compile(head, regex.flags)
+    return None
+
+
+def generate_syntax_scanner():
+    global SYNTAX_KEYWORDS_REGEXP
+    global SYNTAX_RULES
+    global SYNTAX_RULE_HEADS
+    global SYNTAX_KEYWORD_RULES
+    global SYNTAX_FINDALL_RULES
+
+    SYNTAX_RULES = []
+    SYNTAX_RULE_HEADS = []
+    rule_keywords = []
+    for label, table, py3 in (("PY3SYNTAX_", PY3OTHER_REGEXP, True),
+                              ("PY2SYNTAX_", PY2OTHER_REGEXP, False)):
+        for regex, score in table:
+            pattern = rule_pattern(regex)
+            keyword, kind = _rule_keyword(pattern)
+            SYNTAX_RULES.append((label + pattern, regex, score, py3, kind))
+            SYNTAX_RULE_HEADS.append(_rule_head(regex, keyword))
+            rule_keywords.append(keyword)
+
+    SYNTAX_FINDALL_RULES = [idx for idx, keyword in enumerate(rule_keywords)
+                            if keyword is None]
+    keywords = sorted(set(k for k in rule_keywords if k is not None),
+                      key=len, reverse=True)
+
+    # The longest keyword found at a position wins, so it also gets the rules
+    # of the keywords that are a prefix of it
+    SYNTAX_KEYWORD_RULES = {}
+    for keyword in keywords:
+        SYNTAX_KEYWORD_RULES[keyword] = [
+            idx for idx, other in enumerate(rule_keywords)
+            if other is not None and keyword.startswith(other)
+        ]
+
+    SYNTAX_KEYWORDS_REGEXP = re.compile("|".join(re.escape(k) for k in keywords)) \
+        if keywords else None
+
+
+# Literal prefilter of the module symbols rules. Every match of a rule contains
+# one of its symbols, so a single regex with all the symbols finds the rules
+# that could match and the candidate positions where their matches could start:
+#  - the symbols themselves (the "|" of the rules is not parenthesized so the
+#    symbols in the middle of the list match alone, and the last one starts
+#    its alternative),
+#  - "module.symbol" usages, starting at the separators before them,
+#  - "from" lines, the start of "from module import symbol".
+# The rule regex is then only matched at those positions, tracking the end of
+# the previous match like findall does, so the results are the same.
+PY3MODULESYMBOLS_LITERALS_REGEXP = None
+PY3MODULESYMBOLS_LITERAL_RULES = {}
+FROM_LINE_REGEXP = re.compile(r"^[^\S\n]*from\s", re.MULTILINE)
+
+
+def generate_modulesymbols_scanner():
+    global PY3MODULESYMBOLS_LITERALS_REGEXP
+    global PY3MODULESYMBOLS_LITERAL_RULES
+
+    literals = set()
+    for _, _, symbols in PY3MODULESYMBOLS_RULES:
+        literals.update(symbols)
+    # Longest first: the literals that are a prefix of the one found at a
+    # position are also there
+    literals = sorted(literals, key=len, reverse=True)
+
+    PY3MODULESYMBOLS_LITERAL_RULES = {}
+    for literal in literals:
+        PY3MODULESYMBOLS_LITERAL_RULES[literal] = [
+            (idx, other) for idx, (_, _, symbols) in enumerate(PY3MODULESYMBOLS_RULES)
+            for other in symbols if literal.startswith(other)
+        ]
+
+    PY3MODULESYMBOLS_LITERALS_REGEXP = re.compile("|".join(re.escape(l) for l in literals))
+
+
 # Generate compiled regexes at import time
 generate_modules_regex()
 generate_modulesymbols_regex()
+generate_modulesymbols_scanner()
+generate_syntax_scanner()
 
 
-def check_syntax_regex(code, matches):
+def _findall_item(match):
+    """ Returns what findall would have returned for the match """
+    groups = match.groups("")
+    if not groups:
+        return match.group()
+    return groups[0] if len(groups) == 1 else groups
+
+
+def _margin_reached(margin, score_diff, py2_score, py3_score):
+    return margin is not None and abs(score_diff + py2_score - py3_score) > margin
+
+
+def check_syntax_regex(code, matches, margin=None, score_diff=0, deadline=None):
     """
     Test for syntax elements specific of some Python version.
 
@@ -146,27 +349,123 @@ def check_syntax_regex(code, matches):
         code (str): The code
         matches (List[Tuple[str, str]]): the list of matching rules. It will
         be modified in-place
+        margin (int, optional): stop checking (with partial matches) as soon
+        as the difference between the scores exceeds it
+        score_diff (int): Python 2 minus Python 3 score of the previous
+        checks, added to the difference compared with the margin
+        deadline (Deadline, optional): raise RegexTimeout once it's reached,
+        see pydetector.watchdog
 
     Returns:
         A tuple with the py3_score and the py2_score
     """
     py2_score = py3_score = 0
-
-    for regtuple in PY3OTHER_REGEXP:
-        m = regtuple[0].findall(code)
-        if m:
-            py3_score += (regtuple[1] * len(m))
-            matches.append(("PY3SYNTAX_"+regtuple[0].pattern, m))
-
-    for regtuple in PY2OTHER_REGEXP:
-        m = regtuple[0].findall(code)
+    found = [[] for _ in SYNTAX_RULES]
+    # end of the last match of every rule, like findall they can't overlap
+    ends = [0] * len(SYNTAX_RULES)
+    # (end of the line, end of the head) of the last failure of the rules with
+    # a head. The heads end in increasing positions, so the end of their line
+    # is only searched again when they leave the last one found
+    failed_heads = [None] * len(SYNTAX_RULES)
+    line_pos = eol = -1
+    stopped = False
+
+    if SYNTAX_KEYWORDS_REGEXP is not None:
+        for kwmatch in SYNTAX_KEYWORDS_REGEXP.finditer(code):
+            if stopped:
+                break
+            if deadline is not None:
+                deadline.check()
+            pos = kwmatch.start()
+            for idx in SYNTAX_KEYWORD_RULES[kwmatch.group()]:
+                regex, kind = SYNTAX_RULES[idx][1], SYNTAX_RULES[idx][4]
+                end = ends[idx]
+                if kind == _ATTR_RULE:
+                    start = pos - 2
+                    if start < end:
+                        continue
+                else:
+                    if pos < end:
+                        continue
+                    # Any position of the separators run before the keyword
+                    # gives the same match; "^" needs to start at the keyword
+                    start = pos - 1 if pos - 1 >= end else pos
+
+                head = SYNTAX_RULE_HEADS[idx]
+                if head is not None:
+                    hmatch = head.match(code, start)
+                    if hmatch is None:
+                        continue
+                    head_end = hmatch.end()
+                    if not line_pos <= head_end <= eol:
+                        line_pos = head_end
+                        eol = code.find("\n", head_end)
+                        if eol < 0:
+                            eol = len(code)
+                    failed = failed_heads[idx]
+                    if failed is not None and failed[0] == eol and pos >= failed[1]:
+                        continue
+
+                m = regex.match(code, start)
+                if m is None and head is not None:
+                    failed_heads[idx] = (eol, head_end)
+                if m:
+                    found[idx].append(_findall_item(m))
+                    ends[idx] = m.end()
+                    if SYNTAX_RULES[idx][3]:
+                        py3_score += SYNTAX_RULES[idx][2]
+                    else:
+                        py2_score += SYNTAX_RULES[idx][2]
+                    if _margin_reached(margin, score_diff, py2_score, py3_score):
+                        stopped = True
+                        break
+
+    for idx in SYNTAX_FINDALL_RULES:
+        if stopped:
+            break
+        found[idx] = SYNTAX_RULES[idx][1].findall(code)
+        if SYNTAX_RULES[idx][3]:
+            py3_score += SYNTAX_RULES[idx][2] * len(found[idx])
+        else:
+            py2_score += SYNTAX_RULES[idx][2] * len(found[idx])
+        stopped = _margin_reached(margin, score_diff, py2_score, py3_score)
+
+    for (label, _, _, _, _), m in zip(SYNTAX_RULES, found):
         if m:
-            py2_score += (regtuple[1] * len(m))
-            matches.append(("PY2SYNTAX_"+regtuple[0].pattern, m))
+            matches.append((label, m))
 
     return py2_score, py3_score
 
-def check_modules_regex(code, matches, match_score=100):
+def import_header(code):
+    """
+    Returns the start of the code (without strings and comments) until the
+    first top level statement that is not part of the imports: the docstring,
+    the imports, the "__dunder__" assignments and the try and if blocks around
+    the imports. The indented lines and the ones inside brackets or after a
+    line continuation belong to the statement before them.
+    """
+    depth = 0
+    continued = False
+    pos = 0
+    length = len(code)
+    while pos < length:
+        eol = code.find("\n", pos)
+        if eol < 0:
+            eol = length
+        if depth == 0 and not continued and pos < eol and not code[pos].isspace() \
+                and not HEADER_STATEMENT_REGEXP.match(code, pos):
+            return code[:pos]
+
+        line = code[pos:eol]
+        depth = max(0, depth + line.count("(") + line.count("[") + line.count("{")
+                    - line.count(")") - line.count("]") - line.count("}"))
+        continued = line.rstrip().endswith("\\")
+        pos = eol + 1
+    return code
+
+
+def check_modules_regex(code, matches, match_score=100, margin=None, score_diff=0,
+                        deadline=None, scan='full'):
     """
     Test for modules specific of some Python version.
 
@@ -175,47 +474,181 @@ def check_modules_regex(code, matches, match_score=100):
         matches (List[Tuple[str, str]]): the list of matching rules. It will
             be modified in-place
         match_score: the score given for a match with this test
+        margin (int, optional): stop checking as soon as the difference
+            between the scores exceeds it, see check_syntax_regex
+        score_diff (int): Python 2 minus Python 3 score of the previous checks
+        deadline (Deadline, optional): see check_syntax_regex
+        scan (str): "full" to look for the imports in all the code or "header"
+            to only look in the import_header(), much faster with long modules
+            but missing the imports done later (like inside the functions)
 
     Returns:
         A tuple with the py3_score and the py2_score
     """
     py2_score = py3_score = 0
 
-    m = PY3ONLY_MODULES_REGEXP.findall(code)
-    if m:
-        py3_score += (match_score * len(m))
-        for match in m:
-            matches.append(('PY3MODS', match))
-
-    m = PY2ONLY_MODULES_REGEXP.findall(code)
-    if m:
-        py2_score += (match_score * len(m))
-        for match in m:
-            matches.append(('PY2MODS', match))
+    if scan == 'header':
+        code = import_header(code)
+    elif scan != 'full':
+        raise ValueError('unknown modules scan: %s' % scan)
+    # both regexes are tried at the same statements
+    statements = list(IMPORT_STATEMENTS_REGEXP.finditer(code))
+
+    for regex, label in ((PY3ONLY_MODULES_REGEXP, 'PY3MODS'), (PY2ONLY_MODULES_REGEXP, 'PY2MODS')):
+        for m in _iter_import_matches(code, regex, statements, deadline):
+            matches.append((label, _findall_item(m)))
+            if label == 'PY3MODS':
+                py3_score += match_score
+            else:
+                py2_score += match_score
+            if _margin_reached(margin, score_diff, py2_score, py3_score):
+                return py2_score, py3_score
 
     return py2_score, py3_score
 
 
-def check_modulesymbols_regex(code, matches, symbols_score=100):
+def _iter_import_matches(code, regex, statements=None, deadline=None):
+    """
+    Yields the same matches than regex.finditer(code) for a regex of
+    import_regex_gen, trying it only at the start of the import statements
+    (the matches of IMPORT_STATEMENTS_REGEXP, found if not given).
+
+    The ".*" of "import .*(modules)" tries every position until the end of
+    the line, so finditer is quadratic with many failing imports in a long
+    line. But once it fails, it will fail too for the next imports whose
+    modules start in the same line: they can only try a part of the
+    positions already tried.
     """
-    Test for module symbols specific of some Python version. Please note
-    that this test can be very slow compared with the others since a
-    lot of regular expressions are tested.
+    if statements is None:
+        statements = IMPORT_STATEMENTS_REGEXP.finditer(code)
+
+    end = 0
+    failed_eol = line_pos = eol = -1
+    for statement in statements:
+        if deadline is not None:
+            deadline.check()
+        start, keyword = statement.start(), statement.start(2)
+        if start < end:
+            # The previous match ended in the blank lines before the keyword,
+            # finditer would start at the next line start
+            if keyword < end:
+                continue
+            if end > 0 and code[end - 1] != "\n":
+                newline = code.find("\n", end, keyword)
+                if newline < 0:
+                    continue
+                end = newline + 1
+            start = end
+
+        is_import = statement.group(2) == "import"
+        if is_import:
+            modules = WHITESPACE_REGEXP.match(code, statement.end()).end()
+            if not line_pos <= modules <= eol:
+                line_pos = modules
+                eol = code.find("\n", modules)
+                if eol < 0:
+                    eol = len(code)
+            if eol == failed_eol:
+                continue
+
+        m = regex.match(code, start)
+        if m:
+            end = m.end()
+            yield m
+        elif is_import:
+            failed_eol = eol
+
+
+def check_modulesymbols_regex(code, matches, symbols_score=100, margin=None, score_diff=0,
+                              deadline=None):
+    """
+    Test for module symbols specific of some Python version. A single pass
+    over the code finds the symbols and the rules are only matched around
+    them, giving the same results than running every rule over all the code.
 
     Args:
         code (str): The code
         matches (List[Tuple[str, str]]): the list of matching rules. It will
         be modified in-place
+        margin (int, optional): stop checking the rules as soon as the
+        difference between the scores exceeds it, see check_syntax_regex
+        score_diff (int): Python 2 minus Python 3 score of the previous checks
+        deadline (Deadline, optional): see check_syntax_regex
 
     Returns:
         A tuple with the py3_score and the py2_score
     """
     py2_score = py3_score = 0
-    for symregex in PY3MODULESYMBOLS_REGEXPS:
-        m = symregex.findall(code)
+
+    # rule index -> list of (position, symbol)
+    hits = {}
+    search = PY3MODULESYMBOLS_LITERALS_REGEXP.search
+    match = search(code)
+    while match:
+        pos = match.start()
+        for idx, symbol in PY3MODULESYMBOLS_LITERAL_RULES[match.group()]:
+            hits.setdefault(idx, []).append((pos, symbol))
+        # the symbols can overlap
+        match = search(code, pos + 1)
+
+    from_lines = None
+    for idx, (symregex, modname, symbols) in enumerate(PY3MODULESYMBOLS_RULES):
+        if idx not in hits:
+            continue
+        if deadline is not None:
+            deadline.check()
+
+        if modname is None:
+            m = symregex.findall(code)
+        else:
+            if from_lines is None:
+                from_lines = [fm.start() for fm in FROM_LINE_REGEXP.finditer(code)]
+            m = _match_candidates(code, symregex, modname, symbols, hits[idx], from_lines,
+                                  deadline)
+
         if m:
             matches.append(('PY3SYMS:' + symregex.pattern, m))
             py3_score += (symbols_score * len(m))
+            if _margin_reached(margin, score_diff, py2_score, py3_score):
+                break
 
     # Currently this doesn't test for any py2symbols
     return py2_score, py3_score
+
+
+def _match_candidates(code, symregex, modname, symbols, hits, from_lines, deadline=None):
+    """
+    Returns the same as symregex.findall(code) matching only at the candidate
+    positions of the found symbols.
+    """
+    # (sort key, position, is a usage after separators)
+    candidates = [(pos, pos, False) for pos, _ in hits]
+    if any(symbol == symbols[0] for _, symbol in hits):
+        candidates.extend((pos, pos, False) for pos in from_lines)
+        usage = modname + "."
+        for pos, symbol in hits:
+            start = pos - len(usage)
+            if symbol == symbols[0] and start >= 0 and code.startswith(usage, start):
+                candidates.append((start - 1, start, True))
+    candidates.sort()
+
+    found = []
+    end = 0
+    for _, pos, after_separators in candidates:
+        if pos < end:
+            continue
+        if deadline is not None:
+            deadline.check()
+        if after_separators:
+            # Any position of the separators run before the module gives the
+            # same match; "^" needs to start at the module
+            start = pos - 1 if pos - 1 >= end else pos
+        else:
+            start = pos
+
+        m = symregex.match(code, start)
+        if m:
+            found.append(_findall_item(m))
+            end = m.end()
+
+    return found
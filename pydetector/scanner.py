@@ -0,0 +1,298 @@
+"""
+Lazy discovery of the Python files of directory trees, so the detection can
+start with the first file found instead of a (possibly huge) list of paths.
+
+The directories are walked with os.scandir, skipping the version control,
+vendored, virtualenv and __pycache__ trees and the paths excluded by the
+.gitignore files found (and by extra patterns with the same syntax).
+"""
+
+import os
+import re
+
+try:
+    from os import scandir
+except ImportError:  # Python 2
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+__all__ = ['scan', 'is_python_file', 'IgnoreRules', 'DEFAULT_SKIP_DIRS', 'PYTHON_EXTENSIONS']
+
+# Directory names never walked: version control, caches, vendored code and
+# the usual places of the installed packages
+DEFAULT_SKIP_DIRS = frozenset([
+    '.git', '.hg', '.svn', '.bzr', '__pycache__', '.tox', '.nox', '.eggs',
+    '.mypy_cache', '.pytest_cache', 'node_modules', 'vendor', 'vendored', '_vendor',
+    'third_party', 'site-packages', 'dist-packages',
+])
+
+PYTHON_EXTENSIONS = ('.py', '.pyw')
+
+# Files that mark a directory as a virtualenv
+VIRTUALENV_MARKERS = ('pyvenv.cfg', os.path.join('bin', 'activate_this.py'))
+
+SHEBANG_REGEX = re.compile(br'^#![^\n]*\bpython[0-9.]*\b')
+SHEBANG_SIZE = 128
+
+
+def scan(paths, excludes=(), gitignore=True, skip_dirs=DEFAULT_SKIP_DIRS,
+         follow_symlinks=False):
+    """
+    Generator of the Python files found in the paths. The files given are
+    yielded as they are and the directories walked recursively, yielding
+    every Python file as soon as it's found: the files of a directory (in
+    name order) and then the ones of its subdirectories.
+
+    Args:
+        paths (Iterable[str]): files and directories.
+
+        excludes (Iterable[str]): .gitignore style patterns of the paths to
+            skip, relative to every directory given.
+
+        gitignore (bool): also skip the paths ignored by the .gitignore files
+            of the walked directories.
+
+        skip_dirs (Iterable[str]): names of the directories not walked. The
+            virtualenvs are always skipped.
+
+        follow_symlinks (bool): walk the symbolic links to directories. Every
+            directory is only walked once, so the links to an ancestor don't
+            loop.
+    """
+    excludes = list(excludes)
+    skip_dirs = frozenset(skip_dirs)
+    for path in paths:
+        if os.path.isdir(path):
+            rules = [IgnoreRules(excludes, '')] if excludes else []
+            for filename in _walk(path, rules, gitignore, skip_dirs, follow_symlinks):
+                yield filename
+        else:
+            yield path
+
+
+def _walk(root, rules, gitignore, skip_dirs, follow_symlinks):
+    # Depth first with a stack of (directory, path relative to root, rules)
+    stack = [(root, '', rules)]
+    # (st_dev, st_ino) of the directories found, only needed with the
+    # symlinks followed: without them a tree can't reach a directory twice
+    if follow_symlinks:
+        root_stat = os.stat(root)
+        visited = set([(root_stat.st_dev, root_stat.st_ino)])
+    while stack:
+        directory, relative, rules = stack.pop()
+        if gitignore:
+            ignore_file = os.path.join(directory, '.gitignore')
+            if os.path.isfile(ignore_file):
+                rules = rules + [IgnoreRules.from_file(ignore_file, relative)]
+
+        subdirs = []
+        for entry in sorted(_scandir(directory), key=lambda entry: entry.name):
+            entry_relative = relative + entry.name
+            is_dir = entry.is_dir() and (follow_symlinks or not entry.is_symlink())
+            if rules and _ignored(rules, entry_relative, is_dir):
+                continue
+
+            if is_dir:
+                if entry.name in skip_dirs or _is_virtualenv(entry.path):
+                    continue
+                if follow_symlinks:
+                    entry_stat = entry.stat()
+                    key = (entry_stat.st_dev, entry_stat.st_ino)
+                    if key in visited:
+                        continue
+                    visited.add(key)
+                subdirs.append((entry.path, entry_relative + '/', rules))
+            elif entry.is_file() and is_python_file(entry.path):
+                yield entry.path
+
+        # reversed so they are popped in name order
+        stack.extend(reversed(subdirs))
+
+
+def _ignored(rules, relative, is_dir):
+    # The last matching pattern decides, the deepest .gitignore files come last
+    ignored = False
+    for each in rules:
+        result = each.match(relative, is_dir)
+        if result is not None:
+            ignored = result
+    return ignored
+
+
+def _is_virtualenv(path):
+    return any(os.path.exists(os.path.join(path, marker)) for marker in VIRTUALENV_MARKERS)
+
+
+def is_python_file(path):
+    """
+    True if the file has a Python extension or, without extension, starts
+    with a Python shebang (like "#!/usr/bin/env python").
+    """
+    name = os.path.basename(path)
+    if name.endswith(PYTHON_EXTENSIONS):
+        return True
+    if '.' in name.lstrip('.'):
+        return False
+
+    try:
+        with open(path, 'rb') as infile:
+            return SHEBANG_REGEX.match(infile.read(SHEBANG_SIZE)) is not None
+    except (IOError, OSError):
+        return False
+
+
+class IgnoreRules(object):
+    """
+    Patterns with the .gitignore syntax: "#" comments, "!" to include again
+    what a previous pattern excluded, a trailing "/" to only match
+    directories, the patterns with a "/" are relative to the directory of
+    the rules (the others match the name at any level) and the wildcards
+    "*", "?", "[...]" and "**".
+    """
+
+    def __init__(self, patterns, base=''):
+        """
+        Args:
+            patterns (Iterable[str]): the lines of the patterns.
+
+            base (str): path of the directory of the rules relative to the
+                scanned one, with "/" as separator and ending with it (empty
+                for the scanned one).
+        """
+        self.base = base
+        # list of (regex, negated, only directories)
+        self.rules = []
+        for line in patterns:
+            rule = _compile_pattern(line)
+            if rule is not None:
+                self.rules.append(rule)
+
+    @classmethod
+    def from_file(cls, filename, base=''):
+        with open(filename, 'rb') as infile:
+            lines = infile.read().decode('utf-8', 'replace').splitlines()
+        return cls(lines, base)
+
+    def match(self, relative, is_dir):
+        """
+        Returns True if the path (relative to the scanned directory, with "/"
+        as separator) is excluded, False if it's included again by a negated
+        pattern and None if no pattern matches it.
+        """
+        if not relative.startswith(self.base):
+            return None
+        relative = relative[len(self.base):]
+
+        result = None
+        for regex, negated, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative):
+                result = not negated
+        return result
+
+
+def _compile_pattern(line):
+    """ Returns the (regex, negated, dir_only) tuple of a pattern line or None """
+    line = line.rstrip('\n\r')
+    # trailing spaces are ignored unless escaped
+    stripped = line.rstrip(' ')
+    if stripped.endswith('\\') and len(stripped) < len(line):
+        stripped += ' '
+    line = stripped
+    if not line or line.startswith('#'):
+        return None
+
+    negated = line.startswith('!')
+    if negated:
+        line = line[1:]
+    elif line.startswith('\\#') or line.startswith('\\!'):
+        line = line[1:]
+
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+
+    anchored = '/' in line
+    line = line.lstrip('/')
+
+    regex = ''
+    pos = 0
+    size = len(line)
+    while pos < size:
+        char = line[pos]
+        if line.startswith('**', pos):
+            at_start = pos == 0
+            at_end = pos + 2 == size
+            if (at_start or line[pos - 1] == '/') and (at_end or line[pos + 2] == '/'):
+                if at_end:
+                    regex += '.*'
+                    pos += 2
+                else:
+                    # "**/": zero or more directories
+                    regex += '(?:.*/)?'
+                    pos += 3
+                continue
+            regex += '[^/]*'
+            pos += 2
+        elif char == '*':
+            regex += '[^/]*'
+            pos += 1
+        elif char == '?':
+            regex += '[^/]'
+            pos += 1
+        elif char == '[':
+            end = line.find(']', pos + 2 if line[pos + 1:pos + 2] in ('!', '^', ']') else pos + 1)
+            if end < 0:
+                regex += re.escape(char)
+                pos += 1
+                continue
+            body = line[pos + 1:end]
+            if body[:1] in ('!', '^'):
+                body = '^' + body[1:]
+            regex += '[%s]' % body.replace('\\', '\\\\')
+            pos = end + 1
+        elif char == '\\' and pos + 1 < size:
+            regex += re.escape(line[pos + 1])
+            pos += 2
+        else:
+            regex += re.escape(char)
+            pos += 1
+
+    if not anchored:
+        # the name at any level
+        regex = '(?:.*/)?' + regex
+    return re.compile(regex + r'\Z', re.DOTALL), negated, dir_only
+
+
+class _DirEntry(object):
+    """ The subset of os.DirEntry used by the scanner, without os.scandir """
+
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+    def is_file(self):
+        return os.path.isfile(self.path)
+
+    def is_symlink(self):
+        return os.path.islink(self.path)
+
+    def stat(self):
+        return os.stat(self.path)
+
+
+def _scandir(directory):
+    try:
+        if scandir is not None:
+            return list(scandir(directory))
+        return [_DirEntry(directory, name) for name in os.listdir(directory)]
+    except OSError:
+        # unreadable or removed while walking
+        return []
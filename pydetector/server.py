@@ -0,0 +1,416 @@
+"""
+Long running detection server ("pydetector serve"). It keeps warm everything a
+single run has to start: the interpreter with the compiled regex rules, the
+pool of interpreters of the other Python version and the result cache.
+
+The requests and responses are JSON objects, one per line (UTF-8), read from
+the standard input and written to the standard output or, with a Unix domain
+socket, exchanged over every connection accepted. A request gives the "path"
+of a file or its "content" (with an optional "filename" to report), the
+"options" of detect() for the checks (ast_checks, modules_checks,
+modsyms_checks, stop_on_ok_ast, modules_score, symbols_score, build_ast,
+py2_parser, early_exit_margin, modules_scan) and an "id":
+
+    {"id": 1, "path": "/src/a.py", "options": {"build_ast": false}}
+    {"id": 2, "content": "print 'hello'\\n", "filename": "a.py"}
+
+The response has the same "id", the "filename" and the "result", like the
+values of detect(), or an "error" with the reason if the request is invalid:
+
+    {"id": 1, "filename": "/src/a.py", "result": {"version": 3, ...}}
+
+The requests can be pipelined: they are checked concurrently as they are read
+and every response is written as soon as it's ready, so they can come out of
+order. Once the concurrency limit is reached and as many requests are queued,
+the server stops reading until a request finishes.
+
+The server stops gracefully at the end of the input (stdin mode), with a
+SIGTERM or SIGINT or with the request {"id": 3, "command": "shutdown"}: it stops
+reading and accepting connections, answers the requests already read (the
+shutdown request last, with "result": "shutdown") and stops the workers.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+import threading
+from traceback import format_exc
+
+from six.moves import queue
+
+from pydetector.ast_checks import other_python_pool
+from pydetector.ast_pool import WIRE_FORMATS
+from pydetector.cache import ResultCache, DEFAULT_CACHE_SIZE
+from pydetector.detector import check_options, detect_file
+
+__all__ = ['DetectionServer', 'ProtocolError', 'ServerShutdown', 'main']
+
+CODE_FILENAME = '<code_string>'
+# Options of the server, not of every request
+SERVER_OPTIONS = ('verbosity',)
+# Options of detect() the server can't honor, with the reason
+UNSUPPORTED_OPTIONS = {
+    # the watchdog can only interrupt a match in the main thread: in the threads
+    # of the requests a slow file would keep its slot and delay the shutdown
+    'regex_timeout': "the server can't interrupt the regex checks of its threads",
+}
+
+# Seconds between the checks of the shutdown flag while accepting connections
+_ACCEPT_INTERVAL = 0.5
+
+
+class ProtocolError(Exception):
+    """ An invalid request, answered with an error response """
+
+    def __init__(self, message, request_id=None):
+        super(ProtocolError, self).__init__(message)
+        self.request_id = request_id
+
+
+class ServerShutdown(Exception):
+    """ Raised by the signal handlers to stop the server """
+
+
+def parse_request(line):
+    """
+    Returns the request dictionary of a line (bytes) or raises ProtocolError
+    if it's not valid.
+    """
+    try:
+        request = json.loads(line.decode('utf-8'))
+    except ValueError as exc:
+        raise ProtocolError('invalid JSON: %s' % exc)
+    if not isinstance(request, dict):
+        raise ProtocolError('the request must be a JSON object')
+
+    request_id = request.get('id')
+    if 'command' in request:
+        if request['command'] != 'shutdown':
+            raise ProtocolError('unknown command: %s' % request['command'], request_id)
+        return request
+
+    if ('path' in request) == ('content' in request):
+        raise ProtocolError('the request needs either a "path" or a "content"', request_id)
+    options = request.get('options', {})
+    if not isinstance(options, dict):
+        raise ProtocolError('the "options" must be a JSON object', request_id)
+    for name in SERVER_OPTIONS:
+        if name in options:
+            raise ProtocolError('%s is an option of the server' % name, request_id)
+    for name, reason in sorted(UNSUPPORTED_OPTIONS.items()):
+        if name in options:
+            raise ProtocolError('%s is not supported: %s' % (name, reason), request_id)
+    return request
+
+
+class DetectionServer(object):
+    """
+    Args:
+        concurrency (int): maximum number of requests checked at the same time,
+        every one in a thread. The same number of requests can be waiting.
+
+        ast_workers (int, optional): size of the pool of interpreters of the
+        other Python version, by default the concurrency.
+
+        ast_timeout, ast_wire_format, cache_dir, cache_size, verbosity: see
+        detect().
+    """
+
+    def __init__(self, concurrency=4, ast_workers=None, ast_timeout=60,
+                 ast_wire_format='binary', cache_dir=None, cache_size=DEFAULT_CACHE_SIZE,
+                 verbosity=0):
+        if concurrency < 1:
+            raise ValueError('the concurrency must be at least 1')
+
+        self.concurrency = concurrency
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self.verbosity = verbosity
+        self.served = 0
+
+        # the interpreters are started with the first requests that need them
+        self._pool = other_python_pool(size=ast_workers or concurrency, timeout=ast_timeout,
+                                       verbosity=verbosity, wire_format=ast_wire_format)
+        self._requests = queue.Queue(maxsize=concurrency)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+        for _ in range(concurrency):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _work(self):
+        # every thread has its own cache since the connections to the
+        # database can't be shared
+        cache = None
+        if self.cache_dir is not None:
+            cache = ResultCache(self.cache_dir, max_size=self.cache_size)
+        try:
+            while True:
+                task = self._requests.get()
+                if task is None:
+                    break
+                request, stream = task
+                try:
+                    try:
+                        response = self.check(request, cache)
+                    except Exception:
+                        response = {'id': request.get('id'), 'error': format_exc()}
+                    stream.reply(response)
+                finally:
+                    stream.done()
+        finally:
+            if cache is not None:
+                cache.close()
+
+    def check(self, request, cache=None):
+        """ Returns the response to a (parsed) detection request """
+        request_id = request.get('id')
+        try:
+            options = check_options(verbosity=self.verbosity, **request.get('options', {}))
+        except TypeError as exc:
+            return {'id': request_id, 'error': 'invalid options: %s' % exc}
+
+        if 'content' in request:
+            filename = request.get('filename', CODE_FILENAME)
+            result = detect_file(CODE_FILENAME, codestr=request['content'], options=options,
+                                 pool=self._pool, cache=cache)
+        else:
+            filename = request['path']
+            result = detect_file(filename, options=options, pool=self._pool, cache=cache)
+
+        with self._lock:
+            self.served += 1
+        return {'id': request_id, 'filename': filename, 'result': result}
+
+    @property
+    def stopping(self):
+        return self._stopping.is_set()
+
+    def shutdown(self):
+        """ Stops reading new requests and accepting connections """
+        self._stopping.set()
+
+    def serve_stream(self, infile, outfile):
+        """
+        Answers the requests read from infile, a binary file with a request
+        per line, writing the responses to outfile until the end of the input,
+        a shutdown request or shutdown(). It returns when all of them are
+        answered.
+        """
+        stream = _Stream(outfile)
+        shutdown_id = None
+        try:
+            for line in iter(infile.readline, b''):
+                if self.stopping:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = parse_request(line)
+                except ProtocolError as exc:
+                    stream.reply({'id': exc.request_id, 'error': str(exc)})
+                    continue
+
+                if 'command' in request:
+                    shutdown_id = request.get('id')
+                    self.shutdown()
+                    break
+                stream.add()
+                self._requests.put((request, stream))
+        finally:
+            stream.wait()
+        if self.stopping:
+            stream.reply({'id': shutdown_id, 'result': 'shutdown'})
+
+    def serve_unix(self, path):
+        """
+        Accepts connections on a Unix domain socket at path, serving the
+        requests of every one with serve_stream() in its own thread, until a
+        shutdown request or shutdown(). A stale socket file at path is
+        replaced and the file is removed at the end.
+        """
+        try:
+            if stat.S_ISSOCK(os.stat(path).st_mode):
+                os.unlink(path)
+        except OSError:
+            pass
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(socket.SOMAXCONN)
+        listener.settimeout(_ACCEPT_INTERVAL)
+        connections = {}
+        try:
+            while not self.stopping:
+                try:
+                    conn = listener.accept()[0]
+                except socket.timeout:
+                    continue
+                conn.settimeout(None)
+                thread = threading.Thread(target=self._serve_connection,
+                                          args=(conn, connections))
+                thread.daemon = True
+                with self._lock:
+                    connections[conn] = thread
+                thread.start()
+        finally:
+            listener.close()
+            os.unlink(path)
+            self.shutdown()
+            # the connections get the end of their input, answer the
+            # requests already read and are closed
+            with self._lock:
+                pending = list(connections.items())
+            for conn, thread in pending:
+                try:
+                    conn.shutdown(socket.SHUT_RD)
+                except (OSError, socket.error):
+                    pass
+            for conn, thread in pending:
+                thread.join()
+
+    def _serve_connection(self, conn, connections):
+        infile = conn.makefile('rb')
+        outfile = conn.makefile('wb')
+        try:
+            self.serve_stream(infile, outfile)
+        except Exception:
+            if self.verbosity:
+                print('Error serving a connection:\n%s' % format_exc(), file=sys.stderr)
+        finally:
+            for action in (infile.close, outfile.close, conn.close):
+                try:
+                    action()
+                except (OSError, IOError, socket.error):
+                    pass
+            with self._lock:
+                connections.pop(conn, None)
+
+    def close(self):
+        """ Answers the requests queued and stops the threads and the interpreters """
+        self.shutdown()
+        for _ in self._threads:
+            self._requests.put(None)
+        for thread in self._threads:
+            thread.join()
+        del self._threads[:]
+        self._pool.close()
+
+
+class _Stream(object):
+    """ Writer of the responses of a connection, counting the pending ones """
+
+    def __init__(self, outfile):
+        self.outfile = outfile
+        self.pending = 0
+        self._cond = threading.Condition()
+
+    def reply(self, response):
+        data = (json.dumps(response, default=repr) + '\n').encode('utf-8')
+        with self._cond:
+            try:
+                self.outfile.write(data)
+                self.outfile.flush()
+            except (IOError, OSError, socket.error):
+                # the client went away, the rest of its responses are dropped
+                pass
+
+    def add(self):
+        with self._cond:
+            self.pending += 1
+
+    def done(self):
+        with self._cond:
+            self.pending -= 1
+            self._cond.notify_all()
+
+    def wait(self):
+        with self._cond:
+            while self.pending:
+                self._cond.wait()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+            prog='pydetector serve',
+            description='Detection server answering JSON requests, one per line, read '
+                        'from the standard input or a Unix domain socket')
+
+    parser.add_argument("--socket", metavar="PATH", default=None,
+            help="Listen on a Unix domain socket instead of the standard input and output")
+
+    parser.add_argument("-k", "--concurrency", type=int, default=4,
+            help="Maximum number of requests checked at the same time (default=4)")
+
+    parser.add_argument("-w", "--astworkers", type=int, default=None,
+            help="Number of warm interpreters of the other Python version "
+                 "(default=the concurrency)")
+
+    parser.add_argument("-t", "--asttimeout", type=float, default=60,
+            help="Seconds to wait for the other Python interpreter (default=60)")
+
+    parser.add_argument("--astwire", choices=WIRE_FORMATS, default="binary",
+            help="Encoding of the ASTs sent by the other Python interpreter "
+                 "(default=binary)")
+
+    parser.add_argument("-c", "--cachedir", default=None,
+            help="Directory of the persistent cache of results (default=disabled)")
+
+    parser.add_argument("--cachesize", type=int, default=512,
+            help="Maximum size of the cache in MB (default=512)")
+
+    parser.add_argument("-v", "--verbosity", type=int, default=0,
+            help="Verbosity of the messages written to the standard error (0 to 2)")
+
+    return parser.parse_args(argv)
+
+
+def _terminate(signum, frame):
+    raise ServerShutdown()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # the messages printed while checking must not mix with the responses
+    outfile = getattr(sys.stdout, 'buffer', sys.stdout)
+    sys.stdout = sys.stderr
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, _terminate)
+
+    server = DetectionServer(concurrency=args.concurrency, ast_workers=args.astworkers,
+                             ast_timeout=args.asttimeout, ast_wire_format=args.astwire,
+                             cache_dir=args.cachedir, cache_size=args.cachesize * 1024 * 1024,
+                             verbosity=args.verbosity)
+    try:
+        if args.socket is not None:
+            server.serve_unix(args.socket)
+        else:
+            server.serve_stream(getattr(sys.stdin, 'buffer', sys.stdin), outfile)
+    except ServerShutdown:
+        pass
+    finally:
+        # a second signal while stopping kills the server
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, signal.SIG_DFL)
+        server.close()
+        if args.verbosity:
+            print('Served %d requests' % server.served, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
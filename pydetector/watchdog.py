@@ -0,0 +1,72 @@
+"""
+Time budget of the regex checks of a file. The checks compare the clock with
+the deadline between their matches and, when it's possible (in the main thread
+of a Unix process with no other timer running), a SIGALRM also interrupts a
+single match running past it, since the re module checks the signals while
+matching.
+"""
+
+import signal
+import time
+from contextlib import contextmanager
+
+__all__ = ['RegexTimeout', 'Deadline', 'deadline']
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class RegexTimeout(Exception):
+    """ The regex checks of a file exceeded their time budget """
+
+
+class Deadline(object):
+    """ The end of the time budget, checked with check() """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = _clock() + seconds
+
+    def check(self):
+        if _clock() > self.expires:
+            raise RegexTimeout('the regex checks exceeded %g seconds' % self.seconds)
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Context manager giving the Deadline of a block that must run in the
+    seconds given (None if seconds is None, without a time budget). The
+    block is interrupted with RegexTimeout if it's still running then and
+    the alarm could be set.
+    """
+    if seconds is None:
+        yield None
+        return
+
+    limit = Deadline(seconds)
+
+    def expired(signum, frame):
+        raise RegexTimeout('the regex checks exceeded %g seconds' % seconds)
+
+    armed = False
+    if hasattr(signal, 'setitimer') and signal.getitimer(signal.ITIMER_REAL)[0] == 0:
+        try:
+            previous = signal.signal(signal.SIGALRM, expired)
+            armed = True
+        except ValueError:
+            # only the main thread can handle the signals
+            pass
+
+    if not armed:
+        yield limit
+        return
+
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield limit
+    finally:
+        try:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        finally:
+            # None if it wasn't set from Python
+            signal.signal(signal.SIGALRM, previous if previous is not None else signal.SIG_DFL)
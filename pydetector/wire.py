@@ -0,0 +1,265 @@
+"""
+Compact tagged binary encoding used to send the AST dictionaries from the
+"other" Python interpreter to the current one. It's much cheaper to produce and
+parse than the repr()/ast.literal_eval round trip and gives the same values
+under Python 2 and 3.
+
+Every value is a one byte tag followed by its data:
+
+    N, T, F, E      None, True, False, Ellipsis
+    i               signed 64 bits int
+    I               bigger ints, as a 4 bytes length and the decimal digits
+    f, c            double; complex as two doubles
+    s, b            text (UTF-8) and bytes, as a 4 bytes length and the data
+    S, R            interned text: first occurrence (like "s") and reference
+                    (4 bytes index) to a previous occurrence
+    l, t, d         list, tuple and dict, as a 4 bytes item count followed by
+                    the items (or key, value pairs for dicts)
+
+All the numbers are big-endian. The payload starts with the format version.
+
+This module must remain compatible with both Python 2 and 3 since the encoder
+runs under the other interpreter.
+"""
+
+import struct
+import sys
+
+__all__ = ['dumps', 'load', 'loads', 'WireError', 'FORMAT_VERSION']
+
+FORMAT_VERSION = b'\x01'
+
+PY3 = sys.version_info[0] == 3
+if PY3:
+    text_type = str
+    binary_type = bytes
+    integer_types = (int,)
+else:
+    text_type = unicode  # noqa: F821
+    binary_type = str
+    integer_types = (int, long)  # noqa: F821
+
+# Types sent as text. Under Python 2 the str values (identifiers and
+# non-unicode literals) are bytes, decoded as latin-1.
+_TEXT_TYPES = (text_type,) if PY3 else (text_type, binary_type)
+
+# Strings longer than this are not interned
+INTERN_MAX_LEN = 64
+
+_U32 = struct.Struct('>I')
+_I64 = struct.Struct('>q')
+_F64 = struct.Struct('>d')
+_C128 = struct.Struct('>dd')
+_I64_MIN = -(1 << 63)
+_I64_MAX = (1 << 63) - 1
+
+
+class WireError(Exception):
+    pass
+
+
+def _text(value):
+    # Python 2 str values are the bytes of the source: every byte is sent as
+    # the character with its code, like their repr() decoded by the other
+    # version, so the result doesn't depend on the wire format
+    if isinstance(value, text_type):
+        return value
+    return value.decode('latin-1')
+
+
+def dumps(obj):
+    """ Returns the encoded form of obj as bytes """
+    out = [FORMAT_VERSION]
+    append = out.append
+    interned = {}
+    text_tuples = {}
+    pack_u32 = _U32.pack
+    pack_i64 = _I64.pack
+
+    def encode_text(value):
+        data = _text(value)
+        if len(data) <= INTERN_MAX_LEN:
+            interned[value] = len(interned)
+            tag = b'S'
+        else:
+            tag = b's'
+        data = data.encode('utf-8')
+        return tag + pack_u32(len(data)) + data
+
+    # Explicit stack so deeply nested trees don't hit the recursion limit
+    stack = [obj]
+    pop = stack.pop
+    extend = stack.extend
+
+    while stack:
+        value = pop()
+        vtype = type(value)
+
+        # Most common types of the AST dictionaries first
+        if vtype in _TEXT_TYPES:
+            idx = interned.get(value)
+            append(b'R' + pack_u32(idx) if idx is not None else encode_text(value))
+        elif vtype is dict:
+            append(b'd' + pack_u32(len(value)))
+            items = [item for pair in value.items() for item in pair]
+            items.reverse()
+            extend(items)
+        elif value is None:
+            append(b'N')
+        elif vtype is bool:
+            append(b'T' if value else b'F')
+        elif vtype in integer_types:
+            if _I64_MIN <= value <= _I64_MAX:
+                append(b'i' + pack_i64(value))
+            else:
+                digits = str(value).rstrip('L').encode('ascii')
+                append(b'I' + pack_u32(len(digits)) + digits)
+        elif vtype is tuple:
+            # Tuples are the _fields and _attributes of the nodes: encode
+            # each of them only once
+            data = text_tuples.get(value)
+            if data is None:
+                append(b't' + pack_u32(len(value)))
+                if all(type(item) in _TEXT_TYPES for item in value):
+                    for item in value:
+                        idx = interned.get(item)
+                        append(b'R' + pack_u32(idx) if idx is not None else encode_text(item))
+                    # Following occurrences only need references
+                    if all(item in interned for item in value):
+                        text_tuples[value] = b't' + pack_u32(len(value)) + b''.join(
+                            b'R' + pack_u32(interned[item]) for item in value)
+                else:
+                    extend(reversed(value))
+                continue
+            append(data)
+        elif vtype is list:
+            append(b'l' + pack_u32(len(value)))
+            extend(reversed(value))
+        elif vtype is float:
+            append(b'f' + _F64.pack(value))
+        elif vtype is complex:
+            append(b'c' + _C128.pack(value.real, value.imag))
+        elif vtype is binary_type:
+            append(b'b' + pack_u32(len(value)) + value)
+        elif value is Ellipsis:
+            append(b'E')
+        else:
+            raise WireError('cannot encode values of type %s' % vtype.__name__)
+
+    return b''.join(out)
+
+
+class _Reader(object):
+    """ Buffer over a function returning the next chunk of the payload """
+
+    def __init__(self, read_chunk):
+        self.read_chunk = read_chunk
+        self.buf = b''
+        self.pos = 0
+
+    def need(self, size):
+        if len(self.buf) - self.pos >= size:
+            return
+
+        chunks = [self.buf[self.pos:]]
+        available = len(chunks[0])
+        while available < size:
+            chunk = self.read_chunk()
+            if not chunk:
+                raise WireError('truncated payload')
+            chunks.append(chunk)
+            available += len(chunk)
+        self.buf = b''.join(chunks)
+        self.pos = 0
+
+    def take(self, size):
+        self.need(size)
+        start = self.pos
+        self.pos += size
+        return self.buf[start:self.pos]
+
+
+def load(read_chunk):
+    """
+    Decodes a value reading its payload incrementally: read_chunk is a
+    function that returns the next chunk of bytes (empty at the end).
+    """
+    reader = _Reader(read_chunk)
+    need = reader.need
+    take = reader.take
+
+    if take(1) != FORMAT_VERSION:
+        raise WireError('unsupported wire format version')
+
+    interned = []
+    # Stack of [container, remaining items, tag, pending dict key]
+    stack = []
+
+    while True:
+        need(1)
+        tag = reader.buf[reader.pos:reader.pos + 1]
+        reader.pos += 1
+
+        if tag == b'R':
+            value = interned[_U32.unpack(take(4))[0]]
+        elif tag == b'S' or tag == b's':
+            value = take(_U32.unpack(take(4))[0]).decode('utf-8')
+            if tag == b'S':
+                interned.append(value)
+        elif tag == b'i':
+            value = _I64.unpack(take(8))[0]
+        elif tag == b'N':
+            value = None
+        elif tag == b'T':
+            value = True
+        elif tag == b'F':
+            value = False
+        elif tag == b'd' or tag == b'l' or tag == b't':
+            count = _U32.unpack(take(4))[0]
+            value = {} if tag == b'd' else []
+            if count:
+                stack.append([value, count, tag, None])
+                continue
+            if tag == b't':
+                value = ()
+        elif tag == b'f':
+            value = _F64.unpack(take(8))[0]
+        elif tag == b'c':
+            value = complex(*_C128.unpack(take(16)))
+        elif tag == b'b':
+            value = take(_U32.unpack(take(4))[0])
+        elif tag == b'I':
+            value = int(take(_U32.unpack(take(4))[0]))
+        elif tag == b'E':
+            value = Ellipsis
+        else:
+            raise WireError('unknown tag %r' % tag)
+
+        # Store the value into its parent, closing the finished containers
+        while True:
+            if not stack:
+                return value
+
+            frame = stack[-1]
+            parent = frame[0]
+            if frame[2] == b'd':
+                if frame[3] is None:
+                    frame[3] = (value,)
+                    break
+                parent[frame[3][0]] = value
+                frame[3] = None
+            else:
+                parent.append(value)
+
+            frame[1] -= 1
+            if frame[1]:
+                break
+
+            stack.pop()
+            value = tuple(parent) if frame[2] == b't' else parent
+
+
+def loads(data):
+    """ Decodes a value from the bytes data """
+    chunks = [data]
+    return load(lambda: chunks.pop() if chunks else b'')
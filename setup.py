@@ -25,6 +25,7 @@ setup(
     author = "Juanjo Alvarez",
     author_email = "juanjo@juanjoalvarez.net",
     packages = find_packages(exclude=["tests"]),
+    package_data = {"pydetector.py2parser": ["Grammar.txt"]},
     entry_points = {
         "console_scripts": [
             "pydetector = pydetector.cli:main"
@@ -1,7 +1,8 @@
 import unittest
 import _ast
 from textwrap import dedent
-from pydetector.ast_checks import check_ast
+from pydetector.ast_checks import check_ast, other_python_pool
+from pydetector.ast_pool import WorkerError
 
 PYVERIDX = 0
 PY2AST   = 1
@@ -112,5 +113,97 @@ class Test20Positions(unittest.TestCase):
         self.assertEqual(ast["body"][1]["value"]["values"][2]["lineno"], 2)
 
 
+class Test30Pool(unittest.TestCase):
+    def setUp(self):
+        self.pool = other_python_pool(size=2, timeout=30)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_pool_same_result(self):
+        for code in ("print 'hello old world'", "pass", "Fail like a boss",
+                     "print('new', end='')"):
+            res_pool = check_ast(code, try_other_on_sucess=True, pool=self.pool)
+            res_proc = check_ast(code, try_other_on_sucess=True)
+            self.assertEqual(res_pool[PYVERIDX], res_proc[PYVERIDX])
+            self.assertEqual(res_pool[PY2AST], res_proc[PY2AST])
+            self.assertEqual(res_pool[PY3AST], res_proc[PY3AST])
+
+        # all the sources were sent to the same warm worker
+        self.assertEqual(self.pool.spawned, 1)
+
+    def test_pool_wire_formats(self):
+        # the non-ASCII byte string literal is UTF-8 in the source
+        code = u"import sys\nprint >>sys.stderr, 'old', 10L, 1.5j, u'\\xe9', '\ufeff\xe9'"
+        with other_python_pool(wire_format='repr') as repr_pool:
+            res_repr = check_ast(code, pool=repr_pool)
+        res_binary = check_ast(code, pool=self.pool)
+        self.assertEqual(res_binary[PYVERIDX], 2)
+        self.assertEqual(res_binary[PY2AST], res_repr[PY2AST])
+        values = res_binary[PY2AST]['body'][1]['values']
+        self.assertEqual(values[-1]['s'], u'\xef\xbb\xbf\xc3\xa9')
+
+    def test_pool_restart_crashed(self):
+        code = "print 'hello old world'"
+        self.assertEqual(check_ast(code, pool=self.pool)[PYVERIDX], 2)
+
+        for worker in list(self.pool._workers):
+            worker.proc.kill()
+            worker.proc.wait()
+
+        self.assertEqual(check_ast(code, pool=self.pool)[PYVERIDX], 2)
+        self.assertEqual(self.pool.restarts, 1)
+
+    def test_pool_failure_not_syntax_error(self):
+        # valid in both versions, a hung worker must not make it Python 3 only
+        code = "x = [%s]\n" % ("1, " * 50000)
+        with other_python_pool(timeout=0.01) as pool:
+            self.assertRaises(WorkerError, check_ast, code, try_other_on_sucess=True,
+                              pool=pool)
+
+
+class Test40ParseOnly(unittest.TestCase):
+    CODES = ("print 'hello old world'", "pass", "Fail like a boss",
+             "print('new', end='')", "def f():\n    nonlocal x\n")
+
+    def test_parse_only_same_version(self):
+        with other_python_pool() as pool:
+            for code in self.CODES:
+                expected = check_ast(code, try_other_on_sucess=True)[PYVERIDX]
+                for other_pool in (pool, None):
+                    res = check_ast(code, try_other_on_sucess=True, pool=other_pool,
+                                    build_ast=False)
+                    self.assertEqual(res[PYVERIDX], expected)
+                    self.assertEqual(res[PY2AST], None)
+                    self.assertEqual(res[PY3AST], None)
+
+    def test_parse_only_error_location(self):
+        with other_python_pool() as pool:
+            res = check_ast("x = 1\nprint 'old'", pool=pool, build_ast=False)
+        self.assertEqual(res[PYVERIDX], 2)
+        self.assertEqual(len(res[PY2ERR]), 0)
+        self.assertIn('SyntaxError', res[PY3ERR])
+        self.assertIn('line 2', res[PY3ERR])
+
+    def test_process_same_error(self):
+        code = "x = 1\nFail like a boss"
+        with other_python_pool() as pool:
+            for build_ast in (False, True):
+                res_pool = check_ast(code, try_other_on_sucess=True, pool=pool,
+                                     build_ast=build_ast)
+                res_proc = check_ast(code, try_other_on_sucess=True, build_ast=build_ast)
+                self.assertEqual(res_pool[PYVERIDX], 0)
+                self.assertEqual(res_proc[PYVERIDX], 0)
+                for errors in (res_pool[PY2ERR], res_proc[PY2ERR]):
+                    self.assertIsInstance(errors, type(u''))
+                if build_ast:
+                    # tracebacks, from different frames
+                    self.assertEqual(res_proc[PY2ERR].splitlines()[-1],
+                                     res_pool[PY2ERR].splitlines()[-1])
+                else:
+                    self.assertEqual(res_proc[PY2ERR], res_pool[PY2ERR])
+                    self.assertIn('line 2', res_proc[PY2ERR])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,147 @@
+import ast
+import io
+import json
+import sys
+import unittest
+from textwrap import dedent
+from pydetector.ast2dict import ast2dict, ast2compact, ast2json_stream, CompactAST, \
+        NodeView, DictExportVisitor
+
+CODE = dedent("""
+    import sys
+    global a, b
+
+    def func(arg1, arg2=b'bytes', *args, **kwargs):
+        x = {"key": [arg1, arg2, 3.5, 1 << 70, 1j], "other": (args, kwargs)}
+        for idx, value in enumerate(sorted(x)):
+            if idx % 2 and value not in ("a", "b"):
+                x[value] = [y * 2 for y in range(idx) if y > 1]
+        return x
+    """)
+
+
+class Test10DictExport(unittest.TestCase):
+    def test_deep_elif(self):
+        depth = sys.getrecursionlimit()
+        code = "if a == 0:\n    pass\n" + "elif a:\n    pass\n" * (depth - 1)
+        node = ast2dict(code)["body"][0]
+        levels = 1
+        while node["orelse"]:
+            node = node["orelse"][0]
+            levels += 1
+        self.assertEqual(levels, depth)
+        self.assertEqual(node["lineno"], depth * 2 - 1)
+
+    def test_deep_expression(self):
+        depth = sys.getrecursionlimit()
+        node = ast2dict("x = " + " + ".join(["1"] * depth))["body"][0]["value"]
+        levels = 0
+        while node["ast_type"] == "BinOp":
+            node = node["left"]
+            levels += 1
+        self.assertEqual(levels, depth - 1)
+
+    def test_odd_values(self):
+        node = ast.Module(body=[ast.Pass(lineno=1, col_offset=0)], type_ignores=[])
+        node.body.append((1, 2))
+        visitor = DictExportVisitor("")
+        body = visitor.visit(node)["body"]
+        self.assertEqual(body[0], {"ast_type": "Pass", "lineno": 1, "col_offset": 0,
+                                   "_fields": (), "_attributes": ast.Pass._attributes})
+        self.assertEqual(body[1], {"ast_type": "tuple", "_fields": [], "_attributes": []})
+        self.assertEqual(visitor.visit("text"), "text")
+        self.assertEqual(visitor.visit(5), 5)
+        self.assertEqual(visitor.visit_field(node.body)[1], body[1])
+
+
+class Test20Compact(unittest.TestCase):
+    def test_same_as_dict(self):
+        tree = ast2compact(CODE)
+        self.assertEqual(tree.to_dict(), ast2dict(CODE))
+        self.assertEqual(tree.root, ast2dict(CODE))
+
+    def test_odd_sequences(self):
+        # ast2dict exports the sequences inside lists as dictionaries
+        node = ast.Module(body=[ast.Pass(lineno=1, col_offset=0)], type_ignores=[])
+        node.body.append([1, 2])
+        compact = CompactAST.from_ast(node).to_dict()
+        self.assertEqual(compact["body"][1],
+                         {"ast_type": "list", "_fields": [], "_attributes": []})
+
+    def test_view(self):
+        tree = ast2compact(CODE)
+        self.assertEqual(tree.schemas[tree.node_types[0]][0], "Module")
+        root = tree.root
+        self.assertNotIn("lineno", root)
+        self.assertEqual(list(root)[:3], ["ast_type", "_fields", "_attributes"])
+
+        func = root["body"][2]
+        self.assertIsInstance(func, NodeView)
+        self.assertEqual(func["ast_type"], "FunctionDef")
+        self.assertEqual(func["lineno"], 5)
+        self.assertEqual(func["name"], "func")
+        self.assertEqual(root["body"][1]["names"], ["a", "b"])
+        self.assertRaises(KeyError, lambda: func["missing"])
+        self.assertEqual(dict(func), func.to_dict())
+        self.assertEqual(len(func), len(func.to_dict()))
+
+    def test_schemas_shared(self):
+        tree = ast2compact("a = 1\nb = 2\nc = 3\n")
+        names = [schema[0] for schema in tree.schemas]
+        self.assertEqual(len(names), len(set(names)))
+        self.assertEqual(len(tree), 1 + 3 * 4)
+
+
+class Writer(object):
+    def __init__(self):
+        self.writes = []
+
+    def write(self, text):
+        self.writes.append(text)
+
+
+class Test30JsonStream(unittest.TestCase):
+    def stream(self, code, buffer_size=65536):
+        writer = Writer()
+        ast2json_stream(code, writer, buffer_size=buffer_size)
+        return writer
+
+    def test_same_as_dict(self):
+        text = "".join(self.stream(CODE).writes)
+        expected = json.dumps(ast2dict(CODE), default=repr)
+        if sys.version_info[0] > 2:  # the dictionaries are unordered in Python 2
+            self.assertEqual(text, expected)
+        self.assertEqual(json.loads(text), json.loads(expected))
+
+    def test_buffered(self):
+        writer = self.stream(CODE, buffer_size=100)
+        self.assertGreater(len(writer.writes), 10)
+        self.assertEqual("".join(writer.writes), "".join(self.stream(CODE).writes))
+
+    def test_deep(self):
+        depth = sys.getrecursionlimit()
+        code = "if a == 0:\n    pass\n" + "elif a:\n    pass\n" * (depth - 1)
+        text = "".join(self.stream(code).writes)
+        # too deep for json.loads
+        self.assertEqual(text.count('"ast_type": "If"'), depth)
+        self.assertEqual(text.count("{"), text.count("}"))
+        self.assertTrue(text.endswith("}]}], \"type_ignores\": []}")
+                        if sys.version_info[0] > 2 else text.endswith("}]}]}"))
+
+    def test_syntax_error(self):
+        writer = Writer()
+        self.assertRaises(SyntaxError, ast2json_stream, "a = = 1", writer)
+        self.assertEqual(writer.writes, [])
+
+    def test_file(self):
+        if sys.version_info[0] > 2:
+            outfile = io.StringIO()
+        else:
+            outfile = io.BytesIO()
+        ast2json_stream(CODE, outfile)
+        self.assertEqual(json.loads(outfile.getvalue()),
+                         json.loads(json.dumps(ast2dict(CODE), default=repr)))
+
+
+if __name__ == '__main__':
+    unittest.main()
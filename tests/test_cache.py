@@ -0,0 +1,64 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from pydetector.cache import ResultCache
+
+
+class Test10Cache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.options = {'ast_checks': True, 'modules_score': 150}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_get_put(self):
+        cache = ResultCache(os.path.join(self.tmpdir, 'sub'))
+        key = cache.key(b'print 1', self.options)
+        self.assertIsNone(cache.get(key))
+        cache.put(key, {'version': 2, 'matches': [('PY2ASTOK', ())]})
+        self.assertEqual(cache.get(key), {'version': 2, 'matches': [('PY2ASTOK', ())]})
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.close()
+
+        # persistent between instances
+        cache = ResultCache(os.path.join(self.tmpdir, 'sub'))
+        self.assertEqual(cache.get(key)['version'], 2)
+        cache.close()
+
+    def test_key(self):
+        key = ResultCache.key(b'print 1', self.options)
+        self.assertEqual(key, ResultCache.key(b'print 1', dict(self.options)))
+        self.assertNotEqual(key, ResultCache.key(b'print 2', self.options))
+        self.assertNotEqual(key, ResultCache.key(b'print 1',
+                                                 dict(self.options, modules_score=1)))
+
+    def test_eviction(self):
+        cache = ResultCache(self.tmpdir, max_size=10000)
+        keys = [cache.key(str(i).encode('ascii'), self.options) for i in range(100)]
+        for key in keys:
+            cache.put(key, {'data': 'x' * 500})
+            # make the first one the most recently used
+            cache.get(keys[0])
+        cache.evict()
+
+        self.assertLessEqual(cache.size(), 10000)
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNotNone(cache.get(keys[-1]))
+        self.assertIsNone(cache.get(keys[1]))
+        cache.close()
+
+    def test_pickle(self):
+        cache = ResultCache(self.tmpdir, max_size=1234)
+        cache.put(cache.key(b'', self.options), {})
+        copy = pickle.loads(pickle.dumps(cache))
+        self.assertEqual((copy.directory, copy.max_size), (self.tmpdir, 1234))
+        self.assertEqual(copy.get(cache.key(b'', self.options)), {})
+        copy.close()
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import io
+import sys
+import json
+import unittest
+from pydetector.cli import write_json
+
+
+def new_outfile():
+    return io.StringIO() if sys.version_info[0] > 2 else io.BytesIO()
+
+
+def results():
+    yield 'a.py', {'version': 2, 'py2ast': {'s': 'x'}, 'py3ast': None, 'matches': []}
+    yield 'b.py', {'version': 6, 'py2ast': None, 'py3ast': {'n': 1j}, 'matches': []}
+
+
+class Test10WriteJSON(unittest.TestCase):
+    def test_jsonl(self):
+        out = new_outfile()
+        versions = write_json(results(), 'jsonl', False, out)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(records, [
+            {'filename': 'a.py', 'version': 2, 'matches': []},
+            {'filename': 'b.py', 'version': 6, 'matches': []},
+        ])
+        self.assertEqual(versions[2], 1)
+        self.assertEqual(versions[6], 1)
+
+    def test_json(self):
+        out = new_outfile()
+        write_json(results(), 'json', True, out)
+        data = json.loads(out.getvalue())
+        self.assertEqual(sorted(data), ['a.py', 'b.py'])
+        # the values JSON can't represent are written as their repr()
+        self.assertEqual(data['a.py']['py2ast'], {'s': 'x'})
+        self.assertEqual(data['b.py']['py3ast'], {'n': repr(1j)})
+
+    def test_empty(self):
+        out = new_outfile()
+        self.assertEqual(sum(write_json(iter([]), 'json', False, out).values()), 0)
+        self.assertEqual(json.loads(out.getvalue()), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
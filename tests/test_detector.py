@@ -1,6 +1,14 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
 import unittest
 from textwrap import dedent
-from pydetector.detector import remove_str_comments, detect
+from pydetector import detector
+from pydetector.detector import remove_str_comments, detect, detect_iter
+from pydetector.instrument import Instrumentation, STAGES
 
 # TODO: check the generated AST!
 
@@ -50,6 +58,22 @@ class Test20Detect(unittest.TestCase):
                 version=6, ast2check=True, ast3check=True
         )
 
+    def test_modules_scan(self):
+        code = "x = 1\ndef func():\n    import cPickle\n"
+        full = detect(codestr=code, ast_checks=False)['<code_string>']
+        header = detect(codestr=code, ast_checks=False, modules_scan='header')['<code_string>']
+        self.assertEqual((full['version'], header['version']), (2, 6))
+
+    def test_multiline_string_argument(self):
+        # the regex rules match within a line
+        code = 'x = unicode("""abc\ndef""")\ny = d.iteritems(\'\'\'a\nb\'\'\')\n'
+        res = detect(codestr=code, ast_checks=False)['<code_string>']
+        self.assertEqual((res['py2_score'], res['version']), (50, 2))
+        code = 'raise X("""abc\ndef""") from None\n'
+        res = detect(codestr=code, ast_checks=False)['<code_string>']
+        self.assertEqual((res['py3_score'], res['version']), (100, 3))
+
+
 class Test10RemoveStrComments(unittest.TestCase):
     def test_remove_comment(self):
         code = "# Yep, this is a comment \na = 1"
@@ -92,6 +116,239 @@ class Test10RemoveStrComments(unittest.TestCase):
             multiline"""; b = 3'''
         result = "triple = ''; b = 3"
         self.assertEqual(remove_str_comments(code), result)
+        result = "triple = ''\n\n\n; b = 3"
+        self.assertEqual(remove_str_comments(code, keep_lines=True), result)
+
+    def test_remove_str_prefixes(self):
+        code = r'''a = b'x' + u"y" + r'\'' + rb"""z""" + f"{x}" + Rb"\"#"'''
+        self.assertEqual(remove_str_comments(code),
+                         "a = b'' + u'' + r'' + rb'' + f'' + Rb''")
+
+    def test_remove_str_hash_and_greedy(self):
+        code = "print 'a#b', foo('c') # comment 'd'\nx = 1"
+        self.assertEqual(remove_str_comments(code), "print '', foo('') \nx = 1")
+
+    def test_remove_str_unterminated(self):
+        # unterminated strings end with the line
+        code = "a = 'foo\nb = 2"
+        self.assertEqual(remove_str_comments(code), "a = ''\nb = 2")
+        # and unterminated triple quoted ones use the regex implementation
+        code = "a = '''foo\nb = 'x'"
+        self.assertEqual(remove_str_comments(code), "a = ''foo\nb = ''")
+
+    def test_remove_str_long_line(self):
+        # would take ages with the backtracking regexes
+        code = "x = " + "'a' + \"b\" + " * 20000 + "'c'"
+        self.assertEqual(remove_str_comments(code), "x = " + "'' + '' + " * 20000 + "''")
+
+
+class DetectFilesTestCase(unittest.TestCase):
+    """
+    Helper class, creates some files with Python 2, 3 or compatible code
+    in a temporary directory
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.files = []
+        sources = ["print 'old'", "print('new', end='')", "pass", "import mimetools\nx = 1"]
+        for idx in range(20):
+            path = os.path.join(self.tmpdir, 'mod%02d.py' % idx)
+            with open(path, 'w') as f:
+                f.write(sources[idx % len(sources)])
+            self.files.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+class Test30DetectParallel(DetectFilesTestCase):
+    def test_parallel_same_as_serial(self):
+        serial = detect(self.files, stop_on_ok_ast=True)
+        parallel = detect(self.files, stop_on_ok_ast=True, jobs=3, chunksize=2)
+        self.assertEqual(list(parallel), self.files)
+        self.assertEqual(parallel, serial)
+
+    def test_parallel_failure_isolated(self):
+        files = self.files[:2] + [os.path.join(self.tmpdir, 'missing.py')] + self.files[2:4]
+        res = detect(files, stop_on_ok_ast=True, jobs=2)
+        self.assertEqual(list(res), files)
+        self.assertIn('error', res[files[2]])
+        for filename in files[:2] + files[3:]:
+            self.assertNotIn('error', res[filename])
+            self.assertIn(res[filename]['version'], (2, 3, 6))
+
+
+class Test40DetectCache(DetectFilesTestCase):
+    def test_cache(self):
+        cachedir = os.path.join(self.tmpdir, 'cache')
+        uncached = detect(self.files, stop_on_ok_ast=True)
+        first = detect(self.files, stop_on_ok_ast=True, cache_dir=cachedir, jobs=2)
+        self.assertEqual(first, uncached)
+
+        with open(self.files[0], 'a') as f:
+            f.write('\nprint "changed"\n')
+
+        # only the changed file must be checked again
+        checked = []
+        orig_detect_code = detector._detect_code
+
+        def detect_code(filename, *args, **kwargs):
+            checked.append(filename)
+            return orig_detect_code(filename, *args, **kwargs)
+
+        detector._detect_code = detect_code
+        try:
+            second = detect(self.files, stop_on_ok_ast=True, cache_dir=cachedir)
+        finally:
+            detector._detect_code = orig_detect_code
+
+        self.assertEqual(checked, self.files[:1])
+        for path in self.files[1:]:
+            self.assertEqual(second[path], first[path])
+
+        # different options don't use the same results
+        third = detect(self.files, stop_on_ok_ast=True, cache_dir=cachedir,
+                       ast_checks=False, modules_score=1)
+        self.assertEqual(third[self.files[-1]]['py2_score'], 1)
+
+
+class Test50DetectIter(DetectFilesTestCase):
+    def test_iter_lazy(self):
+        expected = detect(self.files, stop_on_ok_ast=True)
+        for jobs in (1, 2):
+            consumed = []
+
+            def lazy_files():
+                for path in self.files:
+                    consumed.append(path)
+                    yield path
+
+            results = detect_iter(lazy_files(), stop_on_ok_ast=True, jobs=jobs)
+            first_name, first_result = next(results)
+            self.assertEqual(first_name, self.files[0])
+            if jobs == 1:
+                # nothing is read ahead
+                self.assertEqual(consumed, self.files[:1])
+            rest = list(results)
+
+            self.assertEqual([name for name, _ in rest], self.files[1:])
+            self.assertEqual(dict([(first_name, first_result)] + rest), expected)
+
+    def test_iter_close(self):
+        results = detect_iter(self.files, stop_on_ok_ast=True, jobs=2)
+        next(results)
+        results.close()
+        self.assertEqual(multiprocessing.active_children(), [])
+
+
+class Test60EarlyExit(unittest.TestCase):
+    def test_early_exit(self):
+        code = "import Queue\n" + "print 'old'\n" * 20
+        full = detect(codestr=code)['<code_string>']
+        res = detect(codestr=code, early_exit_margin=250)['<code_string>']
+        self.assertEqual(res['version'], 2)
+        self.assertTrue(res['early_exit'])
+        self.assertFalse(full['early_exit'])
+        # stopped in the syntax checks, before the modules and the AST ones
+        self.assertEqual(res['py2_score'], 300)
+        self.assertEqual(len(res['matches']), 1)
+        self.assertTrue(res['matches'][0][0].startswith('PY2SYNTAX_'))
+        self.assertEqual(len(res['matches'][0][1]), 3)
+        self.assertIsNone(res['py2ast'])
+
+    def test_margin_not_reached(self):
+        code = "print 'old'\nimport queue\n"
+        res = detect(codestr=code, early_exit_margin=250)['<code_string>']
+        self.assertFalse(res['early_exit'])
+        # the AST checks run last and decide the version
+        self.assertEqual(res['version'], 2)
+        self.assertEqual(res['matches'][-1], ('PY2ASTOK', ()))
+        self.assertEqual((res['py2_score'], res['py3_score']), (100, 150))
+
+
+class Test70Instrumentation(DetectFilesTestCase):
+    def test_timings_and_counters(self):
+        calls = []
+        instrumentation = Instrumentation(hooks=[lambda *args: calls.append(args)])
+        res = detect(self.files, modsyms_checks=True, instrumentation=instrumentation)
+
+        size = sum(os.path.getsize(path) for path in self.files)
+        counters = instrumentation.counters
+        self.assertEqual((counters['files'], counters['bytes'], counters['errors']),
+                         (len(self.files), size, 0))
+        self.assertEqual([call[0] for call in calls], self.files)
+        for filename, timings, file_counters in calls:
+            self.assertIs(res[filename]['timings'], timings)
+            self.assertTrue(set(timings) <= set(STAGES + ('total',)))
+            self.assertEqual(file_counters['bytes'], os.path.getsize(filename))
+        # the files with Python 3 code only need the AST checks
+        self.assertEqual(set(calls[1][1]),
+                         set(['read', 'decode', 'ast_current', 'ast_other', 'total']))
+        self.assertEqual(set(calls[2][1]), set(STAGES + ('total',)))
+        self.assertAlmostEqual(instrumentation.timings['total'],
+                               sum(timings['total'] for _, timings, _ in calls))
+
+    def test_cache_and_parallel(self):
+        cachedir = os.path.join(self.tmpdir, 'cache')
+        first = Instrumentation()
+        detect(self.files, stop_on_ok_ast=True, cache_dir=cachedir, instrumentation=first)
+        second = Instrumentation()
+        res = detect(self.files, stop_on_ok_ast=True, cache_dir=cachedir, jobs=2,
+                     instrumentation=second)
+        # the files repeat 4 different sources
+        self.assertEqual((first.counters['cache_misses'], first.counters['cache_hits']),
+                         (4, len(self.files) - 4))
+        self.assertEqual((second.counters['cache_misses'], second.counters['cache_hits']),
+                         (0, len(self.files)))
+        self.assertNotIn('ast_current', res[self.files[0]]['timings'])
+
+    def test_disabled(self):
+        res = detect(self.files[:2], stop_on_ok_ast=True)
+        self.assertNotIn('timings', res[self.files[0]])
+
+
+class Test80RegexTimeout(unittest.TestCase):
+    # the module symbols rules are quadratic with a long line of calls without
+    # closing parenthesis, it takes seconds without timeout
+    CODE = "print 'old'\n" + "x = sys.exc_info(" * 30000 + "\n"
+
+    def detect(self, **kwargs):
+        start = time.time()
+        res = detect(codestr=self.CODE, ast_checks=False, modsyms_checks=True,
+                     regex_timeout=0.2, **kwargs)['<code_string>']
+        self.assertLess(time.time() - start, 5)
+        return res
+
+    def test_timed_out(self):
+        res = self.detect()
+        self.assertTrue(res['timed_out'])
+        # the syntax checks finished
+        self.assertEqual((res['py2_score'], res['py3_score'], res['version']), (100, 0, 2))
+        self.assertEqual([label[:9] for label, _ in res['matches']], ['PY2SYNTAX'])
+
+    def test_thread(self):
+        # no alarm, the checks look at the deadline
+        results = []
+        thread = threading.Thread(target=lambda: results.append(self.detect()))
+        thread.start()
+        thread.join()
+        self.assertTrue(results[0]['timed_out'])
+
+    def test_not_stored(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            for _ in range(2):
+                instrumentation = Instrumentation()
+                res = self.detect(cache_dir=tmpdir, instrumentation=instrumentation)
+                self.assertTrue(res['timed_out'])
+                self.assertEqual((instrumentation.counters['timeouts'],
+                                  instrumentation.counters['cache_misses']), (1, 1))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_in_budget(self):
+        res = detect(codestr="print 'old'\n", regex_timeout=10)['<code_string>']
+        self.assertFalse(res['timed_out'])
 
 
 if __name__ == '__main__':
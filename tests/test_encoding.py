@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import codecs
+import os
+import shutil
+import tempfile
+import unittest
+from pydetector.encoding import decode_source, read_source
+
+
+class Test10Encoding(unittest.TestCase):
+    def test_utf8(self):
+        code = u"a = 'ñandú'\r\nb = 2\r"
+        self.assertEqual(decode_source(code.encode('utf-8')),
+                         (u"a = 'ñandú'\nb = 2\n", 'utf-8'))
+
+    def test_bom(self):
+        code = u"a = 'ñandú'\n"
+        self.assertEqual(decode_source(codecs.BOM_UTF8 + code.encode('utf-8')),
+                         (code, 'utf-8-sig'))
+        self.assertEqual(decode_source(code.encode('utf-16')), (code, 'utf-16'))
+        self.assertEqual(decode_source(code.encode('utf-32')), (code, 'utf-32'))
+
+    def test_cookie(self):
+        code = u"# -*- coding: cp1251 -*-\na = 'привет'\n"
+        self.assertEqual(decode_source(code.encode('cp1251')), (code, 'cp1251'))
+
+    def test_cookie_second_line(self):
+        code = u"#!/usr/bin/env python\n# vim: set fileencoding=latin-1 :\na = '¤'\n"
+        self.assertEqual(decode_source(code.encode('latin-1')), (code, 'iso8859-1'))
+
+    def test_cookie_ignored(self):
+        # not in the first two lines
+        code = u"a = 1\nb = 2\n# coding: latin-1\nc = '¤'\n"
+        self.assertEqual(decode_source(code.encode('latin-1'))[1], 'iso8859-15')
+
+        # first line is code
+        code = u"a = 1\n# coding: latin-1\nc = '¤'\n"
+        self.assertEqual(decode_source(code.encode('latin-1'))[1], 'iso8859-15')
+
+    def test_bad_cookie(self):
+        # unknown encoding or cookie lying about the encoding
+        self.assertEqual(decode_source(b"# coding: nonexistent\na = 1\n")[1], 'utf-8')
+        self.assertEqual(decode_source(u"# coding: ascii\na = 'ñ'\n".encode('utf-8'))[1],
+                         'utf-8')
+
+    def test_fallback(self):
+        code = u"a = 'ñandú'\n"
+        self.assertEqual(decode_source(code.encode('latin-1')), (code, 'iso8859-15'))
+
+    def test_read_source(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'mod.py')
+            with open(path, 'wb') as f:
+                f.write(u"# coding: cp1252\na = '€'\r\n".encode('cp1252'))
+            self.assertEqual(read_source(path), (u"# coding: cp1252\na = '€'\n", 'cp1252'))
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
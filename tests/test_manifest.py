@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from pydetector import detector
+from pydetector.detector import detect, detect_iter
+from pydetector.instrument import Instrumentation
+
+
+class ManifestTestCase(unittest.TestCase):
+    """
+    Helper class, creates some files in a temporary directory and counts the
+    files checked and read
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.manifest = os.path.join(self.tmpdir, 'manifest')
+        self.files = []
+        sources = ["print 'old'", "print('new', end='')", "pass"]
+        for idx in range(9):
+            path = os.path.join(self.tmpdir, 'mod%d.py' % idx)
+            self.write(path, sources[idx % len(sources)])
+            self.files.append(path)
+
+        self.checked = []
+        self.orig_detect_file_safe = detector._detect_file_safe
+
+        def detect_file_safe(filename, *args, **kwargs):
+            self.checked.append(filename)
+            return self.orig_detect_file_safe(filename, *args, **kwargs)
+
+        detector._detect_file_safe = detect_file_safe
+
+    def tearDown(self):
+        detector._detect_file_safe = self.orig_detect_file_safe
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, path, content, mtime=None):
+        with open(path, 'w') as f:
+            f.write(content)
+        if mtime is None:
+            # a different modification time than any previous one
+            mtime = time.time() - 1000 - len(getattr(self, 'files', ()))
+        os.utime(path, (mtime, mtime))
+
+    def run_detect(self, files=None, **kwargs):
+        del self.checked[:]
+        kwargs.setdefault('stop_on_ok_ast', True)
+        return detect(files or self.files, manifest=self.manifest, **kwargs)
+
+
+class Test10Manifest(ManifestTestCase):
+    def test_incremental(self):
+        first = self.run_detect()
+        self.assertEqual(self.checked, self.files)
+        self.assertEqual(first, detect(self.files, stop_on_ok_ast=True))
+
+        # modified, touched without changes and new files
+        self.write(self.files[0], "print 'changed'")
+        stat = os.stat(self.files[1])
+        os.utime(self.files[1], (stat.st_atime, stat.st_mtime + 10))
+        added = os.path.join(self.tmpdir, 'added.py')
+        self.write(added, "print('added')")
+
+        second = self.run_detect(self.files + [added])
+        self.assertEqual(self.checked, [self.files[0], added])
+        self.assertEqual(sorted(second), sorted(self.files + [added]))
+        self.assertEqual(second[self.files[0]]['matches'], [('PY2ASTOK', ())])
+        self.assertEqual(second[added]['version'], 3)
+        for path in self.files[1:]:
+            self.assertEqual(second[path], first[path])
+
+    def test_not_read(self):
+        first = self.run_detect()
+        # unchanged files are only stat'ed: same size and time, other contents
+        stat = os.stat(self.files[0])
+        self.write(self.files[0], "print('py')", stat.st_mtime)
+        second = self.run_detect()
+        self.assertEqual(self.checked, [])
+        self.assertEqual(second[self.files[0]], first[self.files[0]])
+
+    def test_deleted_dropped(self):
+        self.run_detect()
+        self.run_detect(self.files[1:])
+        self.run_detect()
+        self.assertEqual(self.checked, self.files[:1])
+
+    def test_options_change(self):
+        self.run_detect()
+        self.run_detect(modules_score=1)
+        self.assertEqual(self.checked, self.files)
+
+    def test_parallel(self):
+        serial = self.run_detect()
+        self.write(self.files[4], "import mimetools")
+        self.write(self.files[8], "print 'changed'")
+        parallel = self.run_detect(jobs=2, chunksize=1)
+        self.assertEqual(sorted(parallel), self.files)
+        self.assertEqual(parallel, self.run_detect())
+        self.assertEqual(self.checked, [])
+        for idx, path in enumerate(self.files):
+            if idx not in (4, 8):
+                self.assertEqual(parallel[path], serial[path])
+        self.assertEqual(parallel[self.files[4]],
+                         detect([self.files[4]], stop_on_ok_ast=True)[self.files[4]])
+
+    def test_instrumentation(self):
+        self.run_detect()
+        instrumentation = Instrumentation()
+        res = self.run_detect(instrumentation=instrumentation)
+        counters = instrumentation.counters
+        self.assertEqual((counters['files'], counters['manifest_reused'], counters['bytes']),
+                         (len(self.files), len(self.files), 0))
+        self.assertEqual(res[self.files[0]]['timings'], {})
+
+    def test_interrupted(self):
+        self.run_detect()
+        results = detect_iter(self.files[:2], stop_on_ok_ast=True, manifest=self.manifest)
+        next(results)
+        results.close()
+        # the files not seen keep their entries
+        self.run_detect()
+        self.assertEqual(self.checked, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
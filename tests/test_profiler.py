@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+from textwrap import dedent
+from pydetector.ast_checks import other_python_pool
+from pydetector.profiler import RuleProfiler, profile_rules
+
+
+def find_rule(profiler, table, name):
+    for row in profiler.rows():
+        if row['table'] == table and row['rule'] == name:
+            return row
+    raise KeyError(name)
+
+
+class Test10RuleProfiler(unittest.TestCase):
+    def test_module_hits(self):
+        profiler = RuleProfiler(ast_checks=False)
+        profiler.add_code(dedent("""
+            import cPickle
+            from Queue import Queue
+            import socketserver
+            """))
+        profiler.add_code("import cPickle\n")
+
+        row = find_rule(profiler, 'PY2ONLY_MODULES', 'cPickle')
+        self.assertEqual(row['hits'], 2)
+        self.assertEqual(row['files'], 2)
+        self.assertEqual(row['score'], 300)
+        # without it the first file is a tie with socketserver and the second
+        # has no hits
+        self.assertEqual(row['flips'], 2)
+        self.assertEqual(find_rule(profiler, 'PY2ONLY_MODULES', 'Queue')['hits'], 1)
+        self.assertEqual(find_rule(profiler, 'PY3ONLY_MODULES', 'socketserver')['hits'], 1)
+        self.assertEqual(profiler.files, 2)
+        self.assertTrue(all(row['bytes'] == profiler.bytes for row in profiler.rows()))
+
+    def test_syntax_and_symbols(self):
+        profiler = RuleProfiler(ast_checks=False)
+        profiler.add_code("def f():\n    nonlocal x\n    return sys.maxsize\n")
+        hits = [row for row in profiler.rows('hits') if row['hits']]
+        self.assertEqual(sorted(row['table'] for row in hits),
+                         ['PY3MODULESYMBOLS_REGEXPS', 'PY3OTHER_REGEXP'])
+        # both are Python 3, neither changes the verdict alone
+        self.assertTrue(all(row['flips'] == 0 for row in hits))
+
+    def test_ast_decided(self):
+        profiler = RuleProfiler(py2_parser='builtin')
+        profiler.add_code("import cPickle\nprint 'hello'\n")
+        self.assertEqual(profiler.ast_decided, 1)
+        self.assertEqual(find_rule(profiler, 'PY2ONLY_MODULES', 'cPickle')['flips'], 0)
+
+    def test_ast_pool(self):
+        with other_python_pool() as pool:
+            profiler = RuleProfiler(py2_parser='interpreter', pool=pool)
+            profiler.add_code("print 'hello'\n")
+            profiler.add_code("print('hello', end='')\n")
+            self.assertEqual(profiler.ast_decided, 2)
+            # both files were parsed by the same warm interpreter
+            self.assertEqual(pool.spawned, 1)
+
+    def test_profile_rules(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            paths = [os.path.join(tmpdir, name) for name in ('a.py', 'b.py')]
+            for path, code in zip(paths, ("import cPickle\n", "print 'hello'\n")):
+                with open(path, 'w') as outfile:
+                    outfile.write(code)
+            profiler = profile_rules(paths + [os.path.join(tmpdir, 'missing.py')],
+                                     py2_parser='interpreter')
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(profiler.files, 2)
+        self.assertEqual(profiler.ast_decided, 1)
+        self.assertEqual(find_rule(profiler, 'PY2ONLY_MODULES', 'cPickle')['hits'], 1)
+
+    def test_report(self):
+        profiler = RuleProfiler(ast_checks=False)
+        profiler.add_code("import cPickle\n")
+        lines = profiler.report(sort='hits', limit=3).splitlines()
+        self.assertEqual(len(lines), 7)
+        self.assertTrue(lines[4].endswith('cPickle'))
+        self.assertRaises(ValueError, profiler.rows, 'unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pydetector.project import detect_project, _sample_order, MIXED
+import random
+
+SOURCES = {
+    2: "print 'old'\n",
+    3: "print('new', end='')\n",
+    6: "x = 1\n",
+}
+
+
+class ProjectTestCase(unittest.TestCase):
+    """
+    Helper class, creates a project in a temporary directory
+    """
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def create(self, versions):
+        for idx, version in enumerate(versions):
+            with open(os.path.join(self.root, 'mod%03d.py' % idx), 'w') as f:
+                f.write(SOURCES[version] * (1 + idx % 5))
+
+
+class Test10DetectProject(ProjectTestCase):
+    def test_py2_sampled(self):
+        self.create([2, 6, 6] * 100)
+        res = detect_project([self.root], seed=1)
+        self.assertEqual(res['version'], 2)
+        self.assertTrue(res['stopped_early'])
+        self.assertLess(res['analyzed'], 100)
+        self.assertEqual(res['total'], 300)
+        self.assertGreaterEqual(res['confidence'], 0.95)
+        self.assertEqual(sum(res['counts'].values()), res['analyzed'])
+
+    def test_compatible(self):
+        self.create([6] * 200 + [3])
+        res = detect_project([self.root], seed=2, confidence=0.9)
+        self.assertEqual(res['version'], 6)
+        self.assertTrue(res['stopped_early'])
+        self.assertGreaterEqual(res['confidence'], 0.9)
+
+    def test_every_file(self):
+        self.create([3, 6, 6])
+        res = detect_project([self.root], min_files=5)
+        self.assertEqual(res['version'], 3)
+        self.assertEqual((res['analyzed'], res['confidence']), (3, 1.0))
+        self.assertFalse(res['stopped_early'])
+
+    def test_mixed(self):
+        self.create([2, 3] * 30 + [6] * 3)
+        res = detect_project([self.root], seed=5)
+        self.assertEqual(res['version'], MIXED)
+        self.assertGreaterEqual(res['confidence'], 0.95)
+
+        res = detect_project([self.root], min_files=100)
+        self.assertEqual((res['version'], res['confidence']), (MIXED, 1.0))
+        self.assertEqual(res['counts'], {2: 30, 3: 30, 6: 3})
+
+    def test_max_files(self):
+        self.create([2, 6] * 50)
+        res = detect_project([self.root], max_files=4, min_files=1, seed=3)
+        self.assertEqual(res['analyzed'], 4)
+        self.assertLess(res['confidence'], 0.95)
+
+    def test_no_files(self):
+        res = detect_project([self.root])
+        self.assertEqual((res['version'], res['total'], res['confidence']), (0, 0, 0.0))
+
+    def test_stratified_order(self):
+        self.create([6] * 40)
+        files = [os.path.join(self.root, name) for name in sorted(os.listdir(self.root))]
+        order = _sample_order(files, 5, random.Random(4))
+        self.assertEqual(sorted(order), files)
+        # every turn takes a file of every size
+        sizes = [os.path.getsize(path) for path in order]
+        self.assertEqual(sorted(sizes[:5]), sorted(set(sizes)))
+        self.assertEqual(order, _sample_order(files, 5, random.Random(4)))
+
+
+if __name__ == '__main__':
+    unittest.main()
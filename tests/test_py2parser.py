@@ -0,0 +1,145 @@
+import sys
+import unittest
+from textwrap import dedent
+from pydetector import py2parser
+from pydetector.ast_checks import check_ast, use_py2parser
+
+PYVERIDX = 0
+PY2AST   = 1
+PY3AST   = 2
+PY2ERR   = 3
+PY3ERR   = 4
+
+PY2_CODE = dedent("""
+    import sys, os.path as p
+    from os import (sep,
+                    path)
+
+    class Old:
+        def method(self, (a, b)=(1, 2), *args, **kwargs):
+            print >>sys.stderr, "hello", `a`,
+            exec "x = 1" in {}
+            return 0777 + 0xffL + 1e-3j
+
+    try:
+        raise ValueError, "old"
+    except (ValueError, TypeError), e:
+        s = ur"\\d" + u'\\N{BULLET}' + b'\\x41'
+    print
+""")
+
+
+class Test10Parse(unittest.TestCase):
+    def test_py2_code(self):
+        tree = py2parser.parse(PY2_CODE)
+        self.assertEqual(tree.type, 'file_input')
+        self.assertEqual([child.type for child in tree.children],
+                         ['import_name', 'import_from', 'classdef', 'try_stmt', 'print'])
+
+    def test_py3_code(self):
+        self.assertIsNotNone(py2parser.parse_error("print('x', file=sys.stderr)\n"))
+        self.assertIsNotNone(py2parser.parse_error("def f(*, a): pass\n"))
+        self.assertIsNotNone(py2parser.parse_error("x = 0o777 if True else 0777_7\n"))
+
+    def test_print_function(self):
+        code = "print('x', file=sys.stderr)\n"
+        self.assertIsNone(py2parser.parse_error('from __future__ import print_function\n' + code))
+        # only after the import
+        self.assertIsNotNone(py2parser.parse_error(code + 'from __future__ import print_function\n'))
+
+    def test_unicode_literals(self):
+        code = 'x = "\\u12"\n'
+        self.assertIsNone(py2parser.parse_error(code))
+        self.assertEqual(
+            py2parser.parse_error('from __future__ import unicode_literals\n' + code),
+            "SyntaxError: (unicode error) 'unicodeescape' codec can't decode bytes in "
+            "position 0-3: truncated \\uXXXX escape (line 2, column None)")
+
+    def test_deep(self):
+        code = 'x = ' + ' + '.join('f(%d)' % i for i in range(5000)) + '\n'
+        self.assertIsNone(py2parser.parse_error(code))
+        self.assertIsNotNone(py2parser.parse_error('x = ' + '(' * 1000 + ')' * 1000 + '\n'))
+
+
+class Test20Errors(unittest.TestCase):
+    def assertError(self, code, message):
+        self.assertEqual(py2parser.parse_error(code), message)
+
+    def test_syntax_errors(self):
+        self.assertError('x = = 1\n', 'SyntaxError: invalid syntax (line 1, column 5)')
+        self.assertError('x = (1\n', 'SyntaxError: unexpected EOF while parsing (line 1, column 7)')
+        self.assertError('x = 1\ny = (1\n', 'SyntaxError: invalid syntax (line 2, column 7)')
+        self.assertError('x = """\n', 'SyntaxError: EOF while scanning triple-quoted string '
+                                      'literal (line 1, column 8)')
+        self.assertError('x = 09\n', 'SyntaxError: invalid token (line 1, column 6)')
+
+    def test_multiline_string_error(self):
+        # reported where the string ends
+        self.assertError('x = f"""\n\n"""\n', 'SyntaxError: invalid syntax (line 3, column 13)')
+
+    def test_indentation_errors(self):
+        self.assertError('if x:\npass\n', 'IndentationError: expected an indented block '
+                                          '(line 2, column 4)')
+        self.assertError('  x = 1\n', 'IndentationError: unexpected indent (line 1, column 2)')
+        self.assertError('if x:\n    a\n  b\n', 'IndentationError: unindent does not match any '
+                                              'outer indentation level (line 3, column 4)')
+
+    def test_ast_errors(self):
+        # found when building the AST, so without column as in Python 2
+        self.assertError('None = 1\n', 'SyntaxError: cannot assign to None (line 1, column None)')
+        self.assertError('import None\n', 'SyntaxError: cannot assign to None (line 1, column None)')
+        self.assertError('f() = 1\n', "SyntaxError: can't assign to function call "
+                                       "(line 1, column None)")
+        self.assertError('[a] += 1\n', 'SyntaxError: illegal expression for augmented assignment '
+                                       '(line 1, column None)')
+        self.assertError('f(a=1, a=2)\n', 'SyntaxError: keyword argument repeated '
+                                          '(line 1, column None)')
+        self.assertError('def f(a=1, b): pass\n', 'SyntaxError: non-default argument follows '
+                                                  'default argument (line 1, column None)')
+        self.assertError("x = '\\x4'\n", 'ValueError: invalid \\x escape')
+
+
+class Test30Tree2Dict(unittest.TestCase):
+    def test_tree2dict(self):
+        tree = py2parser.tree2dict(py2parser.parse('print x\n'))
+        self.assertEqual(tree['ast_type'], 'file_input')
+        stmt = tree['children'][0]
+        self.assertEqual(stmt['ast_type'], 'print_stmt')
+        self.assertEqual(stmt['_fields'], ['children'])
+        name = stmt['children'][1]
+        self.assertEqual((name['ast_type'], name['value'], name['lineno'], name['col_offset']),
+                         ('NAME', 'x', 1, 6))
+        self.assertEqual(name['_fields'], ['value'])
+
+
+@unittest.skipIf(sys.version_info[0] == 2, 'the builtin parser is only used under Python 3')
+class Test40CheckAst(unittest.TestCase):
+    def test_use_py2parser(self):
+        self.assertTrue(use_py2parser('builtin'))
+        self.assertFalse(use_py2parser('interpreter', build_ast=False))
+        # the interpreter is faster when it's installed, even without ASTs
+        self.assertFalse(use_py2parser('auto', build_ast=False, py2_exec=sys.executable))
+        self.assertTrue(use_py2parser('auto', build_ast=False,
+                                      py2_exec='/nonexistent/python2'))
+        self.assertRaises(ValueError, use_py2parser, 'other')
+
+    def test_check_ast_builtin(self):
+        res = check_ast("print 'hello old world'", try_other_on_sucess=True,
+                        py2_parser='builtin', build_ast=False)
+        self.assertEqual(res[PYVERIDX], 2)
+        self.assertEqual(res[PY2ERR], '')
+
+        res = check_ast("print('x', end='')", try_other_on_sucess=True,
+                        py2_parser='builtin', build_ast=False)
+        self.assertEqual(res[PYVERIDX], 3)
+        self.assertEqual(res[PY2ERR], 'SyntaxError: invalid syntax (line 1, column 15)')
+
+    def test_check_ast_builtin_tree(self):
+        res = check_ast("pass", try_other_on_sucess=True, py2_parser='builtin')
+        self.assertEqual(res[PYVERIDX], 6)
+        self.assertEqual(res[PY2AST]['ast_type'], 'file_input')
+        self.assertIsInstance(res[PY3AST], dict)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,14 @@
+import glob
+import os
+import random
+import re
+import time
 import unittest
 from textwrap import dedent
+from pydetector import regexp_checks
+from pydetector.detector import remove_str_comments
 from pydetector.regexp_checks import check_modules_regex, \
-        check_syntax_regex, check_modulesymbols_regex
+        check_syntax_regex, check_modulesymbols_regex, import_header
 
 
 class RegexpTestCase(unittest.TestCase):
@@ -193,5 +200,205 @@ class Test30ModuleSymbolsRegex(RegexpTestCase):
         self.do_regexp_test(code)
 
 
+def findall_syntax_regex(code, matches):
+    """ Reference implementation: one findall per syntax rule, in its plain form """
+    py2_score = py3_score = 0
+
+    for regex, score in regexp_checks.PY3OTHER_REGEXP:
+        pattern = regexp_checks.rule_pattern(regex)
+        m = re.findall(pattern, code, regex.flags)
+        if m:
+            py3_score += score * len(m)
+            matches.append(("PY3SYNTAX_" + pattern, m))
+
+    for regex, score in regexp_checks.PY2OTHER_REGEXP:
+        pattern = regexp_checks.rule_pattern(regex)
+        m = re.findall(pattern, code, regex.flags)
+        if m:
+            py2_score += score * len(m)
+            matches.append(("PY2SYNTAX_" + pattern, m))
+
+    return py2_score, py3_score
+
+
+class Test40SyntaxScanner(unittest.TestCase):
+    FRAGMENTS = [
+        "print", "print ", "print(", "raise", "raise ", "raise Foo, e", "raise X from None",
+        "nonlocal ", "unicode(", "unicode", "xrange(1)", "xreadlines()", "raw_input(x)",
+        "basestring", "basestring:", "__metaclass__", "__metaclass__ = M", "d.iterkeys()",
+        "d.iteritems()", "d.itervalues()", "d.viewkeys()", "d.has_key(k)", ".has_key(",
+        "x", "_", ".", "(", ")", " ", "  ", "\t", "\n", ";", ":", ",", "=", "\r\n", "#",
+    ]
+
+    def assert_same(self, code):
+        expected, result = [], []
+        self.assertEqual(check_syntax_regex(code, result),
+                         findall_syntax_regex(code, expected))
+        self.assertEqual(result, expected)
+
+    def test_keyword_rules(self):
+        self.assertEqual(regexp_checks.SYNTAX_FINDALL_RULES, [])
+        self.assertEqual(len(regexp_checks.SYNTAX_KEYWORD_RULES["raise"]), 2)
+
+    def test_equivalence_random(self):
+        rnd = random.Random(42)
+        for _ in range(3000):
+            self.assert_same("".join(rnd.choice(self.FRAGMENTS)
+                                     for _ in range(rnd.randint(1, 30))))
+
+    def test_equivalence_sources(self):
+        basedir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+        for pattern in ("pydetector/*.py", "tests/*.py"):
+            for filename in glob.glob(os.path.join(basedir, pattern)):
+                with open(filename, "rb") as infile:
+                    self.assert_same(infile.read().decode("utf-8"))
+
+    def test_equivalence_long_lines(self):
+        # the rules with a head, tried many times in the same line
+        for code in (";raise x" * 300 + " from None\n", ";raise x" * 300 + "\nfrom None",
+                     ";raise x" * 300 + "\n;raise y from None", " unicode (" * 300 + "\n)",
+                     " xrange(" * 300 + ")" + " xrange(" * 300, "d.iteritems(\n" * 300,
+                     "raise\n from None;raise\n\n from None"):
+            self.assert_same(code)
+
+    def test_long_whitespace(self):
+        # the plain "raise\s+.*\s+from\s+None" splits the run in every way
+        start = time.time()
+        for code, expected in (("raise" + " " * 20000 + "x\n", (0, 0)),
+                               ("raise" + " " * 20000 + "from None\n", (0, 100)),
+                               ("raise x" + "\t" * 20000 + "from  None\n", (0, 100))):
+            self.assertEqual(check_syntax_regex(code, []), expected)
+        self.assertLess(time.time() - start, 5)
+
+
+def findall_modulesymbols_regex(code, matches, symbols_score=100):
+    """ Reference implementation: one findall per module symbols rule """
+    py3_score = 0
+    for symregex in regexp_checks.PY3MODULESYMBOLS_REGEXPS:
+        m = symregex.findall(code)
+        if m:
+            matches.append(('PY3SYMS:' + symregex.pattern, m))
+            py3_score += symbols_score * len(m)
+    return 0, py3_score
+
+
+class Test50SymbolsScanner(unittest.TestCase):
+    FRAGMENTS = [
+        "from", "from ", "import ", "os", "os.", "sys.", "signal.", "socket", "inspect.",
+        "past.utils.", "xml.etree.", "getcwdu", "sendfile", "sigwait", "sigwaitinfo",
+        "recvmsg", "recvmsg_info", "signature", "getclosurevars", "old_div", "XMLPullParser",
+        "maxsize", "exc_info", "capa", "indent", "irepeat", "from inspect import ",
+        "from os import ", "get_inheritable", "from sys import ", "getallocatedblocks",
+        "(x)", "(", ")", " ", "  ", "\t",
+        "\n", "\n\n", ";", ":", ",", "=", "x", "_", ".",
+    ]
+
+    def assert_same(self, code):
+        expected, result = [], []
+        self.assertEqual(check_modulesymbols_regex(code, result),
+                         findall_modulesymbols_regex(code, expected))
+        self.assertEqual(result, expected)
+
+    def test_equivalence_random(self):
+        rnd = random.Random(42)
+        for _ in range(3000):
+            self.assert_same("".join(rnd.choice(self.FRAGMENTS)
+                                     for _ in range(rnd.randint(1, 30))))
+
+    def test_equivalence_imports(self):
+        self.assert_same(dedent("""
+            from os import sendfile, pipe2
+            from   signal  import  sigwait
+            \t
+              from socket import recvmsg_info
+            from inspect import signature, getclosurevars
+            from inspect import (signature,
+                                 Parameter)
+            x = os.sendfile(a, b); y =sys.maxsize
+            inspect.signature (f)
+            """))
+
+    def test_equivalence_sources(self):
+        basedir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+        for pattern in ("pydetector/*.py", "tests/*.py"):
+            for filename in glob.glob(os.path.join(basedir, pattern)):
+                with open(filename, "rb") as infile:
+                    self.assert_same(infile.read().decode("utf-8"))
+
+
+class Test60ImportsScanner(unittest.TestCase):
+    FRAGMENTS = [
+        "import", "from", " import ", "from ", "cPickle", "Queue", "queue", "six", "sets",
+        "UserDict", " md5", "hashlib.md5", "http.client", "urllib.parse", "os", "as", "x",
+        " ", "  ", "\t", "\n", "\n\n", ";", ",", "(", ")",
+    ]
+
+    def assert_same(self, code):
+        for regex in (regexp_checks.PY3ONLY_MODULES_REGEXP,
+                      regexp_checks.PY2ONLY_MODULES_REGEXP):
+            self.assertEqual(
+                [(m.span(), m.groups()) for m in regexp_checks._iter_import_matches(code, regex)],
+                [(m.span(), m.groups()) for m in regex.finditer(code)])
+
+    def test_equivalence_random(self):
+        rnd = random.Random(42)
+        for _ in range(3000):
+            self.assert_same("".join(rnd.choice(self.FRAGMENTS)
+                                     for _ in range(rnd.randint(1, 30))))
+
+    def test_equivalence_long_lines(self):
+        for code in (";import x" * 300, ";import x" * 300 + ";import cPickle, os",
+                     ";import x" * 300 + "\n;import queue" + ";import x" * 300,
+                     "import cPickle\n\nimport Queue", "import\n  \nimport sets ;import os"):
+            self.assert_same(code)
+
+    def test_long_whitespace(self):
+        start = time.time()
+        for code, expected in (("import" + " " * 20000 + "x\n", (0, 0)),
+                               ("import" + " " * 20000 + " md5\n", (100, 0)),
+                               ("import x," + " " * 20000 + "queue\n", (0, 100))):
+            self.assertEqual(check_modules_regex(code, []), expected)
+        self.assertLess(time.time() - start, 5)
+
+
+class Test70ImportHeader(unittest.TestCase):
+    CODE = remove_str_comments(dedent("""\
+        #!/usr/bin/env python
+        u\"\"\"
+        Docstring
+        \"\"\"
+        from __future__ import print_function
+        __version__ = '1.0'
+        try:
+            import cPickle as pickle
+        except ImportError:
+            import pickle
+        from os import (path,
+        sep)
+        from sys import \\
+        argv
+        X = [1,
+        2]
+
+        def func():
+            import Queue
+        """))
+
+    def test_header(self):
+        header = import_header(self.CODE)
+        self.assertTrue(header.endswith("argv\n"))
+        self.assertTrue(self.CODE.startswith(header))
+        self.assertEqual(import_header("import os; x = 1\nx = 2\nimport sets"),
+                         "import os; x = 1\n")
+        self.assertEqual(import_header("import os"), "import os")
+
+    def test_scan(self):
+        full, header = [], []
+        self.assertEqual(check_modules_regex(self.CODE, full), (200, 0))
+        self.assertEqual(check_modules_regex(self.CODE, header, scan='header'), (100, 0))
+        self.assertEqual(header, full[:1])
+        self.assertRaises(ValueError, check_modules_regex, self.CODE, [], scan='imports')
+
+
 if __name__ == '__main__':
     unittest.main()
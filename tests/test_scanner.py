@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pydetector.scanner import scan, is_python_file, IgnoreRules
+
+
+class ScannerTestCase(unittest.TestCase):
+    """
+    Helper class, creates a directory tree in a temporary directory
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def create(self, *relatives, **kwargs):
+        content = kwargs.get('content', 'pass\n')
+        for relative in relatives:
+            path = os.path.join(self.root, *relative.split('/'))
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as outfile:
+                outfile.write(content)
+
+    def scanned(self, *args, **kwargs):
+        return [os.path.relpath(path, self.root).replace(os.sep, '/')
+                for path in scan([self.root], *args, **kwargs)]
+
+
+class Test10Scan(ScannerTestCase):
+    def test_python_files(self):
+        self.create('b.py', 'a/c.pyw', 'a/b/d.py', 'notes.txt', 'setup.cfg')
+        self.create('script', content='#!/usr/bin/env python2.7\nprint "x"\n')
+        self.create('other', content='#!/bin/sh\necho x\n')
+        self.assertEqual(self.scanned(), ['b.py', 'script', 'a/c.pyw', 'a/b/d.py'])
+
+    def test_skip_dirs(self):
+        self.create('a.py', '__pycache__/b.py', '.git/c.py', 'pkg/vendor/d.py',
+                    'env/pyvenv.cfg', 'env/lib/e.py', 'node_modules/f.py')
+        self.assertEqual(self.scanned(), ['a.py'])
+        self.assertEqual(self.scanned(skip_dirs=()),
+                         ['a.py', '.git/c.py', '__pycache__/b.py', 'node_modules/f.py',
+                          'pkg/vendor/d.py'])
+
+    def test_gitignore(self):
+        self.create('a.py', 'build/b.py', 'pkg/gen_c.py', 'pkg/gen_keep.py', 'pkg/sub/gen_d.py',
+                    'docs/conf.py', 'pkg/docs/e.py')
+        self.create('.gitignore', content='# generated\nbuild/\n/docs\n')
+        self.create('pkg/.gitignore', content='gen_*.py\n!gen_keep.py\n')
+        self.assertEqual(self.scanned(),
+                         ['a.py', 'pkg/gen_keep.py', 'pkg/docs/e.py'])
+        self.assertEqual(self.scanned(gitignore=False, excludes=['sub/', 'e.py']),
+                         ['a.py', 'build/b.py', 'docs/conf.py', 'pkg/gen_c.py',
+                          'pkg/gen_keep.py'])
+
+    def test_files_given(self):
+        self.create('a.py')
+        notes = os.path.join(self.root, 'notes.txt')
+        self.assertEqual(list(scan([notes])), [notes])
+
+    def test_lazy(self):
+        self.create('a/a.py', 'b/b.py')
+        files = scan([self.root])
+        self.assertEqual(os.path.basename(next(files)), 'a.py')
+        # "b" is walked after the first file is yielded
+        self.create('b/c.py')
+        self.assertEqual([os.path.basename(path) for path in files], ['b.py', 'c.py'])
+
+    @unittest.skipUnless(hasattr(os, 'symlink'), 'needs symbolic links')
+    def test_symlink_cycle(self):
+        self.create('a/m.py', 'b/n.py')
+        os.symlink(os.pardir, os.path.join(self.root, 'a', 'up'))
+        os.symlink(os.path.join(self.root, 'b'), os.path.join(self.root, 'a', 'b2'))
+        self.assertEqual(self.scanned(), ['a/m.py', 'b/n.py'])
+        # the link to an ancestor and the second path to "b" are not walked
+        self.assertEqual(self.scanned(follow_symlinks=True), ['a/m.py', 'b/n.py'])
+
+    def test_is_python_file(self):
+        self.create('script', content='#!/usr/bin/python3 -u\n')
+        self.assertTrue(is_python_file(os.path.join(self.root, 'script')))
+        self.assertTrue(is_python_file('missing.py'))
+        self.assertFalse(is_python_file('missing'))
+
+
+class Test20IgnoreRules(unittest.TestCase):
+    def test_patterns(self):
+        rules = IgnoreRules(['*.pyc', 'logs/', '/top.py', 'a/**/z.py', 'doc/*.py',
+                             '!keep.pyc', r'\#hash.py', 'f?le[0-9].py'])
+        self.assertTrue(rules.match('x/y.pyc', False))
+        self.assertFalse(rules.match('x/keep.pyc', False))
+        self.assertTrue(rules.match('x/logs', True))
+        self.assertIsNone(rules.match('x/logs', False))
+        self.assertTrue(rules.match('top.py', False))
+        self.assertIsNone(rules.match('x/top.py', False))
+        self.assertTrue(rules.match('a/z.py', False))
+        self.assertTrue(rules.match('a/b/c/z.py', False))
+        self.assertTrue(rules.match('doc/x.py', False))
+        self.assertIsNone(rules.match('doc/x/y.py', False))
+        self.assertTrue(rules.match('#hash.py', False))
+        self.assertTrue(rules.match('file1.py', False))
+        self.assertIsNone(rules.match('file10.py', False))
+
+    def test_base(self):
+        rules = IgnoreRules(['/gen.py'], 'pkg/')
+        self.assertTrue(rules.match('pkg/gen.py', False))
+        self.assertIsNone(rules.match('gen.py', False))
+        self.assertIsNone(rules.match('pkg/sub/gen.py', False))
+
+
+if __name__ == '__main__':
+    unittest.main()
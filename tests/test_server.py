@@ -0,0 +1,145 @@
+import io
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from pydetector.server import DetectionServer, ProtocolError, parse_request
+
+NO_AST = {'ast_checks': False}
+
+
+def request_lines(*requests):
+    return io.BytesIO(b''.join((json.dumps(request) + '\n').encode('utf-8')
+                               for request in requests))
+
+
+def responses(outfile):
+    return [json.loads(line.decode('utf-8')) for line in outfile.getvalue().splitlines()]
+
+
+class Test10ParseRequest(unittest.TestCase):
+    def test_valid(self):
+        request = parse_request(b'{"id": 1, "path": "a.py", "options": {"build_ast": false}}')
+        self.assertEqual(request['path'], 'a.py')
+        self.assertEqual(parse_request(b'{"command": "shutdown"}')['command'], 'shutdown')
+
+    def test_invalid(self):
+        for line in (b'nope', b'[1]', b'{"id": 1}', b'{"path": "a.py", "content": ""}',
+                     b'{"path": "a.py", "options": 1}',
+                     b'{"path": "a.py", "options": {"verbosity": 1}}',
+                     b'{"path": "a.py", "options": {"regex_timeout": 1}}',
+                     b'{"command": "restart"}'):
+            self.assertRaises(ProtocolError, parse_request, line)
+
+        try:
+            parse_request(b'{"id": 7}')
+        except ProtocolError as exc:
+            self.assertEqual(exc.request_id, 7)
+
+
+class Test20ServeStream(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'mod.py')
+        with open(self.path, 'w') as outfile:
+            outfile.write("import cPickle\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_pipelined(self):
+        infile = request_lines(
+            {'id': 1, 'path': self.path, 'options': NO_AST},
+            {'id': 2, 'content': 'import socketserver\n', 'filename': 'x.py',
+             'options': NO_AST},
+            {'id': 3, 'content': 'x = 1\n', 'options': {'unknown': 1}},
+        )
+        outfile = io.BytesIO()
+        with DetectionServer(concurrency=2) as server:
+            server.serve_stream(infile, outfile)
+
+        found = dict((response['id'], response) for response in responses(outfile))
+        self.assertEqual(sorted(found), [1, 2, 3])
+        self.assertEqual(found[1]['filename'], self.path)
+        self.assertEqual(found[1]['result']['version'], 2)
+        self.assertEqual(found[2]['filename'], 'x.py')
+        self.assertEqual(found[2]['result']['version'], 3)
+        self.assertTrue('error' in found[3])
+        self.assertEqual(server.served, 2)
+
+    def test_options(self):
+        outfile = io.BytesIO()
+        with DetectionServer(concurrency=1) as server:
+            server.serve_stream(request_lines(
+                {'id': 1, 'content': "print 'hello'\n",
+                 'options': {'build_ast': False, 'py2_parser': 'builtin'}}), outfile)
+        self.assertEqual(responses(outfile)[0]['result']['version'], 2)
+
+    def test_shutdown(self):
+        infile = request_lines(
+            {'id': 1, 'path': self.path, 'options': NO_AST},
+            {'id': 2, 'command': 'shutdown'},
+            {'id': 3, 'path': self.path, 'options': NO_AST},
+        )
+        outfile = io.BytesIO()
+        with DetectionServer(concurrency=1) as server:
+            server.serve_stream(infile, outfile)
+            self.assertTrue(server.stopping)
+
+        found = responses(outfile)
+        self.assertEqual([response['id'] for response in found], [1, 2])
+        self.assertEqual(found[1]['result'], 'shutdown')
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'needs Unix domain sockets')
+class Test30ServeUnix(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'server.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def connect(self):
+        for _ in range(100):
+            if os.path.exists(self.path):
+                break
+            time.sleep(0.05)
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(self.path)
+        return conn
+
+    def test_connections(self):
+        server = DetectionServer(concurrency=2)
+        thread = threading.Thread(target=server.serve_unix, args=(self.path,))
+        thread.start()
+        try:
+            conn = self.connect()
+            stream = conn.makefile('rwb')
+            for idx in range(4):
+                line = json.dumps({'id': idx, 'content': 'import cPickle\n' * (idx + 1),
+                                   'options': NO_AST})
+                stream.write((line + '\n').encode('utf-8'))
+            stream.write(b'{"id": "bye", "command": "shutdown"}\n')
+            stream.flush()
+            found = [json.loads(line.decode('utf-8')) for line in iter(stream.readline, b'')]
+            stream.close()
+            conn.close()
+        finally:
+            server.shutdown()
+            thread.join()
+            server.close()
+
+        self.assertEqual(found[-1], {'id': 'bye', 'result': 'shutdown'})
+        scores = dict((response['id'], response['result']['py2_score'])
+                      for response in found[:-1])
+        self.assertEqual(scores, {0: 150, 1: 300, 2: 450, 3: 600})
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
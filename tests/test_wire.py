@@ -0,0 +1,56 @@
+import unittest
+from textwrap import dedent
+from pydetector.ast2dict import ast2dict
+from pydetector.wire import dumps, loads, load, WireError
+
+
+class Test10Wire(unittest.TestCase):
+    def check_roundtrip(self, value):
+        res = loads(dumps(value))
+        self.assertEqual(res, value)
+        self.assertIs(type(res), type(value))
+
+    def test_scalars(self):
+        for value in (None, True, False, 0, -42, 2 ** 63 - 1, -2 ** 63, 2 ** 80,
+                      -2 ** 80, 1.5, 2j, b'by\x00tes', u'h\xe9llo', Ellipsis,
+                      u'x' * 1000):
+            self.check_roundtrip(value)
+
+    def test_containers(self):
+        for value in ([], (), {}, [1, (2, 3), {'a': [None, {}]}], {None: ('k', 'k')},
+                      [[[[u'deep']]]]):
+            self.check_roundtrip(value)
+
+    def test_deep_nesting(self):
+        value = []
+        for _ in range(100000):
+            value = [value]
+        res = loads(dumps(value))
+        for _ in range(100000):
+            self.assertEqual(len(res), 1)
+            res = res[0]
+        self.assertEqual(res, [])
+
+    def test_ast(self):
+        code = dedent("""
+            import sys
+            def func(a, b=3, *args, **kwargs):
+                return {a: [b, 1.5, 3j, b'x', ...]}
+            print(func(1), file=sys.stderr)
+        """)
+        self.check_roundtrip(ast2dict(code))
+
+    def test_incremental(self):
+        data = dumps(ast2dict("x = [1, 2, 3]\nprint(x)"))
+        chunks = [data[i:i + 1] for i in range(len(data))]
+        chunks.reverse()
+        self.assertEqual(load(lambda: chunks.pop() if chunks else b''),
+                         loads(data))
+
+    def test_truncated(self):
+        data = dumps([1, 2, 3])
+        self.assertRaises(WireError, loads, data[:-1])
+
+
+if __name__ == '__main__':
+    unittest.main()